@@ -1,5 +1,10 @@
+from typing import Any, Tuple
+
 from django.contrib import admin
+from django.http import HttpRequest
+
 from .models import Post, Comment
+from .search import matching_ids
 
 
 @admin.register(Post)
@@ -11,6 +16,14 @@ class PostAdmin(admin.ModelAdmin):
     readonly_fields = ("views", "created_at", "updated_at")
     ordering = ("-created_at",)
 
+    def get_search_results(self, request: HttpRequest, queryset: Any, search_term: str) -> Tuple[Any, bool]:
+        """
+        Looks the term up in the full-text index instead of scanning title and content with LIKE.
+        """
+        if not search_term:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(pk__in=matching_ids(search_term, 'post')), False
+
 
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
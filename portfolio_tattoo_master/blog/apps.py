@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class BlogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'blog'
+
+    def ready(self) -> None:
+        # The task module is imported so workers register the view count flush.
+        from . import signals, task  # noqa: F401
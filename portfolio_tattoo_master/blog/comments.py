@@ -0,0 +1,73 @@
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.paginator import Page, Paginator
+
+from .models import Comment, Post
+
+# Replies nested deeper than this are shown at the deepest level instead of indenting further.
+COMMENT_MAX_DEPTH: int = getattr(settings, 'COMMENT_MAX_DEPTH', 4)
+
+# Number of top-level threads shown per page below a post.
+COMMENT_THREADS_PER_PAGE: int = getattr(settings, 'COMMENT_THREADS_PER_PAGE', 10)
+
+
+def build_comment_tree(comments: List[Comment], max_depth: int = COMMENT_MAX_DEPTH) -> List[Comment]:
+    """
+    Assembles a flat list of comments into threads, in memory.
+
+    Every comment gets a ``replies`` list. Replies to comments missing from the
+    list (e.g. hidden ones) are dropped with their parent, and replies deeper
+    than ``max_depth`` are attached to their ancestor at ``max_depth``.
+
+    Args:
+        comments (List[Comment]): Comments of one post ordered by ``path``.
+        max_depth (int): Deepest level rendered as its own indentation.
+
+    Returns:
+        List[Comment]: The top-level comments, oldest first.
+    """
+    roots: List[Comment] = []
+    # Comment a reply is attached to, by the pk of the reply's parent.
+    anchors: Dict[int, Comment] = {}
+
+    for comment in comments:
+        comment.replies = []
+        if comment.parent_id is None:
+            roots.append(comment)
+            anchors[comment.pk] = comment
+            continue
+
+        anchor = anchors.get(comment.parent_id)
+        if anchor is None:
+            continue
+        anchor.replies.append(comment)
+        anchors[comment.pk] = comment if comment.depth < max_depth else anchor
+
+    return roots
+
+
+def get_comment_threads(post: Post,
+                        page_number: Optional[str] = None,
+                        per_page: int = COMMENT_THREADS_PER_PAGE,
+                        max_depth: int = COMMENT_MAX_DEPTH) -> Tuple[Page, int]:
+    """
+    Loads the active comments of a post in a single query and paginates its threads.
+
+    Args:
+        post (Post): The post whose comments are displayed.
+        page_number (Optional[str]): Requested page of threads, as found in the query string.
+        per_page (int): Number of top-level threads per page.
+        max_depth (int): Deepest level rendered as its own indentation.
+
+    Returns:
+        Tuple[Page, int]: The page of top-level comments and the number of displayed comments.
+    """
+    comments = list(post.comments.filter(active=True).order_by('path'))
+    roots = build_comment_tree(comments, max_depth)
+    total = _count(roots)
+    return Paginator(roots, per_page).get_page(page_number), total
+
+
+def _count(comments: List[Comment]) -> int:
+    return sum(1 + _count(comment.replies) for comment in comments)
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-18 00:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0003_comment_username'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
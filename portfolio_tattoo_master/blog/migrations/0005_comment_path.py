@@ -0,0 +1,47 @@
+# Generated by Django 5.1.5 on 2026-10-18 00:20
+
+from django.db import migrations, models
+
+
+def build_paths(apps, schema_editor):
+    """
+    Computes the materialized path and depth of existing comments.
+    Parents are always created before their replies, so one pass in pk order suffices.
+    """
+    Comment = apps.get_model('blog', 'Comment')
+    computed = {}
+    comments = list(Comment.objects.order_by('pk').only('pk', 'parent_id'))
+    for comment in comments:
+        segment = str(comment.pk).zfill(10)
+        parent = computed.get(comment.parent_id)
+        if parent is None:
+            comment.path, comment.depth = segment, 0
+        else:
+            comment.path, comment.depth = f"{parent[0]}/{segment}", parent[1] + 1
+        computed[comment.pk] = (comment.path, comment.depth)
+    Comment.objects.bulk_update(comments, ['path', 'depth'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'active', 'path'], name='blog_commen_post_id_5d6e84_idx'),
+        ),
+        migrations.RunPython(build_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-18 00:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_comment_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='placeholder',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,49 @@
+from django.db import OperationalError, migrations, transaction
+
+# Kinds in rowid order, see blog.search.KINDS: rowid = object id * 3 + kind.
+CREATE_INDEX = """
+CREATE VIRTUAL TABLE search_index USING fts5(
+    title, body, public UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+"""
+
+FILL_INDEX = [
+    "INSERT INTO search_index (rowid, title, body, public)"
+    " SELECT id * 3, title, content, status = 'PB' FROM blog_post",
+    "INSERT INTO search_index (rowid, title, body, public)"
+    " SELECT id * 3 + 1, '', body, active FROM blog_comment",
+    "INSERT INTO search_index (rowid, title, body, public)"
+    " SELECT id * 3 + 2, name, '', 1 FROM portfolio_tag",
+]
+
+
+def create_search_index(apps, schema_editor):
+    # Other databases, and SQLite builds without FTS5, search with the in-memory index.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute(CREATE_INDEX)
+    except OperationalError:
+        return
+    for statement in FILL_INDEX:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS search_index")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_post_image_metadata'),
+        ('portfolio', '0014_image_metadata'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
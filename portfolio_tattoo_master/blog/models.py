@@ -1,13 +1,50 @@
-from django.db import models
+import re
+from typing import Set, Sequence
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Q
 from django.urls import reverse
 from django.utils.text import slugify
 
+from portfolio.models import ImageMetadata
+
+SLUG_MAX_LENGTH = 50
+# Room left after the slugified title for a "-N" suffix.
+SLUG_SUFFIX_RESERVE = 6
+SLUG_ALLOCATION_ATTEMPTS = 3
+
+
+def slug_base(title: str) -> str:
+    """
+    Slugifies a post title, short enough to take a numeric suffix.
+    """
+    return slugify(title)[:SLUG_MAX_LENGTH - SLUG_SUFFIX_RESERVE].strip('-') or 'post'
+
+
+def next_free_slug(base: str, taken: Set[str]) -> str:
+    """
+    Returns ``base`` if it is free, otherwise ``base-N`` with N above the highest suffix in ``taken``.
+
+    Args:
+        base (str): The slugified title.
+        taken (Set[str]): Slugs already in use that start with ``base``.
+
+    Returns:
+        str: A slug not in ``taken``.
+    """
+    if base not in taken:
+        return base
+    pattern = re.compile(rf"^{re.escape(base)}-(\d+)$")
+    suffixes = [int(match.group(1)) for match in map(pattern.match, taken) if match]
+    return f"{base}-{max(suffixes, default=1) + 1}"
+
+
 class PublishedManager(models.Manager):
     def get_queryset(self):
         return super().get_queryset().filter(status=Post.Status.PUBLISHED)
 
 
-class Post(models.Model):
+class Post(ImageMetadata):
     objects = models.Manager()
     published = PublishedManager()
 
@@ -17,28 +54,60 @@ class Post(models.Model):
 
 
     title = models.CharField(max_length=200)
-    slug = models.SlugField(unique=True, blank=True, )
+    slug = models.SlugField(max_length=SLUG_MAX_LENGTH, unique=True, blank=True, )
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     status = models.CharField(max_length=2, choices=Status.choices, default=Status.DRAFT)
     image = models.ImageField(upload_to="images/", blank=True, null=True)
     views = models.IntegerField(default=0, )
+    derivatives = models.JSONField(default=dict, blank=True, editable=False)
+    placeholder = models.JSONField(default=dict, blank=True, editable=False)
 
     class Meta:
         ordering = ['-created_at']
 
     def save(self, *args, **kwargs):
-        if not self.slug:
-            slug = slugify(self.title)
-            counter = 1
-            while Post.objects.filter(slug=slug).exists():
-                slug = f"{slug}-{counter}"
-                counter += 1
+        if self.slug:
+            return super().save(*args, **kwargs)
 
-            self.slug = slug
+        # A concurrent insert may take the allocated slug first: allocate again and retry.
+        for attempt in range(SLUG_ALLOCATION_ATTEMPTS):
+            Post.allocate_slugs([self])
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                if attempt == SLUG_ALLOCATION_ATTEMPTS - 1 or not Post.objects.filter(slug=self.slug).exists():
+                    raise
+                self.slug = ''
 
-        super().save(*args, **kwargs)
+    @staticmethod
+    def allocate_slugs(posts: Sequence['Post']) -> None:
+        """
+        Gives every post without a slug a free one, with a single query for the whole batch.
+
+        The first post of a title gets its slugified title, the next ones ``title-2``,
+        ``title-3``... after the highest suffix in use. Meant to be called before
+        ``bulk_create`` when importing posts.
+
+        Args:
+            posts (Sequence[Post]): The posts to allocate slugs for. Posts with a slug are left alone.
+        """
+        pending = [post for post in posts if not post.slug]
+        if not pending:
+            return
+
+        bases = [slug_base(post.title) for post in pending]
+        lookup = Q()
+        for base in set(bases):
+            lookup |= Q(slug=base) | Q(slug__startswith=f"{base}-")
+        taken = set(Post.objects.filter(lookup).values_list('slug', flat=True))
+        taken.update(post.slug for post in posts if post.slug)
+
+        for post, base in zip(pending, bases):
+            post.slug = next_free_slug(base, taken)
+            taken.add(post.slug)
 
     def get_absolute_url(self):
         return reverse("post_detail", kwargs={"slug": self.slug})
@@ -47,6 +116,13 @@ class Post(models.Model):
         return self.title
 
 class Comment(models.Model):
+    # Width of one materialized path segment: the zero-padded primary key.
+    PATH_SEGMENT_WIDTH = 10
+    PATH_MAX_LENGTH = 255
+    # Deepest level a reply is stored at: the path of a comment holds depth + 1 segments,
+    # which must fit in ``path``. Replies to a comment at this depth become its siblings.
+    MAX_DEPTH = (PATH_MAX_LENGTH + 1) // (PATH_SEGMENT_WIDTH + 1) - 1
+
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
     username = models.CharField(max_length=200)
     body = models.TextField()
@@ -54,10 +130,32 @@ class Comment(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
     active = models.BooleanField(default=True)
+    # Materialized path "0000000001/0000000004": ordering by it yields each thread depth-first.
+    path = models.CharField(max_length=PATH_MAX_LENGTH, blank=True, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ['created']
-        indexes = [models.Index(fields=['created']), ]
+        indexes = [
+            models.Index(fields=['created']),
+            models.Index(fields=['post', 'active', 'path']),
+        ]
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        if adding and self.parent_id and self.parent.depth >= self.MAX_DEPTH:
+            self.parent = self.parent.parent
+        super().save(*args, **kwargs)
+
+        if adding:
+            segment = str(self.pk).zfill(self.PATH_SEGMENT_WIDTH)
+            if self.parent_id:
+                self.path = f"{self.parent.path}/{segment}"
+                self.depth = self.parent.depth + 1
+            else:
+                self.path = segment
+                self.depth = 0
+            Comment.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
 
     def __str__(self):
         return f'Comment by {self.username} on {self.post}'
@@ -0,0 +1,351 @@
+import html
+import math
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.db.models import Model
+from django.urls import reverse
+from django.utils.text import slugify
+
+from blog.models import Comment, Post
+from portfolio.models import Tag
+from portfolio.snapshots import Rows, get_snapshot, invalidate_model, register_snapshot
+
+# Results returned by the public search endpoint.
+SEARCH_RESULTS_LIMIT: int = getattr(settings, 'SEARCH_RESULTS_LIMIT', 20)
+
+# Longest query accepted, in characters.
+SEARCH_QUERY_MAX_LENGTH = 200
+
+# Name of the FTS5 table created by the blog migration 0008.
+SEARCH_TABLE = 'search_index'
+
+# Indexed kinds. A document's rowid is ``object_id * len(KINDS) + KINDS.index(kind)``,
+# so a document is found (and replaced) by rowid without any other index.
+KINDS = ('post', 'comment', 'tag')
+
+# A match in a title counts as much as this many matches in a body.
+TITLE_WEIGHT = 10.0
+
+# Words around the first match shown as the snippet of a result.
+SNIPPET_WORDS = 12
+SNIPPET_START, SNIPPET_END = '\x02', '\x03'
+
+# Same tokens as the FTS5 unicode61 tokenizer: runs of letters and digits.
+TOKEN_RE = re.compile(r'[^\W_]+')
+
+Document = Dict[str, Any]
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits a text into index terms, ignoring case and accents like the
+    ``unicode61 remove_diacritics 2`` tokenizer does: ``"Café Noir"`` -> ``["cafe", "noir"]``.
+    """
+    folded = unicodedata.normalize('NFKD', text.casefold())
+    return TOKEN_RE.findall(''.join(char for char in folded if not unicodedata.combining(char)))
+
+
+def make_rowid(kind: str, object_id: int) -> int:
+    return object_id * len(KINDS) + KINDS.index(kind)
+
+
+def split_rowid(rowid: int) -> Tuple[str, int]:
+    """
+    Returns the ``(kind, object_id)`` of a document rowid.
+    """
+    object_id, kind = divmod(rowid, len(KINDS))
+    return KINDS[kind], object_id
+
+
+def make_document(instance: Model) -> Document:
+    """
+    Returns the indexed text of a post, comment or tag.
+
+    ``public`` tells whether the document may appear in the public search;
+    drafts and hidden comments are still indexed for the admin.
+    """
+    if isinstance(instance, Post):
+        return {'rowid': make_rowid('post', instance.pk), 'title': instance.title, 'body': instance.content,
+                'public': instance.status == Post.Status.PUBLISHED}
+    if isinstance(instance, Comment):
+        return {'rowid': make_rowid('comment', instance.pk), 'title': '', 'body': instance.body,
+                'public': instance.active}
+    return {'rowid': make_rowid('tag', instance.pk), 'title': instance.name, 'body': '', 'public': True}
+
+
+def iter_documents() -> Iterable[Document]:
+    """
+    Yields the documents of every post, comment and tag, reading only the indexed columns.
+    """
+    yield from map(make_document, Post.objects.only('title', 'content', 'status').iterator())
+    yield from map(make_document, Comment.objects.only('body', 'active').iterator())
+    yield from map(make_document, Tag.objects.iterator())
+
+
+@lru_cache(maxsize=None)
+def fts_available(using: str = DEFAULT_DB_ALIAS) -> bool:
+    """
+    Checks once per process whether the database has the FTS5 index table.
+
+    The migration only creates it on SQLite builds with FTS5; everywhere else
+    the in-memory index of ``build_search_index`` is used.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [SEARCH_TABLE])
+        return cursor.fetchone() is not None
+
+
+def _write_documents(documents: Sequence[Document], removed: Sequence[int] = ()) -> None:
+    with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+        rowids = [document['rowid'] for document in documents] + list(removed)
+        cursor.executemany(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [[rowid] for rowid in rowids])
+        cursor.executemany(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, title, body, public) VALUES (%s, %s, %s, %s)",
+            [[document['rowid'], document['title'], document['body'], document['public']] for document in documents],
+        )
+
+
+def index_instance(instance: Model) -> None:
+    """
+    Updates the document of a saved post, comment or tag once the transaction commits.
+
+    Without FTS5 the in-memory index is rebuilt on the next search instead.
+    """
+    if not fts_available():
+        invalidate_model(type(instance))
+        return
+    document = make_document(instance)
+    transaction.on_commit(lambda: _write_documents([document]))
+
+
+def unindex_instance(instance: Model) -> None:
+    """
+    Removes the document of a deleted post, comment or tag once the transaction commits.
+    """
+    if not fts_available():
+        invalidate_model(type(instance))
+        return
+    rowid = make_document(instance)['rowid']
+    transaction.on_commit(lambda: _write_documents([], [rowid]))
+
+
+def rebuild_index() -> int:
+    """
+    Rebuilds the whole index from the database, e.g. after rows were written with
+    ``bulk_create`` or ``update``, which send no signals.
+
+    Returns:
+        int: The number of indexed documents.
+    """
+    if not fts_available():
+        invalidate_model(Post)
+        return len(get_snapshot('search_index')['documents'])
+    documents = list(iter_documents())
+    with transaction.atomic():
+        with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        _write_documents(documents)
+    return len(documents)
+
+
+def match_expression(query: str) -> Optional[str]:
+    """
+    Turns a visitor's query into an FTS5 expression matching documents that contain
+    every word, each one as a prefix: ``fine li`` -> ``"fine"* "li"*``.
+
+    Returns None when the query has no word. Operators and quotes typed by
+    the visitor are dropped with the punctuation, so the expression is always valid.
+    """
+    terms = tokenize(query[:SEARCH_QUERY_MAX_LENGTH])
+    return ' '.join(f'"{term}"*' for term in terms) or None
+
+
+def _mark(snippet: str) -> str:
+    # The text is escaped first: comments are written by visitors.
+    return html.escape(snippet).replace(SNIPPET_START, '<mark>').replace(SNIPPET_END, '</mark>')
+
+
+def _search_fts(expression: str, kind: Optional[str], public_only: bool, limit: Optional[int]) -> Rows:
+    conditions = [f"{SEARCH_TABLE} MATCH %s"]
+    params: List[Any] = [SNIPPET_START, SNIPPET_END, SNIPPET_WORDS, TITLE_WEIGHT, expression]
+    if public_only:
+        conditions.append("public = 1")
+    if kind is not None:
+        conditions.append("rowid %% %s = %s")
+        params += [len(KINDS), KINDS.index(kind)]
+    sql = (
+        f"SELECT rowid, snippet({SEARCH_TABLE}, -1, %s, %s, '…', %s), bm25({SEARCH_TABLE}, %s, 1.0) AS score"
+        f" FROM {SEARCH_TABLE} WHERE {' AND '.join(conditions)} ORDER BY score"
+    )
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(limit)
+    # The index is read from the same database as the rows, the replica in read-only views.
+    with connections[router.db_for_read(Post)].cursor() as cursor:
+        cursor.execute(sql, params)
+        return [
+            {'kind': split_rowid(rowid)[0], 'object_id': split_rowid(rowid)[1], 'snippet': _mark(snippet)}
+            for rowid, snippet, _ in cursor.fetchall()
+        ]
+
+
+@register_snapshot('search_index', Post, Comment, Tag)
+def build_search_index() -> Dict[str, Any]:
+    """
+    Builds the in-memory inverted index used when the database has no FTS5.
+
+    Returns:
+        Dict[str, Any]: ``{"terms": [sorted terms], "postings": {term: {rowid: weight}},
+        "documents": {rowid: document}}``. A weight is the share of the term in
+        the words of each field, the title counting ``TITLE_WEIGHT`` times, so
+        short fields rank first like with BM25.
+    """
+    postings: Dict[str, Dict[int, float]] = defaultdict(lambda: defaultdict(float))
+    documents = {}
+    for document in iter_documents():
+        rowid = document['rowid']
+        documents[rowid] = document
+        for text, field_weight in ((document['title'], TITLE_WEIGHT), (document['body'], 1.0)):
+            terms = tokenize(text)
+            for term in terms:
+                postings[term][rowid] += field_weight / len(terms)
+    return {
+        'terms': sorted(postings),
+        'postings': {term: dict(weights) for term, weights in postings.items()},
+        'documents': documents,
+    }
+
+
+def _python_snippet(document: Document, terms: List[str]) -> str:
+    text = document['body'] or document['title']
+    words = text.split()
+    matches = [any(token.startswith(term) for token in tokenize(word) for term in terms) for word in words]
+    first = matches.index(True) if True in matches else 0
+    start = max(0, first - SNIPPET_WORDS // 2)
+    window = [
+        f"{SNIPPET_START}{word}{SNIPPET_END}" if matched else word
+        for word, matched in zip(words[start:start + SNIPPET_WORDS], matches[start:start + SNIPPET_WORDS])
+    ]
+    prefix = '…' if start > 0 else ''
+    suffix = '…' if start + SNIPPET_WORDS < len(words) else ''
+    return _mark(f"{prefix}{' '.join(window)}{suffix}")
+
+
+def _search_python(terms: List[str], kind: Optional[str], public_only: bool, limit: Optional[int]) -> Rows:
+    index = get_snapshot('search_index')
+    sorted_terms, postings, documents = index['terms'], index['postings'], index['documents']
+
+    scores: Optional[Dict[int, float]] = None
+    for term in terms:
+        # Every indexed term starting with the query word, found by bisection in the sorted terms.
+        weights: Dict[int, float] = defaultdict(float)
+        position = bisect_left(sorted_terms, term)
+        while position < len(sorted_terms) and sorted_terms[position].startswith(term):
+            matching = postings[sorted_terms[position]]
+            rarity = math.log(1 + len(documents) / len(matching))
+            for rowid, weight in matching.items():
+                weights[rowid] += weight * rarity
+            position += 1
+        if scores is None:
+            scores = dict(weights)
+        else:
+            scores = {rowid: score + weights[rowid] for rowid, score in scores.items() if rowid in weights}
+
+    ranked = sorted(
+        (
+            rowid for rowid in scores or {}
+            if (not public_only or documents[rowid]['public']) and (kind is None or split_rowid(rowid)[0] == kind)
+        ),
+        key=lambda rowid: (-scores[rowid], rowid),
+    )
+    return [
+        {'kind': split_rowid(rowid)[0], 'object_id': split_rowid(rowid)[1],
+         'snippet': _python_snippet(documents[rowid], terms)}
+        for rowid in ranked[:limit]
+    ]
+
+
+def search(query: str, kind: Optional[str] = None, public_only: bool = True,
+           limit: Optional[int] = SEARCH_RESULTS_LIMIT) -> Rows:
+    """
+    Looks a query up in the index, best matches first.
+
+    Every word of the query must appear in a document, as a word or as the start
+    of one. Title matches rank above body matches.
+
+    Args:
+        query (str): The words typed by the visitor.
+        kind (Optional[str]): Only return documents of this kind ("post", "comment" or "tag").
+        public_only (bool): Leave out drafts and hidden comments.
+        limit (Optional[int]): Maximum number of hits, None for all.
+
+    Returns:
+        Rows: ``[{"kind": "post", "object_id": 4, "snippet": "...<mark>fine</mark> line..."}, ...]``.
+        The snippet is HTML-escaped.
+    """
+    expression = match_expression(query)
+    if expression is None:
+        return []
+    if fts_available():
+        return _search_fts(expression, kind, public_only, limit)
+    return _search_python(tokenize(query[:SEARCH_QUERY_MAX_LENGTH]), kind, public_only, limit)
+
+
+def matching_ids(query: str, kind: str) -> List[int]:
+    """
+    Returns the primary keys of every object of a kind matching a query, drafts included. Used by the admin.
+    """
+    return [hit['object_id'] for hit in search(query, kind=kind, public_only=False, limit=None)]
+
+
+def search_site(query: str, limit: int = SEARCH_RESULTS_LIMIT) -> Rows:
+    """
+    Searches the published posts, their visible comments and the portfolio tags.
+
+    Args:
+        query (str): The words typed by the visitor.
+        limit (int): Maximum number of results.
+
+    Returns:
+        Rows: ``[{"kind": "post", "title": "Aftercare", "url": "/blog/aftercare",
+        "snippet": "...<mark>ink</mark>..."}, ...]`` in rank order. Tag results
+        also carry the ``slug`` the gallery filters by.
+    """
+    hits = search(query, limit=limit)
+    ids: Dict[str, List[int]] = defaultdict(list)
+    for hit in hits:
+        ids[hit['kind']].append(hit['object_id'])
+
+    # Three queries at most, whatever the number of hits.
+    objects = {
+        'post': Post.published.only('title', 'slug').in_bulk(ids['post']) if ids['post'] else {},
+        'comment': Comment.objects.filter(
+            pk__in=ids['comment'], post__status=Post.Status.PUBLISHED,
+        ).select_related('post').only('post', 'post__title', 'post__slug').in_bulk() if ids['comment'] else {},
+        'tag': Tag.objects.in_bulk(ids['tag']) if ids['tag'] else {},
+    }
+
+    results = []
+    for hit in hits:
+        obj = objects[hit['kind']].get(hit['object_id'])
+        # Indexed, but its post was unpublished or the row deleted since.
+        if obj is None:
+            continue
+        if hit['kind'] == 'post':
+            result = {'title': obj.title, 'url': obj.get_absolute_url()}
+        elif hit['kind'] == 'comment':
+            result = {'title': obj.post.title, 'url': f"{obj.post.get_absolute_url()}#comments-container"}
+        else:
+            result = {'title': obj.name, 'url': reverse('portfolio'), 'slug': slugify(obj.name)}
+        results.append({'kind': hit['kind'], **result, 'snippet': hit['snippet']})
+    return results
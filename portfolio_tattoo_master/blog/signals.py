@@ -0,0 +1,46 @@
+from typing import Any
+
+from django.db.models import Model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from blog.models import Comment, Post
+from blog.search import index_instance, unindex_instance
+from portfolio.models import Tag
+from portfolio.page_cache import bump_content_version
+from portfolio.signals import queue_image_derivatives, queue_image_placeholder, remove_image_derivatives
+
+post_save.connect(queue_image_derivatives, sender=Post)
+post_save.connect(queue_image_placeholder, sender=Post)
+post_delete.connect(remove_image_derivatives, sender=Post)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Comment)
+def invalidate_pages(sender: type[Model], **kwargs: Any) -> None:
+    """
+    Makes cached blog pages unreachable when a post or a comment changes.
+    """
+    bump_content_version()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_save, sender=Tag)
+def index_search_document(sender: type[Model], instance: Model, **kwargs: Any) -> None:
+    """
+    Keeps the search index in step with a saved post, comment or tag.
+    """
+    index_instance(instance)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Comment)
+@receiver(post_delete, sender=Tag)
+def unindex_search_document(sender: type[Model], instance: Model, **kwargs: Any) -> None:
+    """
+    Drops a deleted post, comment or tag from the search index.
+    """
+    unindex_instance(instance)
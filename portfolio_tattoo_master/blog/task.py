@@ -0,0 +1,14 @@
+from celery import shared_task
+
+from .view_counter import flush_view_counts
+
+
+@shared_task
+def flush_post_views() -> int:
+    """
+    Writes the buffered post view counts to the database. Scheduled by Celery beat.
+
+    Returns:
+        int: The number of posts updated.
+    """
+    return flush_view_counts()
@@ -0,0 +1,328 @@
+from typing import List, Optional, Set
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from blog import view_counter
+from blog.comments import build_comment_tree, get_comment_threads
+from blog.models import Comment, Post, next_free_slug, slug_base
+from blog.search import matching_ids, search_site
+from blog.view_counter import flush_view_counts, pending_views
+from portfolio.models import Tag
+
+
+class CommentTreeTests(TestCase):
+    """
+    Tests for the threaded comments below a blog post.
+    """
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.post = Post.objects.create(title='Aftercare', content='...', status=Post.Status.PUBLISHED)
+
+    def comment(self, body: str, parent: Optional[Comment] = None, active: bool = True) -> Comment:
+        return Comment.objects.create(post=self.post, username='Visitor', body=body, parent=parent, active=active)
+
+    def test_path_and_depth_follow_the_parent(self) -> None:
+        root = self.comment('root')
+        reply = self.comment('reply', parent=root)
+
+        self.assertEqual(root.depth, 0)
+        self.assertEqual(reply.depth, 1)
+        self.assertTrue(reply.path.startswith(f"{root.path}/"))
+        self.assertEqual(Comment.objects.get(pk=reply.pk).path, reply.path)
+
+    def test_replies_past_the_deepest_level_become_siblings(self) -> None:
+        parent = self.comment('root')
+        for level in range(Comment.MAX_DEPTH):
+            parent = self.comment(f'level {level + 1}', parent=parent)
+
+        reply = self.comment('one more', parent=parent)
+
+        self.assertEqual((parent.depth, reply.depth), (Comment.MAX_DEPTH, Comment.MAX_DEPTH))
+        self.assertEqual(reply.parent_id, parent.parent_id)
+        self.assertLessEqual(len(Comment.objects.get(pk=reply.pk).path), Comment.PATH_MAX_LENGTH)
+
+    def test_tree_is_assembled_from_a_single_query(self) -> None:
+        first = self.comment('first')
+        second = self.comment('second')
+        reply = self.comment('reply', parent=first)
+        self.comment('nested', parent=reply)
+
+        with self.assertNumQueries(1):
+            page, total = get_comment_threads(self.post)
+            roots = list(page)
+
+        self.assertEqual(total, 4)
+        self.assertEqual([comment.body for comment in roots], ['first', 'second'])
+        self.assertEqual([comment.body for comment in roots[0].replies], ['reply'])
+        self.assertEqual([comment.body for comment in roots[0].replies[0].replies], ['nested'])
+        self.assertEqual(second.pk, roots[1].pk)
+
+    def test_inactive_comments_hide_their_replies(self) -> None:
+        hidden = self.comment('hidden', active=False)
+        self.comment('reply to hidden', parent=hidden)
+        self.comment('visible')
+
+        page, total = get_comment_threads(self.post)
+
+        self.assertEqual([comment.body for comment in page], ['visible'])
+        self.assertEqual(total, 1)
+
+    def test_replies_beyond_max_depth_are_flattened(self) -> None:
+        parent = None
+        for level in range(4):
+            parent = self.comment(f'level {level}', parent=parent)
+
+        roots = build_comment_tree(list(self.post.comments.order_by('path')), max_depth=1)
+
+        self.assertEqual([comment.body for comment in roots[0].replies], ['level 1', 'level 2', 'level 3'])
+        self.assertEqual(roots[0].replies[0].replies, [])
+
+    def test_threads_are_paginated(self) -> None:
+        for i in range(3):
+            self.comment(f'thread {i}')
+
+        page, total = get_comment_threads(self.post, page_number='2', per_page=2)
+
+        self.assertEqual([comment.body for comment in page], ['thread 2'])
+        self.assertEqual(total, 3)
+
+    def test_detail_page_query_count_does_not_grow_with_comments(self) -> None:
+        url = self.post.get_absolute_url()
+        root = self.comment('root')
+        self.comment('reply', parent=root)
+        cache.clear()
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(url)
+
+        for i in range(5):
+            self.comment(f'reply {i}', parent=self.comment(f'thread {i}'))
+        cache.clear()
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url)
+
+        self.assertContains(response, '12 Reviews')
+        self.assertEqual(len(many), len(few))
+
+
+class ViewCounterTests(TestCase):
+    """
+    Tests for the buffered view counter of blog posts.
+    """
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.post = Post.objects.create(title='Aftercare', content='...', status=Post.Status.PUBLISHED)
+        self.url = self.post.get_absolute_url()
+
+    def test_views_are_counted_without_database_writes(self) -> None:
+        self.client.get(self.url)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url, REMOTE_ADDR='10.0.0.2')
+
+        self.assertFalse([query for query in queries if query['sql'].startswith('UPDATE')])
+        self.assertEqual(pending_views([self.post.slug]), {self.post.slug: 2})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 0)
+
+    def test_repeated_views_of_a_visitor_count_once(self) -> None:
+        for _ in range(3):
+            self.client.get(self.url)
+
+        self.assertEqual(pending_views([self.post.slug]), {self.post.slug: 1})
+
+    def test_flush_adds_pending_views_in_one_update(self) -> None:
+        other = Post.objects.create(title='Healing', content='...', status=Post.Status.PUBLISHED)
+        for address in ('10.0.0.1', '10.0.0.2'):
+            self.client.get(self.url, REMOTE_ADDR=address)
+        self.client.get(other.get_absolute_url())
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(flush_view_counts(), 2)
+
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('UPDATE')]), 1)
+        self.assertEqual(dict(Post.objects.values_list('slug', 'views')), {self.post.slug: 2, other.slug: 1})
+        self.assertEqual(pending_views([self.post.slug, other.slug]), {})
+
+    def test_flush_only_reads_posts_viewed_since_the_last_one(self) -> None:
+        Post.objects.create(title='Healing', content='...', status=Post.Status.PUBLISHED)
+        self.client.get(self.url)
+        flush_view_counts()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(flush_view_counts(), 0)
+
+        self.client.get(self.url, REMOTE_ADDR='10.0.0.2')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(flush_view_counts(), 1)
+
+        self.assertFalse([query for query in queries if query['sql'].startswith('SELECT')])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 2)
+
+    def test_flush_refreshes_only_the_pages_showing_view_counts(self) -> None:
+        self.client.get(reverse('blog'))
+        self.client.get(reverse('information'))
+        self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            flush_view_counts()
+
+        self.assertContains(self.client.get(reverse('blog')), '1 view<')
+        with self.assertNumQueries(0):
+            self.client.get(reverse('information'))
+
+    def test_evicted_log_entry_does_not_stop_later_flushes(self) -> None:
+        other = Post.objects.create(title='Healing', content='...', status=Post.Status.PUBLISHED)
+        self.client.get(self.url)
+        self.client.get(other.get_absolute_url())
+        store = view_counter._store()
+        store.delete(view_counter._dirty_key(1))
+
+        self.assertEqual(flush_view_counts(), 1)
+        self.assertEqual(flush_view_counts(), 0)
+
+        # The marker of the lost entry expires: the next view logs the post again.
+        store.delete(view_counter._marker_key(self.post.slug))
+        self.client.get(self.url, REMOTE_ADDR='10.0.0.2')
+        self.client.get(other.get_absolute_url(), REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(flush_view_counts(), 2)
+        self.assertEqual(dict(Post.objects.values_list('slug', 'views')), {self.post.slug: 2, other.slug: 2})
+
+    def test_missing_post_is_not_counted(self) -> None:
+        self.client.get(reverse('post_detail', kwargs={'slug': 'no-such-post'}))
+
+        self.assertEqual(pending_views(['no-such-post']), {})
+
+
+class SlugAllocationTests(TestCase):
+    """
+    Tests for the unique slugs given to blog posts.
+    """
+
+    def create(self, title: str) -> Post:
+        return Post.objects.create(title=title, content='...')
+
+    def test_duplicate_titles_get_increasing_suffixes(self) -> None:
+        slugs = [self.create('Fine Line').slug for _ in range(4)]
+
+        self.assertEqual(slugs, ['fine-line', 'fine-line-2', 'fine-line-3', 'fine-line-4'])
+
+    def test_allocation_runs_a_single_query(self) -> None:
+        for _ in range(5):
+            self.create('Fine Line')
+        post = Post(title='Fine Line', content='...')
+
+        with self.assertNumQueries(1):
+            Post.allocate_slugs([post])
+
+        self.assertEqual(post.slug, 'fine-line-6')
+
+    def test_similar_titles_do_not_collide(self) -> None:
+        self.create('Fine Line')
+        self.create('Fine Line Healing')
+
+        self.assertEqual(self.create('Fine Line').slug, 'fine-line-2')
+
+    def test_batch_allocation(self) -> None:
+        self.create('Fine Line')
+        posts = [Post(title=title, content='...') for title in ('Fine Line', 'Blackwork', 'Fine Line')]
+
+        Post.allocate_slugs(posts)
+        Post.objects.bulk_create(posts)
+
+        self.assertEqual([post.slug for post in posts], ['fine-line-2', 'blackwork', 'fine-line-3'])
+
+    def test_slug_taken_concurrently_is_allocated_again(self) -> None:
+        self.create('Fine Line')
+        post = Post(title='Fine Line', content='...')
+        stale = iter([{'fine-line'}, {'fine-line', 'fine-line-2'}])
+        Post.objects.create(title='Other', content='...', slug='fine-line-2')
+
+        with patch('blog.models.Post.allocate_slugs', side_effect=lambda posts: self.fake_allocate(posts, next(stale))):
+            post.save()
+
+        self.assertEqual(post.slug, 'fine-line-3')
+
+    @staticmethod
+    def fake_allocate(posts: List[Post], taken: Set[str]) -> None:
+        for post in posts:
+            post.slug = next_free_slug(slug_base(post.title), taken)
+
+    def test_long_titles_fit_the_field(self) -> None:
+        post = self.create('Very long title ' * 10)
+
+        self.assertLessEqual(len(self.create('Very long title ' * 10).slug), Post._meta.get_field('slug').max_length)
+        self.assertFalse(post.slug.endswith('-'))
+
+
+class SearchTests(TestCase):
+    """
+    Tests for the full-text search over posts, comments and tags.
+    """
+
+    def setUp(self) -> None:
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post = Post.objects.create(
+                title='Fine line aftercare', content='Keep the fresh tattoo clean and moisturised.',
+                status=Post.Status.PUBLISHED,
+            )
+            self.draft = Post.objects.create(title='Fine line draft', content='Unpublished notes.')
+            Comment.objects.create(post=self.post, username='Visitor', body='Is <b>Bepanthen</b> fine?')
+            Tag.objects.create(name='Fine Line')
+
+    def titles(self, query: str) -> List[str]:
+        return [result['title'] for result in search_site(query)]
+
+    def test_results_are_ranked_and_public(self) -> None:
+        results = search_site('fine')
+
+        self.assertEqual([result['kind'] for result in results[:2]], ['tag', 'post'])
+        self.assertEqual({result['kind'] for result in results}, {'tag', 'post', 'comment'})
+        self.assertNotIn('Fine line draft', self.titles('fine'))
+
+    def test_words_match_as_prefixes_ignoring_case_and_accents(self) -> None:
+        self.assertEqual(self.titles('MOISTURÍS'), ['Fine line aftercare'])
+        self.assertEqual(self.titles('fresh clean'), ['Fine line aftercare'])
+        self.assertEqual(self.titles('fresh ink'), [])
+        self.assertEqual(self.titles('" OR *'), [])
+
+    def test_snippets_are_escaped(self) -> None:
+        comment = next(result for result in search_site('bepanthen') if result['kind'] == 'comment')
+
+        self.assertIn('&lt;b&gt;<mark>Bepanthen</mark>&lt;/b&gt;', comment['snippet'])
+        self.assertTrue(comment['url'].endswith('#comments-container'))
+
+    def test_index_follows_changes(self) -> None:
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.title = 'Healing guide'
+            self.post.save()
+            Tag.objects.get(name='Fine Line').delete()
+
+        self.assertEqual(self.titles('healing'), ['Healing guide'])
+        self.assertNotIn('tag', [result['kind'] for result in search_site('fine')])
+
+    def test_in_memory_index_gives_the_same_results(self) -> None:
+        expected = search_site('fine')
+
+        with patch('blog.search.fts_available', return_value=False):
+            self.assertEqual([result['title'] for result in search_site('fine')],
+                             [result['title'] for result in expected])
+            self.assertEqual(self.titles('MOISTURÍS'), ['Fine line aftercare'])
+            self.assertEqual(matching_ids('fine', 'post'), [self.post.pk, self.draft.pk])
+
+    def test_admin_search_includes_drafts(self) -> None:
+        self.assertEqual(sorted(matching_ids('line', 'post')), [self.post.pk, self.draft.pk])
+
+    def test_search_endpoint(self) -> None:
+        response = self.client.get(reverse('search'), {'q': 'aftercare'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['url'], self.post.get_absolute_url())
@@ -3,5 +3,6 @@ from django.urls import path
 
 urlpatterns = [
     path('', views.blog, name='blog'),
+    path('search/', views.search, name='search'),
     path('<slug:slug>', views.detail_post, name='post_detail'),
 ]
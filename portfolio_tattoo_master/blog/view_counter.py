@@ -0,0 +1,193 @@
+import hashlib
+import logging
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, List, Set, Tuple
+
+from django.conf import settings
+from django.core.cache import BaseCache, caches
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.http import HttpRequest, HttpResponse
+
+from portfolio.page_cache import bump_scope_version
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Cache alias holding the pending counts. It must be shared by web and Celery
+# processes (Redis in production); the default local-memory cache only works in development.
+VIEW_COUNT_CACHE: str = getattr(settings, 'VIEW_COUNT_CACHE', 'default')
+
+# Seconds during which repeated views of a post by the same visitor count once. 0 disables dedup.
+VIEW_COUNT_DEDUP_TIMEOUT: int = getattr(settings, 'VIEW_COUNT_DEDUP_TIMEOUT', 60 * 30)
+
+# Page cache scope of the pages showing view counts: bumped by the flushes that change them.
+VIEWS_SCOPE = 'post_views'
+
+
+def _store() -> BaseCache:
+    return caches[VIEW_COUNT_CACHE]
+
+
+def _pending_key(slug: str) -> str:
+    return f"post_views:pending:{slug}"
+
+
+def _seen_key(slug: str, visitor: str) -> str:
+    return f"post_views:seen:{slug}:{visitor}"
+
+
+# Posts viewed since the last flush are appended to a log in the store: an entry per
+# post, numbered by a counter. A flush reads the log from where the previous one
+# stopped, so it never looks at the posts nobody viewed.
+DIRTY_LENGTH_KEY = 'post_views:dirty:length'
+DIRTY_FLUSHED_KEY = 'post_views:dirty:flushed'
+
+# A post is logged once until the next flush, which clears its marker. The marker
+# expires after this many seconds, so a post whose log entry was evicted is logged
+# again by its next view instead of never being flushed.
+DIRTY_MARKER_TIMEOUT = 60 * 15
+
+
+def _dirty_key(number: int) -> str:
+    return f"post_views:dirty:{number}"
+
+
+def _marker_key(slug: str) -> str:
+    return f"post_views:logged:{slug}"
+
+
+def _mark_dirty(store: BaseCache, slug: str) -> None:
+    if not store.add(_marker_key(slug), 1, timeout=DIRTY_MARKER_TIMEOUT):
+        return
+    store.add(DIRTY_LENGTH_KEY, 0, timeout=None)
+    store.set(_dirty_key(store.incr(DIRTY_LENGTH_KEY)), slug, timeout=None)
+
+
+def _dirty_slugs(store: BaseCache) -> Tuple[Set[str], List[str], Dict[str, Any]]:
+    """
+    Returns the slugs logged since the last flush, the keys of the log entries read,
+    and the position in the log to save once they are flushed.
+
+    A missing entry is either being written (its number is taken, its slug not set
+    yet) or was evicted. It is skipped and looked up once more by the next flush,
+    then given up: the marker of its post expires and its next view logs it again.
+    """
+    position = store.get(DIRTY_FLUSHED_KEY) or {'read': 0, 'gaps': []}
+    length = store.get(DIRTY_LENGTH_KEY, 0)
+    if length < position['read']:
+        # The length was evicted and the log numbered again from 1.
+        position = {'read': 0, 'gaps': []}
+    new = list(range(position['read'] + 1, length + 1))
+    entries = store.get_many([_dirty_key(number) for number in position['gaps'] + new])
+    gaps = [number for number in new if _dirty_key(number) not in entries]
+    return set(entries.values()), list(entries), {'read': max(length, position['read']), 'gaps': gaps}
+
+
+def visitor_id(request: HttpRequest) -> str:
+    """
+    Identifies a visitor without touching the database: session key if any, else IP and user agent.
+    """
+    session_key = getattr(getattr(request, 'session', None), 'session_key', None)
+    raw = session_key or f"{request.META.get('REMOTE_ADDR', '')}|{request.META.get('HTTP_USER_AGENT', '')}"
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def record_view(request: HttpRequest, slug: str) -> bool:
+    """
+    Adds one view of a post to the shared counter store.
+
+    Only the cache is written: ``Post.views`` is updated later by ``flush_view_counts``.
+
+    Args:
+        request (HttpRequest): The request that displayed the post.
+        slug (str): Slug of the viewed post.
+
+    Returns:
+        bool: True if the view was counted, False if it was a repeated view of the same visitor.
+    """
+    store = _store()
+    if VIEW_COUNT_DEDUP_TIMEOUT and not store.add(_seen_key(slug, visitor_id(request)), 1, VIEW_COUNT_DEDUP_TIMEOUT):
+        return False
+
+    key = _pending_key(slug)
+    store.add(key, 0, timeout=None)
+    try:
+        store.incr(key)
+    except ValueError:
+        # Evicted between add and incr.
+        store.set(key, 1, timeout=None)
+    _mark_dirty(store, slug)
+    return True
+
+
+def count_post_view(view: Callable[..., HttpResponse]) -> Callable[..., HttpResponse]:
+    """
+    Records a view of the post named by the ``slug`` argument of the view on every successful GET.
+
+    Place it above ``cache_page_shell`` so views served from the page cache are counted too.
+    """
+    @wraps(view)
+    def wrapper(request: HttpRequest, *args: Any, slug: str, **kwargs: Any) -> HttpResponse:
+        response = view(request, *args, slug=slug, **kwargs)
+        if request.method == 'GET' and response.status_code == 200:
+            record_view(request, slug)
+        return response
+
+    return wrapper
+
+
+def pending_views(slugs: Iterable[str]) -> Dict[str, int]:
+    """
+    Returns the counts not yet flushed to the database, by post slug.
+    """
+    slugs = list(slugs)
+    cached = _store().get_many([_pending_key(slug) for slug in slugs])
+    return {slug: cached[_pending_key(slug)] for slug in slugs if cached.get(_pending_key(slug))}
+
+
+def flush_view_counts() -> int:
+    """
+    Adds the pending counts of the posts viewed since the last flush to ``Post.views``
+    with a single UPDATE. Only those posts are read from the store and the database.
+
+    Counters are decremented by the flushed amount rather than reset, so views
+    recorded while the flush runs are kept for the next one.
+
+    Returns:
+        int: The number of posts updated.
+    """
+    store = _store()
+    slugs, read, position = _dirty_slugs(store)
+    pending = pending_views(slugs)
+
+    updated = 0
+    if pending:
+        with transaction.atomic():
+            updated = Post.objects.filter(slug__in=pending).update(
+                views=F('views') + Case(
+                    *(When(slug=slug, then=Value(count)) for slug, count in pending.items()),
+                    default=Value(0),
+                    output_field=IntegerField(),
+                )
+            )
+
+    # Cleared first: a view recorded from now on logs its post for the next flush.
+    store.delete_many([_marker_key(slug) for slug in slugs])
+    for slug, count in pending.items():
+        try:
+            left = store.decr(_pending_key(slug), count)
+        except ValueError:
+            logger.warning(f"View counter of post {slug} expired during flush.")
+            continue
+        if left > 0:
+            # Viewed during the flush: keep it logged for the next one.
+            _mark_dirty(store, slug)
+
+    store.delete_many(read)
+    store.set(DIRTY_FLUSHED_KEY, position, timeout=None)
+    if updated:
+        bump_scope_version(VIEWS_SCOPE)
+    logger.info(f"Flushed views of {updated} posts.")
+    return updated
@@ -1,37 +1,66 @@
+from django.http import HttpRequest, JsonResponse
 from django.shortcuts import render, get_object_or_404
-from django_ratelimit.decorators import ratelimit
 
+from blog.comments import get_comment_threads
 from blog.models import Post
+from blog.search import SEARCH_QUERY_MAX_LENGTH, search_site
+from blog.view_counter import VIEWS_SCOPE, count_post_view
 from blog.form import CommentForm
+from portfolio.db_router import use_replica
+from portfolio.page_cache import CSRF_HOLE, cache_page_shell, get_scope_version
+from portfolio.ratelimit import rate_limit
 from portfolio.utils import handle_form
 
 
+@use_replica
+@cache_page_shell(depends_on=(VIEWS_SCOPE,))
 def blog(request):
     posts = Post.published.all()
-    return render(request, 'blog/blog.html', {'posts': posts})
+    return render(request, 'blog/blog.html', {'posts': posts, 'views_version': get_scope_version(VIEWS_SCOPE)})
 
 
-@ratelimit(key='ip', rate='2/10m', method='POST', block=False)
+@use_replica
+def search(request: HttpRequest) -> JsonResponse:
+    """
+    Searches the blog posts, their comments and the portfolio tags, best matches first.
+
+    Not page-cached: every query would take a cache entry of its own, and the index answers quickly anyway.
+
+    Query parameters:
+        q: The words to look for.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        JsonResponse: ``{"query": str, "results": [{"kind", "title", "url", "snippet"}, ...]}``.
+    """
+    query = request.GET.get('q', '').strip()[:SEARCH_QUERY_MAX_LENGTH]
+    return JsonResponse({'query': query, 'results': search_site(query)})
+
+
+@count_post_view
+@use_replica
+@cache_page_shell(holes=(CSRF_HOLE,), params=('comments_page',))
+@rate_limit(rate='2/10m')
 def detail_post(request, slug):
     is_limited: bool = getattr(request, 'limited', False)
     post = get_object_or_404(Post, slug=slug)
     form = CommentForm(request.POST or None)
-    if form.is_valid():
-        comment = form.save(commit=False)
-        comment.post = post
-        handle_form(
-            request,
-            form,
-            is_limited,
-            text_message='Thank you for your comment!',
-            is_comment_form=True
-        )
-        comment.save()
-    comments = post.comments.filter(parent=None)
+    form.instance.post = post
+    handle_form(
+        request,
+        form,
+        is_limited,
+        text_message='Thank you for your comment!',
+        is_comment_form=True
+    )
+    comments, total_comments = get_comment_threads(post, request.GET.get('comments_page'))
     context = {
         'post': post,
         'form': form,
         'comments': comments,
+        'total_comments': total_comments,
         'is_limited': is_limited,
     }
     return render(request, 'blog/post.html', context)
\ No newline at end of file
@@ -1,20 +1,86 @@
 import os
-from typing import Any, Optional
+from typing import Any, List, Optional, Tuple
 
-from django.contrib import admin
-from django.http import HttpRequest
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import ChangeList
+from django.core.exceptions import PermissionDenied
+from django.forms import ModelForm
+from django.http import HttpRequest, HttpResponse
+from django.shortcuts import redirect, render
+from django.urls import URLPattern, path
 
-from .models import MainImage, Feedback, PortfolioImage, Tag
+from blog.search import matching_ids
+
+from .archive_import import import_archive
+from .duplicates import find_near_duplicates, forget_hashes
+from .form import ArchiveImportForm
+from .image_metadata import METADATA_FIELDS
+from .models import InstagramTile, MainImage, Feedback, PortfolioImage, Tag
+from .page_cache import bump_content_version
+from .snapshots import invalidate_model
+
+
+class NearDuplicateWarningMixin:
+    """
+    Warns after an upload when the library already holds a photo that looks the same,
+    e.g. another export or a slightly different crop. The upload is still saved.
+    """
+
+    def save_model(self, request: HttpRequest, obj: Any, form: ModelForm, change: bool) -> None:
+        super().save_model(request, obj, form, change)
+        if 'image' not in form.changed_data:
+            return
+        duplicates = find_near_duplicates(obj)
+        if duplicates:
+            similar = ", ".join(f"{label.split('.')[1]} {pk}" for _, (label, pk) in duplicates)
+            self.message_user(
+                request,
+                f"This image looks like an image already uploaded ({similar}). Check it is not a duplicate.",
+                level=messages.WARNING,
+            )
 
 
 @admin.register(MainImage)
-class MainImagesAdmin(admin.ModelAdmin):
+class MainImagesAdmin(NearDuplicateWarningMixin, admin.ModelAdmin):
     """
     Admin panel configuration for MainImages model.
     Includes custom actions for swapping images and deleting associated image files.
     """
     list_display = ('__str__', 'text', 'image')
-    actions = ['swap_image']
+    actions = ['swap_image', 'move_to_front', 'renumber_positions']
+
+    def get_queryset(self, request: HttpRequest) -> Any:
+        """
+        Annotates the rows with their slider position in the same query, for the changelist
+        and for the labels of the change, delete and history views.
+        """
+        return super().get_queryset(request).with_display_position()
+
+    @admin.action(description="Move selected images to the front")
+    def move_to_front(self, request: HttpRequest, queryset: Any) -> None:
+        """
+        Moves the selected images to the start of the slider, keeping the relative order of all images.
+
+        Args:
+            request (HttpRequest): The HTTP request object.
+            queryset (Any): A QuerySet containing the selected objects.
+        """
+        selected = list(queryset.order_by('position', 'pk').values_list('pk', flat=True))
+        others = MainImage.objects.exclude(pk__in=selected).order_by('position', 'pk').values_list('pk', flat=True)
+        MainImage.objects.reorder(selected + list(others))
+        self.message_user(request, "Images moved to the front.")
+
+    @admin.action(description="Renumber positions of all images")
+    def renumber_positions(self, request: HttpRequest, queryset: Any) -> None:
+        """
+        Closes the gaps left by deleted images by renumbering all positions 1..n.
+
+        Args:
+            request (HttpRequest): The HTTP request object.
+            queryset (Any): Ignored, all images are renumbered.
+        """
+        MainImage.objects.reorder(list(MainImage.objects.order_by('position', 'pk').values_list('pk', flat=True)))
+        self.message_user(request, "Positions renumbered.")
 
     @admin.action(description="Swap selected images")
     def swap_image(self, request: HttpRequest, queryset: Any) -> None:
@@ -40,12 +106,20 @@ class MainImagesAdmin(admin.ModelAdmin):
         image_1, image_2 = queryset
 
         try:
-            # Swap their images
-            image_1.image, image_2.image = image_2.image, image_1.image
+            # Swap their images together with everything already computed from them
+            fields = ['image', 'derivatives', 'placeholder', 'perceptual_hash', *METADATA_FIELDS]
+            for field in fields:
+                value_1, value_2 = getattr(image_1, field), getattr(image_2, field)
+                setattr(image_1, field, value_2)
+                setattr(image_2, field, value_1)
 
-            # Save changes to the database
-            image_1.save()
-            image_2.save()
+            # Save both rows in one query; bulk_update sends no signals, so drop the caches here
+            MainImage.objects.bulk_update([image_1, image_2], fields)
+            invalidate_model(MainImage)
+            bump_content_version()
+            # The cached hash tree maps each hash to the row it was filed for.
+            if image_1.perceptual_hash != image_2.perceptual_hash:
+                forget_hashes()
 
             # Notify the user of success
             self.message_user(request, "Images swapped successfully.")
@@ -115,6 +189,16 @@ class FeedBackAdmin(admin.ModelAdmin):
     search_fields = ('name', 'email')
 
 
+@admin.register(InstagramTile)
+class InstagramTileAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for InstagramTile model. Tiles are reordered from the changelist.
+    """
+    list_display = ('__str__', 'position', 'is_visible', 'link')
+    list_editable = ('position', 'is_visible')
+    search_fields = ('alt', 'link')
+
+
 @admin.register(Tag)
 class TagsAdmin(admin.ModelAdmin):
     """
@@ -124,8 +208,17 @@ class TagsAdmin(admin.ModelAdmin):
     search_fields = ('name',)
 
 
+class TagNamesChangeList(ChangeList):
+    """
+    Changelist of portfolio images loading the tag names with the rows.
+    """
+
+    def get_queryset(self, request: HttpRequest, exclude_parameters: Any = None) -> Any:
+        return super().get_queryset(request, exclude_parameters).with_tag_names()
+
+
 @admin.register(PortfolioImage)
-class PortfolioPhotoAdmin(admin.ModelAdmin):
+class PortfolioPhotoAdmin(NearDuplicateWarningMixin, admin.ModelAdmin):
     """
     Admin configuration for PortfolioImage model.
     """
@@ -133,6 +226,66 @@ class PortfolioPhotoAdmin(admin.ModelAdmin):
     list_filter = ('tags', 'uploaded_at')
     search_fields = ('tags__name',)
     filter_horizontal = ('tags',)
+    change_list_template = 'admin/portfolio/portfolioimage/change_list.html'
+
+    def get_changelist(self, request: HttpRequest, **kwargs: Any) -> type:
+        """
+        Loads the tag names of the changelist rows in the same query, for ``tag_list`` and ``__str__``.
+
+        Only the changelist is annotated: the change view must show the tags saved by the form,
+        not the ones loaded with the object.
+        """
+        return TagNamesChangeList
+
+    def get_urls(self) -> List[URLPattern]:
+        """
+        Adds the archive import page in front of the default admin URLs.
+        """
+        return [
+            path('import/', self.admin_site.admin_view(self.import_archive_view), name='portfolio_portfolioimage_import'),
+            *super().get_urls(),
+        ]
+
+    def import_archive_view(self, request: HttpRequest) -> HttpResponse:
+        """
+        Imports a zip archive of photos at once, tagging them after their folders.
+
+        Args:
+            request (HttpRequest): The HTTP request object.
+
+        Returns:
+            HttpResponse: The upload form, or a redirect to the changelist once the archive is imported.
+        """
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        form = ArchiveImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            # Decoded in this process: forking a pool from a web worker per request is not worth it.
+            report = import_archive(form.cleaned_data['archive'], workers=1)
+            self.message_user(request, f"{report['imported']} photos imported.")
+            for name, error in report['failed']:
+                self.message_user(request, f"{name} was not imported: {error}", level=messages.WARNING)
+            return redirect('admin:portfolio_portfolioimage_changelist')
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'form': form,
+            'title': "Import archive",
+        }
+        return render(request, 'admin/portfolio/portfolioimage/import_archive.html', context)
+
+    def get_search_results(self, request: HttpRequest, queryset: Any, search_term: str) -> Tuple[Any, bool]:
+        """
+        Finds the tags in the full-text index, then the photos with any of them.
+
+        Returns:
+            Tuple[Any, bool]: The filtered queryset, and True since a photo with several
+            matching tags is joined once per tag.
+        """
+        if not search_term:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(tags__in=matching_ids(search_term, 'tag')), True
 
     def tag_list(self, obj: PortfolioImage) -> Optional[str]:
         """
@@ -144,8 +297,7 @@ class PortfolioPhotoAdmin(admin.ModelAdmin):
         Returns:
             Optional[str]: A string representation of associated tags, or None if no tags exist.
         """
-        tags = obj.tags.all()
-        return ", ".join(tag.name for tag in tags) if tags.exists() else None
+        return ", ".join(obj.tag_names()) or None
 
     tag_list.short_description = "Tags"
 
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class PortfolioConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'portfolio'
+
+    def ready(self) -> None:
+        # Importing utils registers the snapshot builders the signals invalidate.
+        from . import signals, utils  # noqa: F401
@@ -0,0 +1,325 @@
+import json
+import logging
+import os
+import posixpath
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from .models import PortfolioImage, Tag
+from .page_cache import bump_content_version
+from .perceptual_hash import difference_hash
+from .snapshots import invalidate_model
+
+logger = logging.getLogger(__name__)
+
+# Longest side (in pixels) of an imported photo. Larger photos are scaled down.
+IMPORT_MAX_SIDE: int = getattr(settings, 'PORTFOLIO_IMPORT_MAX_SIDE', 2560)
+
+IMPORT_QUALITY: int = getattr(settings, 'PORTFOLIO_IMPORT_QUALITY', 88)
+
+# Archive members larger than this (in bytes) are skipped rather than read into memory.
+IMPORT_MAX_FILE_SIZE: int = getattr(settings, 'PORTFOLIO_IMPORT_MAX_FILE_SIZE', 50 * 1024 * 1024)
+
+# Photos decoded, stored and inserted per round.
+IMPORT_BATCH_SIZE = 50
+
+MANIFEST_NAME = 'manifest.json'
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.tif', '.tiff', '.bmp', '.gif'}
+
+# An image of the archive: its path inside the archive, a function reading its bytes, and its tag names.
+Entry = Tuple[str, Callable[[], bytes], List[str]]
+
+
+def folder_tags(path: str) -> List[str]:
+    """
+    Returns the tag names given by the folders of a path: ``Fine Line/Roses/1.jpg`` -> ``["Fine Line", "Roses"]``.
+    """
+    return [folder.strip() for folder in posixpath.dirname(path).split('/') if folder.strip()]
+
+
+class InvalidArchive(Exception):
+    """
+    Raised when an archive cannot be imported, e.g. because of a malformed manifest.
+    """
+
+
+def _is_hidden(path: str) -> bool:
+    parts = path.split('/')
+    # Skips the resource forks and hidden files archivers add.
+    return parts[0] == '__MACOSX' or any(part.startswith('.') for part in parts)
+
+
+def _is_image(path: str) -> bool:
+    return posixpath.splitext(path)[1].lower() in IMAGE_EXTENSIONS
+
+
+def _common_root(paths: List[str]) -> str:
+    """
+    Returns the single folder every path is in, with its slash, or ``""``.
+
+    Zipping a folder puts everything under its name: it is not a tag, and
+    the manifest sits inside it.
+    """
+    roots = {path.split('/', 1)[0] for path in paths}
+    if len(roots) == 1 and all('/' in path for path in paths):
+        return f"{roots.pop()}/"
+    return ''
+
+
+def parse_manifest(content: bytes) -> Dict[str, List[str]]:
+    """
+    Reads and checks a ``manifest.json``: an object mapping image paths to lists of tag names.
+
+    Raises:
+        InvalidArchive: If the manifest is not valid JSON of that shape, or a tag name
+            is empty or longer than a tag name may be.
+    """
+    max_length = Tag._meta.get_field('name').max_length
+    try:
+        manifest = json.loads(content)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidArchive(f"{MANIFEST_NAME} is not valid JSON: {e}")
+    if not isinstance(manifest, dict):
+        raise InvalidArchive(f"{MANIFEST_NAME} must map image paths to lists of tag names.")
+
+    tags = {}
+    for path, names in manifest.items():
+        if not isinstance(names, list) or not all(isinstance(name, str) and name.strip() for name in names):
+            raise InvalidArchive(f"{MANIFEST_NAME}: the tags of {path} must be a list of non-empty names.")
+        names = [name.strip() for name in names]
+        too_long = [name for name in names if len(name) > max_length]
+        if too_long:
+            raise InvalidArchive(f"{MANIFEST_NAME}: tag names are limited to {max_length} characters ({too_long[0]}).")
+        tags[path] = names
+    return tags
+
+
+def read_entries(source: Union[str, Path, Any]) -> List[Entry]:
+    """
+    Lists the images of a zip archive or a directory, with the tags of each one.
+
+    Tags come from the folders an image is in, unless a ``manifest.json`` at the
+    root of the archive lists the tags of that image:
+    ``{"roses/1.jpg": ["Fine Line", "Florals"], ...}``. When everything in a zip
+    archive is inside a single folder (a zipped folder), paths are taken relative to that folder.
+
+    Args:
+        source: The path of a directory or of a zip file, or an open zip file (e.g. an upload).
+
+    Returns:
+        List[Entry]: ``(path, read, tags)`` of every image, sorted by path. Files are only read by ``read()``.
+
+    Raises:
+        InvalidArchive: If the source is not a zip archive or its manifest is malformed.
+    """
+    files: Dict[str, Callable[[], bytes]] = {}
+    if isinstance(source, (str, Path)) and Path(source).is_dir():
+        root = Path(source)
+        for path in root.rglob('*'):
+            if path.is_file():
+                files[path.relative_to(root).as_posix()] = path.read_bytes
+    else:
+        try:
+            archive = zipfile.ZipFile(source)
+        except zipfile.BadZipFile as e:
+            raise InvalidArchive(f"Not a zip archive: {e}")
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            if info.file_size > IMPORT_MAX_FILE_SIZE:
+                logger.warning(f"Skipped {info.filename}: {info.file_size} bytes is over the import limit.")
+                continue
+            files[info.filename] = lambda name=info.filename: archive.read(name)
+
+    files = {path: read for path, read in files.items() if not _is_hidden(path)}
+    if not isinstance(source, (str, Path)) or not Path(source).is_dir():
+        prefix = _common_root(list(files))
+        files = {path[len(prefix):]: read for path, read in files.items()}
+
+    manifest = parse_manifest(files[MANIFEST_NAME]()) if MANIFEST_NAME in files else {}
+    return [
+        (path, read, manifest.get(path, folder_tags(path)))
+        for path, read in sorted(files.items()) if _is_image(path)
+    ]
+
+
+def normalize_image(path: str, data: bytes) -> Dict[str, Any]:
+    """
+    Decodes one photo and re-encodes it the way the gallery serves it. Runs in a worker process.
+
+    The photo is turned upright following its EXIF orientation, converted to RGB,
+    scaled down to ``IMPORT_MAX_SIDE`` and saved as a progressive JPEG. The dimensions
+    and the perceptual hash are computed from the decoded pixels on the way.
+
+    Args:
+        path (str): Path of the photo in the archive, for the file name and the errors.
+        data (bytes): The content of the file.
+
+    Returns:
+        Dict[str, Any]: ``{"path", "content", "width", "height", "file_size", "image_format",
+        "perceptual_hash"}``, or ``{"path", "error"}`` if the file is not a readable image.
+    """
+    try:
+        with Image.open(BytesIO(data)) as opened:
+            image = ImageOps.exif_transpose(opened).convert('RGB')
+        image.thumbnail((IMPORT_MAX_SIDE, IMPORT_MAX_SIDE), Image.LANCZOS)
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', quality=IMPORT_QUALITY, optimize=True, progressive=True)
+    except Exception as e:
+        return {'path': path, 'error': str(e)}
+    content = buffer.getvalue()
+    return {
+        'path': path,
+        'content': content,
+        'width': image.width,
+        'height': image.height,
+        'file_size': len(content),
+        'image_format': 'JPEG',
+        'perceptual_hash': f"{difference_hash(image):016x}",
+    }
+
+
+def _normalize(args: Tuple[str, bytes]) -> Dict[str, Any]:
+    return normalize_image(*args)
+
+
+def ensure_tags(names: Iterable[str]) -> Dict[str, Tag]:
+    """
+    Returns the tags with the given names, creating the missing ones with a single INSERT.
+
+    Args:
+        names (Iterable[str]): Tag names; duplicates are allowed.
+
+    Returns:
+        Dict[str, Tag]: Name -> tag, for every name.
+    """
+    names = set(names)
+    if not names:
+        return {}
+    tags = {tag.name: tag for tag in Tag.objects.filter(name__in=names)}
+    missing = names - set(tags)
+    if missing:
+        # ignore_conflicts: a tag created meanwhile by someone else is simply reused.
+        Tag.objects.bulk_create([Tag(name=name) for name in sorted(missing)], ignore_conflicts=True)
+        created = list(Tag.objects.filter(name__in=missing))
+        tags.update((tag.name, tag) for tag in created)
+        _index_new_tags(created)
+    return tags
+
+
+def _index_new_tags(tags: List[Tag]) -> None:
+    # bulk_create sends no signals: do what the post_save receivers would.
+    from blog.search import index_instance
+
+    for tag in tags:
+        index_instance(tag)
+    invalidate_model(Tag)
+
+
+def _batches(entries: List[Entry], size: int) -> Iterator[List[Entry]]:
+    for start in range(0, len(entries), size):
+        yield entries[start:start + size]
+
+
+def _store_batch(results: List[Dict[str, Any]], tags: Dict[str, List[str]]) -> List[PortfolioImage]:
+    """
+    Saves the files of a batch, then inserts its photos and their tags with one query each.
+
+    If a file cannot be saved or the insert fails, the files already saved for the
+    batch are deleted before the error is raised, so no file is left without a row.
+    """
+    upload_field = PortfolioImage._meta.get_field('image')
+    photos = []
+    try:
+        for result in results:
+            stem = posixpath.splitext(posixpath.basename(result['path']))[0]
+            name = default_storage.save(upload_field.generate_filename(None, f"{stem}.jpg"), ContentFile(result['content']))
+            photos.append(PortfolioImage(
+                image=name,
+                width=result['width'],
+                height=result['height'],
+                file_size=result['file_size'],
+                image_format=result['image_format'],
+                perceptual_hash=result['perceptual_hash'],
+            ))
+
+        tag_map = ensure_tags(name for result in results for name in tags[result['path']])
+        with transaction.atomic():
+            PortfolioImage.objects.bulk_create(photos)
+            Through = PortfolioImage.tags.through
+            Through.objects.bulk_create([
+                Through(portfolioimage_id=photo.pk, tag_id=tag_map[name].pk)
+                for photo, result in zip(photos, results)
+                for name in set(tags[result['path']])
+            ])
+    except Exception:
+        for photo in photos:
+            try:
+                default_storage.delete(photo.image.name)
+            except Exception as e:
+                logger.error(f"Error deleting imported file {photo.image.name}: {e}")
+        raise
+    return photos
+
+
+def import_archive(source: Union[str, Path, Any], workers: Optional[int] = None,
+                   batch_size: int = IMPORT_BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Imports every image of a zip archive or a directory into the portfolio.
+
+    Photos are decoded and normalized in a process pool, a batch at a time so the
+    archive is never held in memory at once. Each batch is then stored with one
+    ``bulk_create`` for the photos and one for their rows of the tag through table;
+    missing tags are created with a single INSERT. Derivatives and placeholders are
+    queued like for a photo uploaded in the admin.
+
+    Args:
+        source: A directory, a zip file path, or an open zip file.
+        workers (Optional[int]): Worker processes. Defaults to the number of CPUs; 1 decodes in this process.
+        batch_size (int): Photos decoded and inserted per round.
+
+    Returns:
+        Dict[str, Any]: ``{"imported": 120, "failed": [("roses/bad.jpg", "cannot identify image file"), ...]}``.
+    """
+    from .duplicates import file_hashes
+    from .signals import queue_image_derivatives, queue_image_placeholder
+
+    entries = read_entries(source)
+    tags = {path: entry_tags for path, _, entry_tags in entries}
+    workers = workers or os.cpu_count() or 1
+    imported: List[PortfolioImage] = []
+    failed: List[Tuple[str, str]] = []
+
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        for batch in _batches(entries, batch_size):
+            payloads = [(path, read()) for path, read, _ in batch]
+            if executor is None:
+                results = [_normalize(payload) for payload in payloads]
+            else:
+                results = list(executor.map(_normalize, payloads))
+            failed.extend((result['path'], result['error']) for result in results if 'error' in result)
+            imported.extend(_store_batch([result for result in results if 'error' not in result], tags))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    for photo in imported:
+        queue_image_derivatives(PortfolioImage, photo)
+        queue_image_placeholder(PortfolioImage, photo)
+    if imported:
+        # bulk_create sends no signals: file the new hashes like the post_save receivers would.
+        file_hashes(imported)
+        invalidate_model(PortfolioImage)
+        bump_content_version()
+    logger.info(f"Imported {len(imported)} portfolio photos, {len(failed)} failed.")
+    return {'imported': len(imported), 'failed': failed}
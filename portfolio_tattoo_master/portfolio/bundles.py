@@ -0,0 +1,224 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import posixpath
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+
+logger = logging.getLogger(__name__)
+
+# Source files of every bundle, relative to the static directories, in load order.
+# Scripts that only work on one page get their own bundle: an error in a
+# concatenated file stops the rest of the bundle.
+STATIC_BUNDLES: Dict[str, List[str]] = getattr(settings, 'STATIC_BUNDLES', {
+    'site.css': ['css/core-style.css', 'css/responsive.css'],
+    'site.js': [
+        'js/jquery/jquery-2.2.4.min.js',
+        'js/owl.carousel.min.js',
+        'js/popper.min.js',
+        'js/bootstrap.min.js',
+        'js/plugins.js',
+        'js/active.js',
+    ],
+    'contact.js': ['js/map-active.js'],
+    'gallery.js': ['js/gallery-scroll.js'],
+})
+
+# Directory the built bundles are written to. It must be served under STATIC_URL + 'bundles/'.
+STATIC_BUNDLE_ROOT = Path(getattr(settings, 'STATIC_BUNDLE_ROOT', settings.BASE_DIR / 'static' / 'bundles'))
+
+BUNDLE_URL_PREFIX = 'bundles/'
+MANIFEST_NAME = 'manifest.json'
+HASH_LENGTH = 12
+
+# Only built files are served by the middleware: <name>.<hash>.<ext>, optionally compressed.
+HASHED_NAME_RE = re.compile(rf'^[\w-]+\.[0-9a-f]{{{HASH_LENGTH}}}\.(css|js)$')
+
+IMPORT_RE = re.compile(r'@import\s+(?:url\()?\s*["\']?([^"\')\s;]+)["\']?\s*\)?\s*;')
+URL_RE = re.compile(r'url\(\s*(["\']?)([^"\')]+)\1\s*\)')
+STRING_OR_COMMENT_RE = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|/\*.*?\*/', re.S)
+STRING_RE = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')')
+
+
+def _is_remote(url: str) -> bool:
+    return bool(re.match(r'^([a-z]+:|//|#)', url, re.I))
+
+
+def _find(path: str) -> Path:
+    found = finders.find(path)
+    if not found:
+        raise FileNotFoundError(f"Static file {path} not found.")
+    return Path(found)
+
+
+def _rebase_urls(css: str, source: str) -> str:
+    """
+    Rewrites the relative ``url()`` of a stylesheet so they still point to
+    the same files once the stylesheet is served from ``bundles/``.
+    """
+    def rebase(match: re.Match) -> str:
+        quote, url = match.groups()
+        if _is_remote(url):
+            return match.group(0)
+        target = posixpath.normpath(posixpath.join(posixpath.dirname(source), url))
+        return f"url({quote}{posixpath.relpath(target, BUNDLE_URL_PREFIX.rstrip('/'))}{quote})"
+
+    return URL_RE.sub(rebase, css)
+
+
+def _inline_css(source: str, remote_imports: List[str], seen: Optional[set] = None) -> str:
+    """
+    Returns a stylesheet with its local ``@import`` inlined and its URLs rebased.
+    Remote imports are collected in ``remote_imports``: CSS only allows them at the top.
+    """
+    seen = set() if seen is None else seen
+    if source in seen:
+        return ''
+    seen.add(source)
+    css = STRING_OR_COMMENT_RE.sub(lambda match: match.group(1) or '', _find(source).read_text(encoding='utf-8'))
+
+    def inline(match: re.Match) -> str:
+        url = match.group(1)
+        if _is_remote(url):
+            remote_imports.append(match.group(0))
+            return ''
+        return _inline_css(posixpath.normpath(posixpath.join(posixpath.dirname(source), url)), remote_imports, seen)
+
+    return _rebase_urls(IMPORT_RE.sub(inline, css), source)
+
+
+def minify_css(css: str) -> str:
+    """
+    Removes comments and the whitespace CSS does not need, leaving strings untouched.
+    """
+    css = STRING_OR_COMMENT_RE.sub(lambda match: match.group(1) or '', css)
+    parts = STRING_RE.split(css)
+    for index in range(0, len(parts), 2):
+        part = re.sub(r'\s+', ' ', parts[index])
+        part = re.sub(r'\s*([{};,>])\s*', r'\1', part)
+        parts[index] = re.sub(r':\s+', ':', part).replace(';}', '}')
+    return ''.join(parts).strip()
+
+
+def minify_js(js: str, path: str) -> str:
+    """
+    Minifies a script with ``rjsmin`` when it is installed.
+
+    The fallback only drops indentation and blank lines, which cannot change the
+    meaning of a script unless it has template literals (then only trailing
+    whitespace is dropped). Already minified files are kept as they are.
+    """
+    if path.endswith('.min.js'):
+        return js.strip()
+    try:
+        import rjsmin
+    except ImportError:
+        strip = str.rstrip if '`' in js else str.strip
+        return '\n'.join(line for line in map(strip, js.splitlines()) if line)
+    return rjsmin.jsmin(js)
+
+
+def build_source(name: str, sources: Sequence[str]) -> str:
+    """
+    Concatenates and minifies the sources of a bundle.
+
+    Args:
+        name (str): The bundle name; its extension tells CSS from JavaScript.
+        sources (Sequence[str]): Paths relative to the static directories.
+
+    Returns:
+        str: The content of the bundle.
+    """
+    if name.endswith('.css'):
+        remote_imports: List[str] = []
+        seen: set = set()
+        css = '\n'.join(_inline_css(source, remote_imports, seen) for source in sources)
+        return minify_css('\n'.join(remote_imports + [css]))
+    # Semicolons keep a file without a trailing one from running into the next.
+    return ';\n'.join(minify_js(_find(source).read_text(encoding='utf-8'), source) for source in sources) + ';'
+
+
+def _compress(path: Path, content: bytes) -> None:
+    with open(f"{path}.gz", 'wb') as compressed:
+        # mtime=0: the same content always gives the same file.
+        with gzip.GzipFile(fileobj=compressed, mode='wb', compresslevel=9, mtime=0) as gz:
+            gz.write(content)
+    try:
+        import brotli
+    except ImportError:
+        return
+    Path(f"{path}.br").write_bytes(brotli.compress(content, quality=11))
+
+
+def build_bundles(root: Optional[Path] = None) -> Dict[str, str]:
+    """
+    Builds every bundle of ``STATIC_BUNDLES`` into a content-hashed file with gzip
+    (and brotli, if installed) variants, and writes the manifest the template tags read.
+
+    Files of earlier builds are kept, so pages cached with their URLs still load.
+
+    Args:
+        root (Optional[Path]): Output directory. Defaults to ``STATIC_BUNDLE_ROOT``.
+
+    Returns:
+        Dict[str, str]: The manifest: bundle name -> path relative to the static URL.
+    """
+    root = STATIC_BUNDLE_ROOT if root is None else Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+
+    manifest = {}
+    for name, sources in STATIC_BUNDLES.items():
+        content = build_source(name, sources).encode('utf-8')
+        stem, extension = name.rsplit('.', 1)
+        filename = f"{stem}.{hashlib.sha256(content).hexdigest()[:HASH_LENGTH]}.{extension}"
+        path = root / filename
+        if not path.exists():
+            path.write_bytes(content)
+            _compress(path, content)
+        manifest[name] = BUNDLE_URL_PREFIX + filename
+        logger.info(f"Bundle {name} built: {filename} ({len(content)} bytes).")
+
+    # Written aside and renamed, so a worker never reads a half-written manifest.
+    temporary = root / f"{MANIFEST_NAME}.tmp"
+    temporary.write_text(json.dumps(manifest, indent=2), encoding='utf-8')
+    os.replace(temporary, root / MANIFEST_NAME)
+    return manifest
+
+
+@lru_cache(maxsize=8)
+def _read_manifest(path: str, version: tuple) -> Dict[str, str]:
+    try:
+        return json.loads(Path(path).read_text(encoding='utf-8'))
+    except FileNotFoundError:
+        return {}
+
+
+def load_manifest() -> Dict[str, str]:
+    """
+    Returns the manifest of the last build. Empty when nothing was built.
+
+    The parsed manifest is cached under the file's inode, size and modification
+    time: every process picks up a new build on its next call, at the cost of a ``stat``.
+    """
+    path = STATIC_BUNDLE_ROOT / MANIFEST_NAME
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return {}
+    return _read_manifest(str(path), (stat.st_ino, stat.st_size, stat.st_mtime_ns))
+
+
+def bundle_paths(name: str) -> List[str]:
+    """
+    Returns the static paths to load for a bundle: the built file, or its
+    sources one by one when the bundles were not built (development, tests).
+    """
+    built = load_manifest().get(name)
+    return [built] if built else list(STATIC_BUNDLES[name])
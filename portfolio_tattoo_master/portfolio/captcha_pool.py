@@ -0,0 +1,181 @@
+import datetime
+import logging
+import secrets
+from typing import Dict, List, Optional, Tuple
+
+from captcha.conf import settings as captcha_settings
+from captcha.models import CaptchaStore
+from captcha import views as captcha_views
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Number of ready challenges kept in the pool.
+CAPTCHA_POOL_SIZE: int = getattr(settings, 'CAPTCHA_POOL_SIZE', 200)
+
+# Seconds a challenge may wait in the pool. It stays valid for CAPTCHA_TIMEOUT minutes after that.
+CAPTCHA_POOL_TTL: int = getattr(settings, 'CAPTCHA_POOL_TTL', 60 * 60)
+
+HEAD_KEY = 'captcha_pool:head'
+TAIL_KEY = 'captcha_pool:tail'
+FILL_LOCK_KEY = 'captcha_pool:fill_lock'
+FILL_LOCK_TIMEOUT = 60 * 5
+
+CaptchaImage = Tuple[bytes, str]
+
+
+def _slot_key(position: int) -> str:
+    return f"captcha_pool:slot:{position}"
+
+
+def _image_key(hashkey: str) -> str:
+    return f"captcha_pool:image:{hashkey}"
+
+
+def _lifetime() -> int:
+    return CAPTCHA_POOL_TTL + int(captcha_settings.CAPTCHA_TIMEOUT) * 60
+
+
+def render_captcha_image(store: CaptchaStore) -> CaptchaImage:
+    """
+    Draws the image of a challenge with the captcha app's own image view, so it is
+    exactly the image the app would serve for the key (the view seeds its drawing with it).
+
+    Args:
+        store (CaptchaStore): The saved challenge.
+
+    Returns:
+        CaptchaImage: The image bytes and their content type.
+    """
+    response = captcha_views.captcha_image(None, store.hashkey, scale=1)
+    return response.content, response['Content-Type']
+
+
+def new_stores(count: int) -> List[CaptchaStore]:
+    """
+    Creates challenges valid for ``CAPTCHA_POOL_TTL`` plus ``CAPTCHA_TIMEOUT``, with a single INSERT.
+    """
+    expiration = timezone.now() + datetime.timedelta(seconds=_lifetime())
+    stores = []
+    for _ in range(count):
+        challenge, response = captcha_settings.get_challenge()()
+        stores.append(CaptchaStore(
+            challenge=challenge,
+            response=response.lower(),
+            hashkey=secrets.token_hex(20),
+            expiration=expiration,
+        ))
+    return CaptchaStore.objects.bulk_create(stores)
+
+
+def _live_positions() -> Tuple[int, int, List[int]]:
+    """
+    Returns the head, the tail and the positions between them whose slot has not expired yet.
+    """
+    positions = cache.get_many([HEAD_KEY, TAIL_KEY])
+    head, tail = positions.get(HEAD_KEY, 0), positions.get(TAIL_KEY, 0)
+    keys = {_slot_key(position): position for position in range(head + 1, tail + 1)}
+    live = cache.get_many(list(keys)) if keys else {}
+    return head, tail, sorted(keys[key] for key in live)
+
+
+def available() -> int:
+    """
+    Returns the number of challenges waiting in the pool. Expired slots are not counted.
+    """
+    return len(_live_positions()[2])
+
+
+def fill_pool(size: Optional[int] = None) -> int:
+    """
+    Tops the pool up: creates the missing challenges, renders their images and
+    publishes them in cache slots the requests lease from.
+
+    Slots expire after ``CAPTCHA_POOL_TTL``. The head is first moved past the
+    expired slots at the front, so leases do not walk through them, and the pool
+    is refilled up to ``size`` live slots.
+
+    Args:
+        size (Optional[int]): Target number of challenges. Defaults to ``CAPTCHA_POOL_SIZE``.
+
+    Returns:
+        int: The number of challenges added.
+    """
+    size = CAPTCHA_POOL_SIZE if size is None else size
+    if not cache.add(FILL_LOCK_KEY, 1, timeout=FILL_LOCK_TIMEOUT):
+        return 0
+
+    try:
+        head, tail, live = _live_positions()
+        # Skip the expired slots with an atomic increment: concurrent leases may also
+        # move the head, and the head must never go back to a slot already handed out.
+        skip = (live[0] - 1 if live else tail) - head
+        if skip > 0:
+            cache.add(HEAD_KEY, 0, timeout=None)
+            head = cache.incr(HEAD_KEY, skip)
+
+        missing = size - len(live)
+        if missing <= 0:
+            return 0
+
+        # Leases may have run past the tail while the pool was empty: start after them.
+        start = max(head, tail)
+        images: Dict[str, CaptchaImage] = {}
+        slots: Dict[str, str] = {}
+        for offset, store in enumerate(new_stores(missing), start=1):
+            images[_image_key(store.hashkey)] = render_captcha_image(store)
+            slots[_slot_key(start + offset)] = store.hashkey
+        cache.set_many(images, timeout=_lifetime())
+        cache.set_many(slots, timeout=CAPTCHA_POOL_TTL)
+        cache.set(TAIL_KEY, start + missing, timeout=None)
+    finally:
+        cache.delete(FILL_LOCK_KEY)
+
+    logger.info(f"{missing} captcha challenges added to the pool.")
+    return missing
+
+
+def lease_captcha() -> str:
+    """
+    Takes a challenge from the pool for one form render.
+
+    Each slot is handed out once: its position comes from an atomic increment.
+    When the pool is empty a challenge is generated inline until Celery beat
+    refills it; the request never talks to the broker.
+
+    Returns:
+        str: The hashkey of the challenge.
+    """
+    cache.add(HEAD_KEY, 0, timeout=None)
+    try:
+        position = cache.incr(HEAD_KEY)
+    except ValueError:
+        position = None
+
+    hashkey = cache.get(_slot_key(position)) if position else None
+    if hashkey:
+        cache.delete(_slot_key(position))
+        return hashkey
+
+    logger.warning("Captcha pool empty, generating a challenge inline.")
+    return CaptchaStore.generate_key()
+
+
+def cached_image(hashkey: str) -> Optional[CaptchaImage]:
+    """
+    Returns the pre-rendered image of a pooled challenge, if it is still cached.
+    """
+    return cache.get(_image_key(hashkey))
+
+
+def remove_expired() -> int:
+    """
+    Deletes every expired challenge with a single DELETE.
+
+    Returns:
+        int: The number of deleted challenges.
+    """
+    deleted, _ = CaptchaStore.objects.filter(expiration__lte=timezone.now()).delete()
+    return deleted
@@ -0,0 +1,26 @@
+from typing import Any, Dict
+
+from django.http import HttpRequest
+
+from .page_cache import get_content_version
+from .utils import get_instagram_tiles
+
+
+def content_version(request: HttpRequest) -> Dict[str, Any]:
+    """
+    Exposes the content version to ``{% cache %}`` fragment keys.
+
+    The version is passed as a callable, so templates without cached
+    fragments never read it from the cache.
+    """
+    return {'content_version': get_content_version}
+
+
+def instagram_tiles(request: HttpRequest) -> Dict[str, Any]:
+    """
+    Exposes the Instagram feed tiles to the carousel included by several pages.
+
+    Passed as a callable like ``content_version``: the snapshot is only read
+    by templates that render the carousel outside a cached fragment.
+    """
+    return {'instagram_tiles': get_instagram_tiles}
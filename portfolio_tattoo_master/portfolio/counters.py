@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, Iterable, Set, Tuple
+
+from django.core.cache import BaseCache
+
+
+class SharedCounters:
+    """
+    Statistics counted in process and added to counters in a shared cache now and then,
+    so the hot path never waits on the cache and every worker contributes to the totals.
+
+    Usage::
+
+        counters = SharedCounters('ratelimit:stats', lambda: caches['default'], interval=10)
+        counters.add('portfolio.views.contact', hits=1, limited=1)
+        counters.totals(['portfolio.views.contact'], ('hits', 'limited'))
+    """
+
+    def __init__(self, namespace: str, store: Callable[[], BaseCache], interval: int = 10) -> None:
+        self.namespace = namespace
+        self.store = store
+        self.interval = interval
+        self._pending: Counter = Counter()
+        self._pushed_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def key(self, group: str, field: str) -> str:
+        return f"{self.namespace}:{group}:{field}"
+
+    def _index_key(self) -> str:
+        return f"{self.namespace}:groups"
+
+    def add(self, group: str, **counts: int) -> None:
+        """
+        Counts events of a group, pushing the local counts when ``interval`` seconds have passed.
+        """
+        with self._lock:
+            for field, value in counts.items():
+                if value:
+                    self._pending[(group, field)] += value
+            due = time.monotonic() - self._pushed_at >= self.interval
+        if due:
+            self.push()
+
+    def push(self) -> None:
+        """
+        Adds the local counts to the shared ones.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._pushed_at = time.monotonic()
+        if not pending:
+            return
+        store = self.store()
+        groups = {group for group, _ in pending}
+        indexed = store.get(self._index_key(), set())
+        if not groups <= indexed:
+            # Read-modify-write: a group lost to a race is added back by the next push of its counters.
+            store.set(self._index_key(), indexed | groups, timeout=None)
+        for (group, field), value in pending.items():
+            key = self.key(group, field)
+            store.add(key, 0, timeout=None)
+            try:
+                store.incr(key, value)
+            except ValueError:
+                store.set(key, value, timeout=None)
+
+    def local(self) -> Dict[Tuple[str, str], int]:
+        """
+        Returns the counts of this process not pushed yet.
+        """
+        with self._lock:
+            return dict(self._pending)
+
+    def groups(self) -> Set[str]:
+        """
+        Returns the groups counted by any process.
+        """
+        self.push()
+        return set(self.store().get(self._index_key(), set()))
+
+    def totals(self, groups: Iterable[str], fields: Iterable[str]) -> Dict[str, Dict[str, int]]:
+        """
+        Pushes the local counts and returns the shared totals.
+
+        Args:
+            groups (Iterable[str]): The groups to report.
+            fields (Iterable[str]): The counters of each group.
+
+        Returns:
+            Dict[str, Dict[str, int]]: ``{group: {field: total}}``, 0 for counters never incremented.
+        """
+        self.push()
+        groups, fields = list(groups), list(fields)
+        values = self.store().get_many([self.key(group, field) for group in groups for field in fields])
+        return {group: {field: values.get(self.key(group, field), 0) for field in fields} for group in groups}
@@ -0,0 +1,174 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Awaitable, Callable, Iterator, Optional, Type, Union
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Model
+from django.http import HttpRequest, HttpResponse
+
+# Alias of the read replica in DATABASES. Without it every query goes to the primary.
+REPLICA_DATABASE: str = getattr(settings, 'REPLICA_DATABASE', 'replica')
+
+# Seconds a visitor reads from the primary after one of their requests wrote to it,
+# so they see their own changes despite the replication lag.
+REPLICA_PIN_SECONDS: int = getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+
+PIN_COOKIE = 'db_primary'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RoutingState:
+    """
+    Routing decisions of the current request: where it reads, whether it read
+    from the replica, and whether it wrote.
+    """
+
+    def __init__(self) -> None:
+        self.read_alias: Optional[str] = None
+        self.read_replica = False
+        self.wrote = False
+
+
+# Shared by reference with the threads sync_to_async runs the ORM in.
+_state: ContextVar[Optional[RoutingState]] = ContextVar('db_routing_state', default=None)
+
+
+def replica_configured() -> bool:
+    return REPLICA_DATABASE in settings.DATABASES
+
+
+class ReplicaRouter:
+    """
+    Sends the reads of views marked with ``use_replica`` to the replica and everything else to the primary.
+
+    Reads inside a transaction of the primary stay on it, so a view never reads
+    around its own uncommitted writes. Migrations only run on the primary.
+    """
+
+    def db_for_read(self, model: Type[Model], **hints: Any) -> Optional[str]:
+        state = _state.get()
+        if state is None or state.read_alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        state.read_replica = True
+        return state.read_alias
+
+    def db_for_write(self, model: Type[Model], **hints: Any) -> Optional[str]:
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1: Model, obj2: Model, **hints: Any) -> bool:
+        # The replica holds the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db: str, app_label: str, model_name: Optional[str] = None, **hints: Any) -> bool:
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReadYourWritesMiddleware:
+    """
+    Tracks the writes of each request and pins the visitor to the primary for
+    ``REPLICA_PIN_SECONDS`` after one, with a short-lived cookie.
+
+    Works in both a sync and an async stack. The routing state is set in the
+    request's own context, which ``sync_to_async`` copies to the threads running the ORM.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable[[HttpRequest], Union[HttpResponse, Awaitable[HttpResponse]]]) -> None:
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> Union[HttpResponse, Awaitable[HttpResponse]]:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = RoutingState()
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.pin(state, response)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        state = RoutingState()
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.pin(state, response)
+
+    @staticmethod
+    def pin(state: RoutingState, response: HttpResponse) -> HttpResponse:
+        if state.wrote:
+            response.set_cookie(PIN_COOKIE, '1', max_age=REPLICA_PIN_SECONDS, httponly=True, samesite='Lax')
+        return response
+
+
+def replica_was_read() -> bool:
+    """
+    Tells whether the current request read anything from the replica, which may lag behind the primary.
+    """
+    state = _state.get()
+    return state is not None and state.read_replica
+
+
+@contextmanager
+def primary_reads() -> Iterator[None]:
+    """
+    Sends the reads of the block to the primary, even in a view marked with ``use_replica``.
+
+    Used for data that outlives the request (snapshots, cached pages): built from a
+    lagging replica, it would be served stale to every visitor.
+    """
+    state = _state.get()
+    if state is None or state.read_alias is None:
+        yield
+        return
+    alias, state.read_alias = state.read_alias, None
+    try:
+        yield
+    finally:
+        state.read_alias = alias
+
+
+def _read_from_replica(request: HttpRequest) -> None:
+    state = _state.get()
+    if state is not None and replica_configured() and request.method in SAFE_METHODS \
+            and PIN_COOKIE not in request.COOKIES:
+        state.read_alias = REPLICA_DATABASE
+
+
+def use_replica(view: Callable[..., HttpResponse]) -> Callable[..., HttpResponse]:
+    """
+    Lets a read-only view read from the replica. Unsafe methods and visitors
+    who wrote in the last ``REPLICA_PIN_SECONDS`` keep reading from the primary.
+
+    Usage::
+
+        @use_replica
+        def portfolio(request): ...
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse:
+            _read_from_replica(request)
+            return await view(request, *args, **kwargs)
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse:
+        _read_from_replica(request)
+        return view(request, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,199 @@
+import logging
+import os
+from io import BytesIO
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Model
+from django.db.models.fields.files import FieldFile
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Widths (in pixels) generated for every uploaded image.
+DERIVATIVE_WIDTHS: Tuple[int, ...] = tuple(
+    getattr(settings, 'IMAGE_DERIVATIVE_WIDTHS', (480, 960, 1440, 1920))
+)
+
+# Output formats in order of preference, mapped to Pillow format names and extensions.
+DERIVATIVE_FORMATS: Dict[str, Tuple[str, str]] = {
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+}
+
+DERIVATIVE_QUALITY: int = getattr(settings, 'IMAGE_DERIVATIVE_QUALITY', 80)
+
+DERIVATIVES_ROOT = 'derivatives'
+
+
+def derivative_name(source_name: str, width: int, extension: str) -> str:
+    """
+    Builds the storage name of a derivative for the given source file.
+
+    Args:
+        source_name (str): Storage name of the original image, e.g. ``portfolio/ink.jpg``.
+        width (int): Width of the derivative in pixels.
+        extension (str): File extension of the derivative format.
+
+    Returns:
+        str: Storage name such as ``derivatives/portfolio/ink-jpg-960.webp``. The source
+        extension is kept so ``ink.jpg`` and ``ink.png`` get distinct derivatives.
+    """
+    stem, source_extension = os.path.splitext(source_name)
+    source_extension = source_extension.lstrip('.').lower()
+    if source_extension:
+        stem = f"{stem}-{source_extension}"
+    return f"{DERIVATIVES_ROOT}/{stem}-{width}.{extension}"
+
+
+def target_widths(original_width: int) -> List[int]:
+    """
+    Returns the derivative widths that make sense for an image.
+
+    Images are never upscaled: widths larger than the original are dropped,
+    and the original width is used instead when no configured width fits.
+
+    Args:
+        original_width (int): Width of the uploaded image.
+
+    Returns:
+        List[int]: Ascending list of widths to generate.
+    """
+    widths = [width for width in DERIVATIVE_WIDTHS if width < original_width]
+    if not widths or max(DERIVATIVE_WIDTHS) > original_width:
+        widths.append(original_width)
+    return sorted(set(widths))
+
+
+def build_derivatives(field_file: FieldFile) -> Dict[str, Any]:
+    """
+    Decodes the uploaded image once and writes every width/format derivative to storage.
+
+    Existing files are never overwritten: when a name is taken, the storage picks a
+    free one, so derivatives still referenced by another row stay in place.
+
+    Args:
+        field_file (FieldFile): The image field value of a model instance.
+
+    Returns:
+        Dict[str, Any]: Description of the generated files, stored on the model::
+
+            {
+                "source": "portfolio/ink.jpg",
+                "width": 4000,
+                "height": 3000,
+                "webp": {"480": "derivatives/portfolio/ink-jpg-480.webp", ...},
+                "jpeg": {"480": "derivatives/portfolio/ink-jpg-480.jpg", ...},
+            }
+    """
+    storage = field_file.storage
+    with field_file.open('rb') as source:
+        with Image.open(source) as opened:
+            image = ImageOps.exif_transpose(opened)
+            image = image.convert('RGB')
+
+    derivatives: Dict[str, Any] = {
+        'source': field_file.name,
+        'width': image.width,
+        'height': image.height,
+    }
+    for key, (pil_format, extension) in DERIVATIVE_FORMATS.items():
+        derivatives[key] = {}
+        for width in target_widths(image.width):
+            height = round(image.height * width / image.width)
+            resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+
+            buffer = BytesIO()
+            resized.save(buffer, pil_format, quality=DERIVATIVE_QUALITY, optimize=True)
+
+            name = derivative_name(field_file.name, width, extension)
+            derivatives[key][str(width)] = storage.save(name, ContentFile(buffer.getvalue()))
+
+    return derivatives
+
+
+def delete_derivatives(derivatives: Optional[Dict[str, Any]], keep: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Removes every derivative file listed in a derivatives mapping.
+
+    Args:
+        derivatives (Optional[Dict[str, Any]]): The mapping stored on the model.
+        keep (Optional[Dict[str, Any]]): A mapping whose files must survive, e.g. the
+            derivatives just built to replace ``derivatives``.
+    """
+    kept = set(iter_derivative_names(keep))
+    for name in iter_derivative_names(derivatives):
+        if name in kept:
+            continue
+        try:
+            default_storage.delete(name)
+        except Exception as e:
+            logger.error(f"Error deleting derivative {name}: {e}")
+
+
+def iter_derivative_names(derivatives: Optional[Dict[str, Any]]) -> Iterable[str]:
+    """
+    Yields the storage names of all derivatives in a mapping.
+    """
+    for key in DERIVATIVE_FORMATS:
+        yield from (derivatives or {}).get(key, {}).values()
+
+
+def needs_derivatives(instance: Model, field_name: str = 'image') -> bool:
+    """
+    Checks whether the derivatives stored on an instance are missing or outdated.
+
+    Args:
+        instance (Model): A model instance with an image field and a ``derivatives`` field.
+        field_name (str): Name of the image field.
+
+    Returns:
+        bool: True if the image is set and its derivatives were built for another file.
+    """
+    field_file = getattr(instance, field_name)
+    if not field_file:
+        return False
+    return (instance.derivatives or {}).get('source') != field_file.name
+
+
+def srcset(derivatives: Optional[Dict[str, Any]], fmt: str) -> str:
+    """
+    Builds a ``srcset`` attribute value for one format.
+
+    Args:
+        derivatives (Optional[Dict[str, Any]]): The mapping stored on the model.
+        fmt (str): One of the keys of ``DERIVATIVE_FORMATS``.
+
+    Returns:
+        str: A value like ``/media/...-480.webp 480w, /media/...-960.webp 960w``,
+             or an empty string if no derivatives exist.
+    """
+    files = (derivatives or {}).get(fmt, {})
+    return ", ".join(
+        f"{default_storage.url(name)} {width}w"
+        for width, name in sorted(files.items(), key=lambda item: int(item[0]))
+    )
+
+
+def derivative_url(derivatives: Optional[Dict[str, Any]], width: int, fmt: str = 'jpeg') -> Optional[str]:
+    """
+    Returns the URL of the smallest derivative at least ``width`` pixels wide.
+
+    Falls back to the largest available derivative when none is wide enough.
+
+    Args:
+        derivatives (Optional[Dict[str, Any]]): The mapping stored on the model.
+        width (int): The desired minimum width.
+        fmt (str): One of the keys of ``DERIVATIVE_FORMATS``.
+
+    Returns:
+        Optional[str]: The derivative URL, or None if no derivatives exist.
+    """
+    files = (derivatives or {}).get(fmt, {})
+    if not files:
+        return None
+    widths = sorted(int(key) for key in files)
+    chosen = next((candidate for candidate in widths if candidate >= width), widths[-1])
+    return default_storage.url(files[str(chosen)])
@@ -0,0 +1,115 @@
+from typing import Dict, Iterable, List, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Model
+
+from .models import MainImage, PortfolioImage
+from .perceptual_hash import BKTree
+from .snapshots import get_snapshot, invalidate_snapshot, patch_snapshot, register_snapshot
+
+# Largest number of differing hash bits (out of 64) for two images to count as the same photo.
+DUPLICATE_HASH_DISTANCE: int = getattr(settings, 'DUPLICATE_HASH_DISTANCE', 10)
+
+HASHED_MODELS = (MainImage, PortfolioImage)
+
+HASH_SNAPSHOT = 'image_hashes'
+
+# An image of the library: (model label, primary key).
+ImageRef = Tuple[str, int]
+
+
+@register_snapshot(HASH_SNAPSHOT)
+def build_hash_tree() -> BKTree:
+    """
+    Files the perceptual hash of every main page and portfolio image in a BK-tree,
+    with one query per model. Images never hashed are left out.
+
+    The snapshot is not invalidated by every save of the models: new hashes are
+    filed into the cached tree (``file_hashes``) and the tree is only rebuilt when
+    a filed hash changes or its image is deleted (``forget_hashes``).
+    """
+    tree = BKTree()
+    for model in HASHED_MODELS:
+        for pk, value in model.objects.exclude(perceptual_hash='').values_list('pk', 'perceptual_hash'):
+            tree.add(int(value, 16), (model._meta.label, pk))
+    return tree
+
+
+def file_hashes(instances: Iterable[Model]) -> None:
+    """
+    Adds the hashes of new images to the cached tree once the current transaction commits.
+
+    Args:
+        instances (Iterable[Model]): Saved MainImage or PortfolioImage instances whose hash is not filed yet.
+    """
+    items = [(int(instance.perceptual_hash, 16), (instance._meta.label, instance.pk))
+             for instance in instances if instance.perceptual_hash]
+
+    def change(tree: BKTree) -> None:
+        for value, ref in items:
+            tree.add(value, ref)
+
+    if items:
+        patch_snapshot(HASH_SNAPSHOT, change)
+
+
+def forget_hashes() -> None:
+    """
+    Rebuilds the tree on its next use, once the current transaction commits: a filed hash changed or was deleted.
+    """
+    transaction.on_commit(lambda: invalidate_snapshot(HASH_SNAPSHOT))
+
+
+def find_near_duplicates(instance: Model, distance: int = DUPLICATE_HASH_DISTANCE) -> List[Tuple[int, ImageRef]]:
+    """
+    Looks up the images of the library that look like the image of an instance.
+
+    Args:
+        instance (Model): A saved MainImage or PortfolioImage.
+        distance (int): Largest Hamming distance between the hashes.
+
+    Returns:
+        List[Tuple[int, ImageRef]]: ``(distance, ("portfolio.PortfolioImage", 12))`` pairs,
+        closest first, without the instance itself.
+    """
+    if not instance.perceptual_hash:
+        return []
+    own = (instance._meta.label, instance.pk)
+    matches = get_snapshot(HASH_SNAPSHOT).search(int(instance.perceptual_hash, 16), distance)
+    return [(bits, ref) for bits, ref in matches if ref != own]
+
+
+def duplicate_clusters(distance: int = DUPLICATE_HASH_DISTANCE) -> List[List[ImageRef]]:
+    """
+    Groups the whole library into clusters of images that look alike.
+
+    Each image is looked up once in the BK-tree and linked to its neighbours with a
+    union-find, so a cluster also holds images linked through a chain of near matches.
+
+    Args:
+        distance (int): Largest Hamming distance between the hashes of two linked images.
+
+    Returns:
+        List[List[ImageRef]]: Clusters of at least two images, largest first.
+    """
+    tree = build_hash_tree()
+    parents: Dict[ImageRef, ImageRef] = {}
+
+    def root(ref: ImageRef) -> ImageRef:
+        while parents.setdefault(ref, ref) != ref:
+            parents[ref] = parents[parents[ref]]
+            ref = parents[ref]
+        return ref
+
+    pending = [tree.root] if tree.root is not None else []
+    while pending:
+        value, refs, children = pending.pop()
+        pending.extend(children.values())
+        for _, other in tree.search(value, distance):
+            parents[root(other)] = root(refs[0])
+
+    clusters: Dict[ImageRef, List[ImageRef]] = {}
+    for ref in parents:
+        clusters.setdefault(root(ref), []).append(ref)
+    return sorted((sorted(refs) for refs in clusters.values() if len(refs) > 1), key=len, reverse=True)
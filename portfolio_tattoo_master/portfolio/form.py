@@ -1,15 +1,32 @@
+import zipfile
+from typing import Any
+
 from captcha.fields import CaptchaField, CaptchaTextInput
 from django import forms
 
+from portfolio.archive_import import InvalidArchive, read_entries
+from portfolio.captcha_pool import lease_captcha
 from portfolio.models import Feedback
 
 
+class PooledCaptchaTextInput(CaptchaTextInput):
+    """
+    Captcha widget rendering a challenge leased from the pre-rendered pool.
+    """
+
+    def fetch_captcha_store(self, name, value, attrs=None, generator=None) -> None:
+        key = lease_captcha()
+        self._value = [key, ""]
+        self._key = key
+        self.id_ = self.build_attrs(attrs).get("id", None)
+
+
 class FeedbackForm(forms.ModelForm):
     """
     Form for user feedback submission with CAPTCHA validation.
     """
 
-    captcha = CaptchaField(widget=CaptchaTextInput(attrs={'class': 'form-control ml-2 mr-2'}))
+    captcha = CaptchaField(widget=PooledCaptchaTextInput(attrs={'class': 'form-control ml-2 mr-2'}))
 
     class Meta:
         model = Feedback
@@ -26,4 +43,26 @@ class FeedbackForm(forms.ModelForm):
                 'class': 'form-control',
                 'placeholder': 'Your WhatsApp number (optional)'
             }),
-        }
\ No newline at end of file
+        }
+
+class ArchiveImportForm(forms.Form):
+    """
+    Admin form uploading a zip archive of portfolio photos, see ``portfolio.archive_import``.
+    """
+
+    archive = forms.FileField(
+        help_text="A zip of photos. Folder names become tags, unless a manifest.json lists the tags of each photo. "
+                  "Import large archives with manage.py import_portfolio_archive.",
+        widget=forms.ClearableFileInput(attrs={'accept': '.zip,application/zip'}),
+    )
+
+    def clean_archive(self) -> Any:
+        archive = self.cleaned_data['archive']
+        if not zipfile.is_zipfile(archive):
+            raise forms.ValidationError("The file is not a zip archive.")
+        try:
+            read_entries(archive)
+        except InvalidArchive as e:
+            raise forms.ValidationError(str(e))
+        archive.seek(0)
+        return archive
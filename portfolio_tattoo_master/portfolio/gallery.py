@@ -0,0 +1,279 @@
+import base64
+import binascii
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.utils.text import slugify
+
+from .derivatives import derivative_url, srcset
+from .models import PortfolioImage, Tag
+from .snapshots import Rows, get_snapshot, register_snapshot
+
+GalleryIndex = Dict[str, Any]
+
+# Number of photos rendered with the page and returned per API request.
+GALLERY_PAGE_SIZE: int = getattr(settings, 'GALLERY_PAGE_SIZE', 24)
+GALLERY_MAX_PAGE_SIZE = 100
+
+
+def tag_slug(tag_id: int, name: str, taken: Set[str]) -> str:
+    """
+    Builds the slug identifying a tag in the gallery filters and API.
+
+    Names without ASCII letters or digits (e.g. Cyrillic) keep their Unicode
+    letters, and names with nothing to keep fall back to ``tag-<id>``. A slug
+    already taken by another tag gets a ``-<id>`` suffix.
+
+    Args:
+        tag_id (int): Primary key of the tag.
+        name (str): Name of the tag.
+        taken (Set[str]): Slugs already given to other tags.
+
+    Returns:
+        str: A non-empty slug absent from ``taken``.
+    """
+    slug = slugify(name) or slugify(name, allow_unicode=True) or f"tag-{tag_id}"
+    while slug in taken:
+        slug = f"{slug}-{tag_id}"
+    return slug
+
+
+@register_snapshot("portfolio_gallery", PortfolioImage, Tag)
+def build_gallery_index() -> GalleryIndex:
+    """
+    Builds the precomputed portfolio gallery in a constant number of queries.
+
+    One query loads the photos, one the tags and one the photo/tag pairs of the
+    M2M through table, whatever the size of the gallery. Photos are ordered
+    newest first, like the pages of ``get_gallery_page``.
+
+    Returns:
+        GalleryIndex: A dictionary with two lists::
+
+            {
+                "photos": [{"id": 1, "url": "...", "derivatives": {...}, "placeholder": {...},
+                            "width": 1000, "height": 750, "uploaded_at": "...",
+                            "tags": ["Fine Line"], "tag_slugs": ["fine-line"]}, ...],
+                "tags": [{"id": 3, "name": "Fine Line", "slug": "fine-line", "photo_ids": [1, ...]}, ...],
+            }
+    """
+    tags = {}
+    used_slugs = set()
+    for tag in Tag.objects.order_by('name').values('id', 'name'):
+        slug = tag_slug(tag['id'], tag['name'], used_slugs)
+        used_slugs.add(slug)
+        tags[tag['id']] = {'id': tag['id'], 'name': tag['name'], 'slug': slug, 'photo_ids': []}
+
+    tag_ids_by_photo: Dict[int, List[int]] = defaultdict(list)
+    pairs = PortfolioImage.tags.through.objects.order_by('portfolioimage_id', 'tag_id')
+    for photo_id, tag_id in pairs.values_list('portfolioimage_id', 'tag_id'):
+        tag_ids_by_photo[photo_id].append(tag_id)
+        tags[tag_id]['photo_ids'].append(photo_id)
+
+    photos = []
+    photo_rows = PortfolioImage.objects.order_by('-uploaded_at', '-id').values(
+        'id', 'image', 'derivatives', 'placeholder', 'width', 'height', 'uploaded_at'
+    )
+    for row in photo_rows:
+        photo_tags = sorted((tags[tag_id] for tag_id in tag_ids_by_photo[row['id']]), key=lambda tag: tag['name'])
+        photos.append({
+            'id': row['id'],
+            'url': default_storage.url(row['image']),
+            'derivatives': row['derivatives'],
+            'placeholder': row['placeholder'],
+            'width': row['width'],
+            'height': row['height'],
+            'uploaded_at': row['uploaded_at'].isoformat(),
+            'tags': [tag['name'] for tag in photo_tags],
+            'tag_slugs': [tag['slug'] for tag in photo_tags],
+        })
+
+    return {'photos': photos, 'tags': list(tags.values())}
+
+
+def get_gallery_index() -> GalleryIndex:
+    """
+    Retrieves the cached portfolio gallery index.
+
+    Returns:
+        GalleryIndex: The structure built by ``build_gallery_index``.
+    """
+    return get_snapshot("portfolio_gallery")
+
+
+def get_tag(slug: str, index: Optional[GalleryIndex] = None) -> Optional[Dict[str, Any]]:
+    """
+    Looks up a tag of the gallery index by its slug.
+
+    Args:
+        slug (str): The slugified tag name.
+        index (Optional[GalleryIndex]): An already loaded index. Loaded from cache if omitted.
+
+    Returns:
+        Optional[Dict[str, Any]]: The tag entry, or None if no tag has this slug.
+    """
+    index = index or get_gallery_index()
+    return next((tag for tag in index['tags'] if tag['slug'] == slug), None)
+
+
+def photos_for_tag(slug: str, index: Optional[GalleryIndex] = None) -> Rows:
+    """
+    Returns the photos of the gallery index carrying a tag.
+
+    Args:
+        slug (str): The slugified tag name.
+        index (Optional[GalleryIndex]): An already loaded index. Loaded from cache if omitted.
+
+    Returns:
+        Rows: The matching photo entries in gallery order.
+    """
+    index = index or get_gallery_index()
+    tag = get_tag(slug, index)
+    if tag is None:
+        return []
+    photo_ids = set(tag['photo_ids'])
+    return [photo for photo in index['photos'] if photo['id'] in photo_ids]
+
+
+def encode_cursor(uploaded_at: str, pk: int) -> str:
+    """
+    Encodes the keyset position after a photo into an opaque cursor.
+
+    Args:
+        uploaded_at (str): ISO timestamp of the last photo of a page.
+        pk (int): Primary key of the last photo of a page.
+
+    Returns:
+        str: A URL-safe cursor.
+    """
+    return base64.urlsafe_b64encode(f"{uploaded_at}|{pk}".encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Decodes a cursor produced by ``encode_cursor``.
+
+    Args:
+        cursor (str): The opaque cursor.
+
+    Returns:
+        Tuple[datetime, int]: The upload time and primary key to continue after.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        uploaded_at, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(uploaded_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid gallery cursor: {cursor}") from e
+
+
+def serialize_photo(photo: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Converts a gallery photo entry into the JSON shape returned by the gallery API.
+
+    Args:
+        photo (Dict[str, Any]): A photo entry with ``id``, ``url``, ``derivatives``,
+                                ``placeholder``, ``width``, ``height``, ``uploaded_at`` and ``tag_slugs``.
+
+    Returns:
+        Dict[str, Any]: The photo with its derivative URLs resolved.
+    """
+    derivatives = photo['derivatives']
+    return {
+        'id': photo['id'],
+        'uploaded_at': photo['uploaded_at'],
+        'tags': photo['tag_slugs'],
+        'src': derivative_url(derivatives, 960) or photo['url'],
+        'full': derivative_url(derivatives, 1920) or photo['url'],
+        'srcset': {'webp': srcset(derivatives, 'webp'), 'jpeg': srcset(derivatives, 'jpeg')},
+        'preview': photo['placeholder'].get('preview', ''),
+        'color': photo['placeholder'].get('color', ''),
+        'width': photo['width'],
+        'height': photo['height'],
+    }
+
+
+def get_gallery_page(cursor: Optional[str] = None,
+                     tag: Optional[str] = None,
+                     limit: int = GALLERY_PAGE_SIZE) -> Dict[str, Any]:
+    """
+    Returns one page of the portfolio, newest first, using keyset pagination.
+
+    The page is read with ``WHERE (uploaded_at, id) < cursor ORDER BY uploaded_at DESC, id DESC``,
+    which the ``(uploaded_at, id)`` index serves without scanning earlier pages.
+
+    Args:
+        cursor (Optional[str]): Cursor returned with the previous page, or None for the first page.
+        tag (Optional[str]): Slug of a tag to filter by.
+        limit (int): Maximum number of photos, capped at ``GALLERY_MAX_PAGE_SIZE``.
+
+    Returns:
+        Dict[str, Any]: ``{"photos": [...], "next_cursor": str | None}``.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    limit = max(1, min(limit, GALLERY_MAX_PAGE_SIZE))
+    queryset = PortfolioImage.objects.order_by('-uploaded_at', '-id')
+
+    if tag:
+        tag_entry = get_tag(tag)
+        if tag_entry is None:
+            return {'photos': [], 'next_cursor': None}
+        queryset = queryset.filter(tags=tag_entry['id'])
+
+    if cursor:
+        uploaded_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(uploaded_at__lt=uploaded_at) | Q(uploaded_at=uploaded_at, id__lt=pk))
+
+    rows = list(queryset.values(
+        'id', 'image', 'derivatives', 'placeholder', 'width', 'height', 'uploaded_at'
+    )[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    slugs_by_id = {tag_entry['id']: tag_entry['slug'] for tag_entry in get_gallery_index()['tags']}
+    tag_slugs: Dict[int, List[str]] = defaultdict(list)
+    pairs = PortfolioImage.tags.through.objects.filter(portfolioimage_id__in=[row['id'] for row in rows])
+    for photo_id, tag_id in pairs.values_list('portfolioimage_id', 'tag_id'):
+        if tag_id in slugs_by_id:
+            tag_slugs[photo_id].append(slugs_by_id[tag_id])
+
+    photos = [
+        {
+            'id': row['id'],
+            'url': default_storage.url(row['image']),
+            'derivatives': row['derivatives'],
+            'placeholder': row['placeholder'],
+            'width': row['width'],
+            'height': row['height'],
+            'uploaded_at': row['uploaded_at'].isoformat(),
+            'tag_slugs': sorted(tag_slugs[row['id']]),
+        }
+        for row in rows
+    ]
+    next_cursor = encode_cursor(photos[-1]['uploaded_at'], photos[-1]['id']) if has_more else None
+    return {'photos': photos, 'next_cursor': next_cursor}
+
+
+def get_first_gallery_page(limit: int = GALLERY_PAGE_SIZE) -> Dict[str, Any]:
+    """
+    Returns the first unfiltered page straight from the cached gallery index, without queries.
+
+    Args:
+        limit (int): Number of photos on the page.
+
+    Returns:
+        Dict[str, Any]: ``{"photos": [...], "next_cursor": str | None}`` like ``get_gallery_page``.
+    """
+    photos = get_gallery_index()['photos']
+    page = photos[:limit]
+    next_cursor = encode_cursor(page[-1]['uploaded_at'], page[-1]['id']) if len(photos) > limit else None
+    return {'photos': page, 'next_cursor': next_cursor}
@@ -0,0 +1,56 @@
+from typing import Any, Dict
+
+from django.db.models.fields.files import FieldFile
+from PIL import Image
+
+# Field names of the metadata stored next to an image, see ``ImageMetadata``.
+METADATA_FIELDS = ('width', 'height', 'file_size', 'image_format')
+
+# EXIF orientations for which the stored pixels are rotated by 90 degrees.
+ROTATED_ORIENTATIONS = {5, 6, 7, 8}
+EXIF_ORIENTATION = 0x0112
+
+
+def _read_header(file: Any) -> Dict[str, Any]:
+    # Image.open only parses the header: no pixel is decoded.
+    with Image.open(file) as image:
+        width, height = image.size
+        if image.getexif().get(EXIF_ORIENTATION) in ROTATED_ORIENTATIONS:
+            width, height = height, width
+        return {'width': width, 'height': height, 'image_format': image.format or ''}
+
+
+def read_image_metadata(field_file: FieldFile) -> Dict[str, Any]:
+    """
+    Reads the displayed dimensions, byte size and format of an image from its header.
+
+    Works on files already in storage and on uploads not saved yet, leaving
+    the position of an upload where it was.
+
+    Args:
+        field_file (FieldFile): The image field value of a model instance.
+
+    Returns:
+        Dict[str, Any]: ``{"width": 1000, "height": 750, "file_size": 183342, "image_format": "JPEG"}``.
+        Width and height follow the EXIF orientation, like the derivatives.
+    """
+    if field_file._committed:
+        with field_file.open('rb') as file:
+            metadata = _read_header(file)
+    else:
+        file = field_file.file
+        position = file.tell()
+        file.seek(0)
+        try:
+            metadata = _read_header(file)
+        finally:
+            file.seek(position)
+    metadata['file_size'] = field_file.size
+    return metadata
+
+
+def needs_metadata(instance: Any, field_name: str = 'image') -> bool:
+    """
+    Checks whether an instance has an image whose metadata was never read.
+    """
+    return bool(getattr(instance, field_name)) and instance.width is None
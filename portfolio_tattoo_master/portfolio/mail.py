@@ -0,0 +1,203 @@
+import logging
+import smtplib
+from datetime import timedelta
+from typing import Iterable, List, Optional, Sequence
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Notification
+
+logger = logging.getLogger(__name__)
+
+# Seconds notifications are collected before they are sent together: the interval of the relay.
+MAIL_COALESCE_WINDOW: int = getattr(settings, 'MAIL_COALESCE_WINDOW', 30)
+
+# Send the collected notifications as a single digest email instead of one email each.
+MAIL_DIGEST: bool = getattr(settings, 'MAIL_DIGEST', False)
+
+# Notifications sent per batch over one connection.
+MAIL_BATCH_SIZE: int = getattr(settings, 'MAIL_BATCH_SIZE', 50)
+
+# Delay before the first retry when the server throttles us; doubled on every retry.
+MAIL_RETRY_BACKOFF: int = getattr(settings, 'MAIL_RETRY_BACKOFF', 60)
+MAIL_MAX_RETRIES: int = getattr(settings, 'MAIL_MAX_RETRIES', 5)
+
+# Relayed notifications not sent after this long are relayed again (the task was lost).
+RELAY_LEASE = timedelta(hours=1)
+
+# Relays of a notification before it is given up as a dead letter.
+MAIL_MAX_ATTEMPTS: int = getattr(settings, 'MAIL_MAX_ATTEMPTS', 5)
+
+RELAY_LOCK_KEY = 'mail:relay_lock'
+RELAY_LOCK_TIMEOUT = 60 * 5
+
+
+class MailThrottled(Exception):
+    """
+    Raised when the SMTP server refuses mail temporarily and the delivery should be retried later.
+    """
+
+
+def queue_notification(subject: str, message: str) -> Notification:
+    """
+    Writes an email to the site owner to the outbox.
+
+    Only a local insert: call it inside the transaction saving the submission,
+    so the notification exists if and only if the submission does.
+
+    Args:
+        subject (str): The subject of the email.
+        message (str): The body content of the email.
+
+    Returns:
+        Notification: The stored notification.
+    """
+    return Notification.objects.create(subject=subject, message=message)
+
+
+def relay_notifications() -> int:
+    """
+    Drains the outbox to Celery: publishes one ``send_notification_batch`` task per
+    ``MAIL_BATCH_SIZE`` pending notifications and marks them as relayed.
+
+    Every relay counts as an attempt. Notifications still in the outbox after
+    ``MAIL_MAX_ATTEMPTS`` relays are dead letters and stay where they are.
+
+    Returns:
+        int: The number of notifications relayed.
+    """
+    from .task import send_notification_batch
+
+    if not cache.add(RELAY_LOCK_KEY, 1, timeout=RELAY_LOCK_TIMEOUT):
+        return 0
+
+    relayed = 0
+    try:
+        pending = Notification.objects.filter(
+            Q(relayed_at__isnull=True) | Q(relayed_at__lt=timezone.now() - RELAY_LEASE),
+            attempts__lt=MAIL_MAX_ATTEMPTS,
+        )
+        ids = list(pending.values_list('pk', flat=True))
+        for start in range(0, len(ids), MAIL_BATCH_SIZE):
+            batch = ids[start:start + MAIL_BATCH_SIZE]
+            Notification.objects.filter(pk__in=batch).update(relayed_at=timezone.now(), attempts=F('attempts') + 1)
+            try:
+                send_notification_batch.delay(batch)
+            except Exception as e:
+                # Never reached the worker: not an attempt.
+                Notification.objects.filter(pk__in=batch).update(relayed_at=None, attempts=F('attempts') - 1)
+                logger.error(f"Error while relaying notifications: {e}")
+                break
+            relayed += len(batch)
+    finally:
+        cache.delete(RELAY_LOCK_KEY)
+    return relayed
+
+
+def is_transient(error: Exception) -> bool:
+    """
+    Tells whether an SMTP error is temporary (throttling, dropped connection) and worth retrying.
+    """
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError))
+
+
+def build_messages(notifications: Sequence[Notification], digest: bool = MAIL_DIGEST) -> List[EmailMessage]:
+    """
+    Turns notifications into emails to ``EMAIL_HOST_USER``.
+
+    Args:
+        notifications (Sequence[Notification]): The notifications to send.
+        digest (bool): Whether to combine several notifications into one email.
+
+    Returns:
+        List[EmailMessage]: One email per notification, or a single digest.
+    """
+    def email(subject: str, body: str) -> EmailMessage:
+        return EmailMessage(subject, body, settings.EMAIL_HOST_USER, [settings.EMAIL_HOST_USER])
+
+    if digest and len(notifications) > 1:
+        body = "\n\n----------\n\n".join(f"{item.subject}\n\n{item.message}" for item in notifications)
+        return [email(f"{len(notifications)} new notifications", body)]
+    return [email(item.subject, item.message) for item in notifications]
+
+
+def send_notifications(notifications: Sequence[Notification],
+                       connection: BaseEmailBackend,
+                       digest: bool = MAIL_DIGEST) -> List[int]:
+    """
+    Sends notifications over an already open connection.
+
+    Args:
+        notifications (Sequence[Notification]): The notifications to send.
+        connection (BaseEmailBackend): An open email backend, reused for every email.
+        digest (bool): Whether to combine the notifications into one email.
+
+    Returns:
+        List[int]: Primary keys of the notifications that were sent.
+
+    Raises:
+        MailThrottled: If the server refused mail temporarily. Notifications sent
+                       before the refusal are still listed in ``error.args[1]``.
+    """
+    messages = build_messages(notifications, digest)
+    if len(messages) == 1 and len(notifications) > 1:
+        batches = [list(notifications)]
+    else:
+        batches = [[notification] for notification in notifications]
+
+    sent: List[int] = []
+    for message, batch in zip(messages, batches):
+        try:
+            connection.send_messages([message])
+        except Exception as e:
+            if is_transient(e):
+                raise MailThrottled(str(e), sent) from e
+            raise
+        sent.extend(notification.pk for notification in batch)
+    return sent
+
+
+def deliver_notifications(ids: Iterable[int], digest: Optional[bool] = None) -> int:
+    """
+    Sends a batch of notifications over a single SMTP connection and deletes the sent ones.
+
+    On a temporary refusal, including one when connecting or logging in, the rest
+    stays in the outbox and ``MailThrottled`` is raised so the caller can retry with a backoff.
+
+    Args:
+        ids (Iterable[int]): Primary keys of the notifications to send. Missing ones are skipped.
+        digest (Optional[bool]): Overrides ``MAIL_DIGEST``.
+
+    Returns:
+        int: The number of notifications sent.
+    """
+    notifications = list(Notification.objects.filter(pk__in=list(ids)))
+    if not notifications:
+        return 0
+
+    digest = MAIL_DIGEST if digest is None else digest
+    connection = get_connection(fail_silently=False)
+    try:
+        # Gmail throttles with a 421 at connect or AUTH time as often as per message.
+        connection.open()
+    except Exception as e:
+        if is_transient(e):
+            raise MailThrottled(str(e), []) from e
+        raise
+    try:
+        sent = send_notifications(notifications, connection, digest)
+    except MailThrottled as e:
+        Notification.objects.filter(pk__in=e.args[1]).delete()
+        raise
+    finally:
+        connection.close()
+    Notification.objects.filter(pk__in=sent).delete()
+    logger.info(f"{len(sent)} notifications sent.")
+    return len(sent)
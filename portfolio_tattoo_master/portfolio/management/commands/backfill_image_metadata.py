@@ -0,0 +1,74 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db.models import Model
+
+from blog.models import Post
+from portfolio.image_metadata import METADATA_FIELDS, needs_metadata, read_image_metadata
+from portfolio.models import InstagramTile, MainImage, PortfolioImage
+from portfolio.page_cache import bump_content_version
+from portfolio.snapshots import invalidate_model
+
+
+def read(instance: Model) -> Tuple[Model, Optional[Dict[str, Any]], Optional[Exception]]:
+    """
+    Reads the metadata of one image, returning the error instead of raising it.
+    """
+    try:
+        return instance, read_image_metadata(instance.image), None
+    except Exception as e:
+        return instance, None, e
+
+
+class Command(BaseCommand):
+    """
+    Stores the dimensions, byte size and format of images uploaded before they were recorded.
+    """
+    help = "Fills in missing image metadata, reading only the image headers on several threads."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=(os.cpu_count() or 4) * 2,
+            help="Number of files read in parallel. Reading headers mostly waits on storage.",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help="Number of rows written per UPDATE.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        updated = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for model in (MainImage, PortfolioImage, InstagramTile, Post):
+                instances = [
+                    instance for instance in model.objects.only('pk', 'image', 'width').iterator()
+                    if needs_metadata(instance)
+                ]
+                batch: List[Model] = []
+                # Files are read on the pool; rows are written from this thread only.
+                for instance, metadata, error in executor.map(read, instances):
+                    if error is not None:
+                        self.stderr.write(f"{model._meta.label} {instance.pk}: {error}")
+                        failed += 1
+                        continue
+                    for field, value in metadata.items():
+                        setattr(instance, field, value)
+                    batch.append(instance)
+                    if len(batch) >= options['batch_size']:
+                        model.objects.bulk_update(batch, METADATA_FIELDS)
+                        batch = []
+                    updated += 1
+                if batch:
+                    model.objects.bulk_update(batch, METADATA_FIELDS)
+                if instances:
+                    invalidate_model(model)
+
+        if updated:
+            bump_content_version()
+        self.stdout.write(self.style.SUCCESS(f"Stored the metadata of {updated} images, {failed} failed."))
@@ -0,0 +1,22 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand
+
+from portfolio.bundles import build_bundles
+from portfolio.page_cache import bump_content_version
+
+
+class Command(BaseCommand):
+    """
+    Builds the static asset bundles. Run it on every deployment, after the static files changed.
+    """
+    help = "Concatenates, minifies, hashes and precompresses the CSS and JS bundles."
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        manifest = build_bundles()
+        # Cached pages link the previous bundles: render them again with the new URLs.
+        bump_content_version()
+
+        for name, path in sorted(manifest.items()):
+            self.stdout.write(f"{name}: {path}")
+        self.stdout.write(self.style.SUCCESS(f"Built {len(manifest)} bundles."))
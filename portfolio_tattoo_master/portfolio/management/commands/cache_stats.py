@@ -0,0 +1,27 @@
+from typing import Any
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from portfolio.two_tier_cache import STAT_FIELDS
+
+
+class Command(BaseCommand):
+    """
+    Prints the hit and miss counters of the two-tier cache shared by all workers.
+    """
+    help = "Shows the in-process hits, shared-cache hits and misses of every cache key prefix."
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        stats = getattr(cache, 'stats', None)
+        if stats is None:
+            self.stderr.write("The default cache is not a two-tier cache.")
+            return
+
+        for prefix, counters in sorted(stats.totals(stats.groups(), STAT_FIELDS).items()):
+            total = sum(counters.values())
+            hit_rate = (counters['l1_hits'] + counters['l2_hits']) / total if total else 0
+            self.stdout.write(
+                f"{prefix}: {counters['l1_hits']} L1 hits, {counters['l2_hits']} L2 hits, "
+                f"{counters['misses']} misses ({hit_rate:.0%} hit rate)"
+            )
@@ -0,0 +1,74 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db.models import Model
+
+from portfolio.duplicates import DUPLICATE_HASH_DISTANCE, HASHED_MODELS, ImageRef, duplicate_clusters, file_hashes
+from portfolio.perceptual_hash import compute_hash
+
+
+def hash_image(instance: Model) -> Tuple[Model, Optional[str], Optional[Exception]]:
+    """
+    Hashes one image, returning the error instead of raising it.
+    """
+    try:
+        return instance, compute_hash(instance.image), None
+    except Exception as e:
+        return instance, None, e
+
+
+class Command(BaseCommand):
+    """
+    Reports the clusters of near-duplicate photos among the main page and portfolio images.
+    """
+    help = "Hashes the images that have no perceptual hash yet, then lists the groups of images that look alike."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--distance',
+            type=int,
+            default=DUPLICATE_HASH_DISTANCE,
+            help="Largest number of differing hash bits (out of 64) for two images to be grouped.",
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 4,
+            help="Number of images hashed in parallel.",
+        )
+
+    def hash_missing(self, workers: int) -> None:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for model in HASHED_MODELS:
+                instances = list(model.objects.filter(perceptual_hash='').exclude(image='').only('pk', 'image'))
+                hashed: List[Model] = []
+                # Files are read on the pool; rows are written from this thread only.
+                for instance, value, error in executor.map(hash_image, instances):
+                    if error is not None:
+                        self.stderr.write(f"{model._meta.label} {instance.pk}: {error}")
+                        continue
+                    instance.perceptual_hash = value
+                    hashed.append(instance)
+                if hashed:
+                    model.objects.bulk_update(hashed, ['perceptual_hash'], batch_size=500)
+                    file_hashes(hashed)
+                    self.stdout.write(f"Hashed {len(hashed)} {model._meta.verbose_name_plural}.")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        self.hash_missing(options['workers'])
+        clusters = duplicate_clusters(options['distance'])
+
+        # One query per model for the file names of every clustered image.
+        names: Dict[ImageRef, str] = {}
+        for model in HASHED_MODELS:
+            pks = [pk for cluster in clusters for label, pk in cluster if label == model._meta.label]
+            for pk, name in model.objects.filter(pk__in=pks).values_list('pk', 'image'):
+                names[(model._meta.label, pk)] = name
+
+        for number, cluster in enumerate(clusters, 1):
+            self.stdout.write(f"Cluster {number} ({len(cluster)} images):")
+            for ref in cluster:
+                self.stdout.write(f"  {ref[0]} {ref[1]}: {names.get(ref, '?')}")
+        self.stdout.write(self.style.SUCCESS(f"{len(clusters)} clusters of near-duplicate images found."))
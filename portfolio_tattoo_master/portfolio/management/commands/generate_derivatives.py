@@ -0,0 +1,36 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from blog.models import Post
+from portfolio.derivatives import needs_derivatives
+from portfolio.models import InstagramTile, MainImage, PortfolioImage
+from portfolio.task import generate_image_derivatives
+
+
+class Command(BaseCommand):
+    """
+    Generates responsive derivatives for images uploaded before the pipeline existed.
+    """
+    help = "Generates missing or outdated WebP/JPEG derivatives for all images."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--sync',
+            action='store_true',
+            help="Generate derivatives in this process instead of queueing Celery tasks.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        queued = 0
+        for model in (MainImage, PortfolioImage, InstagramTile, Post):
+            for instance in model.objects.only('pk', 'image', 'derivatives').iterator():
+                if not needs_derivatives(instance):
+                    continue
+                if options['sync']:
+                    generate_image_derivatives(model._meta.label, instance.pk)
+                else:
+                    generate_image_derivatives.delay(model._meta.label, instance.pk)
+                queued += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {queued} images."))
@@ -0,0 +1,73 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db.models import Model
+
+from blog.models import Post
+from portfolio.models import MainImage, PortfolioImage
+from portfolio.page_cache import bump_content_version
+from portfolio.placeholders import build_placeholder, needs_placeholder
+from portfolio.snapshots import invalidate_model
+
+
+def compute(instance: Model) -> Tuple[Model, Optional[Dict[str, Any]], Optional[Exception]]:
+    """
+    Computes the placeholder of one image, returning the error instead of raising it.
+    """
+    try:
+        return instance, build_placeholder(instance.image), None
+    except Exception as e:
+        return instance, None, e
+
+
+class Command(BaseCommand):
+    """
+    Computes the placeholders of images uploaded before they existed.
+    """
+    help = "Computes missing or outdated image placeholders, decoding images on several threads."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 4,
+            help="Number of images decoded in parallel. Pillow releases the GIL while decoding.",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help="Number of rows written per UPDATE.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        computed = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for model in (MainImage, PortfolioImage, Post):
+                instances = [
+                    instance for instance in model.objects.only('pk', 'image', 'placeholder').iterator()
+                    if needs_placeholder(instance)
+                ]
+                batch: List[Model] = []
+                # Files are read on the pool; rows are written from this thread only.
+                for instance, placeholder, error in executor.map(compute, instances):
+                    if error is not None:
+                        self.stderr.write(f"{model._meta.label} {instance.pk}: {error}")
+                        failed += 1
+                        continue
+                    instance.placeholder = placeholder
+                    batch.append(instance)
+                    if len(batch) >= options['batch_size']:
+                        model.objects.bulk_update(batch, ['placeholder'])
+                        batch = []
+                    computed += 1
+                if batch:
+                    model.objects.bulk_update(batch, ['placeholder'])
+                if instances:
+                    invalidate_model(model)
+
+        if computed:
+            bump_content_version()
+        self.stdout.write(self.style.SUCCESS(f"Computed {computed} placeholders, {failed} failed."))
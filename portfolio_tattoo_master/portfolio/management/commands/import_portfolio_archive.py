@@ -0,0 +1,41 @@
+import os
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from portfolio.archive_import import IMPORT_BATCH_SIZE, InvalidArchive, import_archive
+
+
+class Command(BaseCommand):
+    """
+    Imports a zip archive or a directory of photos into the portfolio.
+    """
+    help = "Imports every image of a zip file or a directory as portfolio photos, tagged after their folders."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('source', help="A zip file or a directory. A manifest.json at its root may list the tags.")
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of processes decoding the photos.",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help="Number of photos decoded and inserted per round.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        if not os.path.exists(options['source']):
+            raise CommandError(f"{options['source']} does not exist.")
+        try:
+            report = import_archive(options['source'], workers=options['workers'], batch_size=options['batch_size'])
+        except InvalidArchive as e:
+            raise CommandError(str(e))
+        for name, error in report['failed']:
+            self.stderr.write(f"{name}: {error}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['imported']} photos, {len(report['failed'])} failed."
+        ))
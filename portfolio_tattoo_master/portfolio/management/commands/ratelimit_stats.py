@@ -0,0 +1,23 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand
+from django.urls import get_resolver
+
+from portfolio.ratelimit import stats
+
+
+class Command(BaseCommand):
+    """
+    Prints the rate limit counters shared by all workers.
+    """
+    help = "Shows the rate, hits and refused requests of every rate-limited endpoint."
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        # Importing the views registers their rate-limited endpoints.
+        get_resolver().url_patterns
+
+        for group, counters in sorted(stats.snapshot().items()):
+            self.stdout.write(
+                f"{group}: rate {counters['rate']}, {counters['hits']} hits, "
+                f"{counters['limited']} limited ({counters['local_blocks']} refused in process)"
+            )
@@ -0,0 +1,17 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand
+
+from blog.search import fts_available, rebuild_index
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the full-text index of the posts, comments and tags.
+    """
+    help = "Reindexes every post, comment and tag, e.g. after a bulk import that sent no signals."
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        count = rebuild_index()
+        backend = "FTS5" if fts_available() else "in-memory"
+        self.stdout.write(self.style.SUCCESS(f"{count} documents indexed ({backend} index)."))
@@ -0,0 +1,103 @@
+import mimetypes
+from typing import Awaitable, Callable, Optional, Union
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import FileResponse, HttpRequest, HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from . import bundles
+
+# Built bundles never change under the same name: let browsers and proxies keep them for a year.
+BUNDLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Content-Encoding -> suffix of the precompressed file, by preference.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def accepted_encodings(request: HttpRequest) -> set:
+    """
+    Returns the content codings the client accepts, ignoring those with ``q=0``.
+    """
+    accepted = set()
+    for item in request.headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = item.strip().partition(';')
+        if coding and params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(coding.lower())
+    return accepted
+
+
+def serve_bundle(request: HttpRequest, filename: str) -> Optional[FileResponse]:
+    """
+    Serves a built bundle, precompressed when the client accepts it.
+
+    Args:
+        request (HttpRequest): The incoming HTTP request.
+        filename (str): The hashed file name, e.g. ``site.0123456789ab.css``.
+
+    Returns:
+        Optional[FileResponse]: The response, or None if no such bundle was built.
+    """
+    if not bundles.HASHED_NAME_RE.match(filename):
+        return None
+    path = bundles.STATIC_BUNDLE_ROOT / filename
+    if not path.is_file():
+        return None
+
+    accepted = accepted_encodings(request)
+    encoding = None
+    for coding, suffix in ENCODINGS:
+        if coding in accepted and path.with_name(filename + suffix).is_file():
+            encoding, path = coding, path.with_name(filename + suffix)
+            break
+
+    content_type, _ = mimetypes.guess_type(filename)
+    response = FileResponse(open(path, 'rb'), content_type=f"{content_type}; charset=utf-8")
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Cache-Control'] = BUNDLE_CACHE_CONTROL
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+class PrecompressedBundleMiddleware:
+    """
+    Serves the files built by ``manage.py build_bundles`` from their gzip or brotli
+    variant with far-future cache headers, before the rest of the stack runs.
+    Other requests, including unknown bundle names, go through unchanged.
+
+    Works in both a sync and an async stack: under ASGI, the file lookup runs in a
+    thread and other requests are passed on without leaving the event loop.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable[[HttpRequest], Union[HttpResponse, Awaitable[HttpResponse]]]) -> None:
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL + bundles.BUNDLE_URL_PREFIX
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _bundle_name(self, request: HttpRequest) -> Optional[str]:
+        if request.method in ('GET', 'HEAD') and request.path.startswith(self.prefix):
+            return request.path[len(self.prefix):]
+        return None
+
+    def __call__(self, request: HttpRequest) -> Union[HttpResponse, Awaitable[HttpResponse]]:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        filename = self._bundle_name(request)
+        if filename is not None:
+            response = serve_bundle(request, filename)
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        filename = self._bundle_name(request)
+        if filename is not None:
+            response = await sync_to_async(serve_bundle)(request, filename)
+            if response is not None:
+                return response
+        return await self.get_response(request)
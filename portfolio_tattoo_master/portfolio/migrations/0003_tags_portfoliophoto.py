@@ -0,0 +1,29 @@
+# Generated by Django 5.1.5 on 2025-02-02 21:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0002_feedback'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tags',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PortfolioPhoto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', models.ImageField(upload_to='portfolio/')),
+                ('uploaded_at', models.DateTimeField(auto_now_add=True)),
+                ('tags', models.ManyToManyField(related_name='portfolio_photos', to='portfolio.tags')),
+            ],
+        ),
+    ]
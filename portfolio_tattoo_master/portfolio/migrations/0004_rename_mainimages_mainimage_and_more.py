@@ -0,0 +1,25 @@
+# Generated by Django 5.1.5 on 2025-02-02 22:28
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0003_tags_portfoliophoto'),
+    ]
+
+    operations = [
+        migrations.RenameModel(
+            old_name='MainImages',
+            new_name='MainImage',
+        ),
+        migrations.RenameModel(
+            old_name='Tags',
+            new_name='Tag',
+        ),
+        migrations.RenameModel(
+            old_name='PortfolioPhoto',
+            new_name='PortfolioImage',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2025-02-03 21:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0004_rename_mainimages_mainimage_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tag',
+            name='name',
+            field=models.CharField(max_length=100, unique=True),
+        ),
+    ]
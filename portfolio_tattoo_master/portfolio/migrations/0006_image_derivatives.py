@@ -0,0 +1,23 @@
+# Generated by Django 5.1.5 on 2026-10-18 00:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0005_alter_tag_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mainimage',
+            name='derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Resized WebP/JPEG copies of the image, generated in the background.'),
+        ),
+        migrations.AddField(
+            model_name='portfolioimage',
+            name='derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
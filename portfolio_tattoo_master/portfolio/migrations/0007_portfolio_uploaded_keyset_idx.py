@@ -0,0 +1,17 @@
+# Generated by Django 5.1.5 on 2026-10-18 00:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0006_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='portfolioimage',
+            index=models.Index(fields=['-uploaded_at', '-id'], name='portfolio_uploaded_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.5 on 2026-10-18 00:18
+
+from django.db import migrations, models
+
+
+def number_by_pk(apps, schema_editor):
+    """
+    Numbers the existing images 1..n in primary key order, the order the slider used so far.
+    """
+    MainImage = apps.get_model('portfolio', 'MainImage')
+    images = list(MainImage.objects.order_by('pk').only('pk'))
+    for position, image in enumerate(images, start=1):
+        image.position = position
+    MainImage.objects.bulk_update(images, ['position'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0007_portfolio_uploaded_keyset_idx'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='mainimage',
+            options={'ordering': ['position', 'pk'], 'verbose_name': 'Main Page Image', 'verbose_name_plural': 'Main Page Images'},
+        ),
+        migrations.AddField(
+            model_name='mainimage',
+            name='position',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0, help_text='Position of the image in the main page slider. New images go last.'),
+        ),
+        migrations.RunPython(number_by_pk, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.5 on 2026-10-18 00:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0008_mainimage_position'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mainimage',
+            name='position',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Position of the image in the main page slider. New images go last.'),
+        ),
+        migrations.AddConstraint(
+            model_name='mainimage',
+            constraint=models.UniqueConstraint(fields=('position',), name='portfolio_mainimage_unique_position'),
+        ),
+    ]
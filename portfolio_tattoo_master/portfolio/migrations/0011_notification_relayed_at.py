@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-18 00:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0010_notification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='relayed_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
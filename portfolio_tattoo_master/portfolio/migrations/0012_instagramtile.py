@@ -0,0 +1,31 @@
+# Generated by Django 5.1.5 on 2026-10-18 00:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0011_notification_relayed_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InstagramTile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', models.ImageField(upload_to='instagram/')),
+                ('link', models.URLField(default='https://www.instagram.com/rymma_tattoo/', help_text='Page opened by the Instagram icon of the tile, e.g. the post.')),
+                ('alt', models.CharField(blank=True, max_length=255)),
+                ('position', models.PositiveSmallIntegerField(default=0, help_text='Tiles are shown by ascending position.')),
+                ('is_visible', models.BooleanField(default=True)),
+                ('derivatives', models.JSONField(blank=True, default=dict, editable=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Instagram Tile',
+                'verbose_name_plural': 'Instagram Tiles',
+                'ordering': ['position', 'pk'],
+            },
+        ),
+    ]
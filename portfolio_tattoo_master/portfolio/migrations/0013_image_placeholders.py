@@ -0,0 +1,23 @@
+# Generated by Django 5.1.5 on 2026-10-18 00:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0012_instagramtile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mainimage',
+            name='placeholder',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Tiny preview and dominant color shown while the image loads, generated in the background.'),
+        ),
+        migrations.AddField(
+            model_name='portfolioimage',
+            name='placeholder',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
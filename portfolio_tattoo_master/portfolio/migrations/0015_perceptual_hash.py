@@ -0,0 +1,23 @@
+# Generated by Django 5.1.5 on 2026-10-18 00:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0014_image_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mainimage',
+            name='perceptual_hash',
+            field=models.CharField(blank=True, editable=False, max_length=16),
+        ),
+        migrations.AddField(
+            model_name='portfolioimage',
+            name='perceptual_hash',
+            field=models.CharField(blank=True, editable=False, max_length=16),
+        ),
+    ]
@@ -1,14 +1,155 @@
+import logging
 import os
-from typing import Any
+from typing import Any, List, Optional
 
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import F, Func, Max, OuterRef, Q, Subquery
 
+from .image_metadata import METADATA_FIELDS, read_image_metadata
+from .page_cache import bump_content_version
+from .perceptual_hash import compute_hash
+from .snapshots import invalidate_model
 
-class MainImage(models.Model):
+logger = logging.getLogger(__name__)
+
+# Number of slots in the main page slider.
+MAX_MAIN_IMAGES = 15
+
+# Inserts racing for the same slot are retried this many times.
+SLOT_ALLOCATION_ATTEMPTS = 3
+
+INSTAGRAM_PROFILE_URL = 'https://www.instagram.com/rymma_tattoo/'
+
+# Joins the tag names aggregated by the database; unlike a comma it cannot occur in a name.
+TAG_SEPARATOR = '\x1f'
+
+
+class ImageMetadata(models.Model):
+    """
+    Abstract base storing the dimensions, byte size and format of the model's ``image``,
+    so templates can size images and code never opens the file to learn them.
+
+    The metadata is read from the header of every new upload when the model is saved.
+    ``width_field``/``height_field`` are not used: Django would open the file of every
+    loaded row that has no dimensions yet (``manage.py backfill_image_metadata`` fills them).
+    """
+    width = models.PositiveIntegerField(blank=True, null=True, editable=False)
+    height = models.PositiveIntegerField(blank=True, null=True, editable=False)
+    file_size = models.PositiveBigIntegerField(blank=True, null=True, editable=False)
+    image_format = models.CharField(max_length=10, blank=True, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args: Any, **kwargs: Any) -> None:
+        """
+        Reads the metadata of a newly uploaded image, or clears it when the image was removed.
+        """
+        if not self.image:
+            self.width = self.height = self.file_size = None
+            self.image_format = ''
+        elif not self.image._committed:
+            try:
+                for field, value in read_image_metadata(self.image).items():
+                    setattr(self, field, value)
+            except Exception as e:
+                logger.error(f"Error reading the metadata of {self.image.name}: {e}")
+                for field in METADATA_FIELDS:
+                    setattr(self, field, '' if field == 'image_format' else None)
+        super().save(*args, **kwargs)
+
+
+class PerceptualHashed(ImageMetadata):
+    """
+    Abstract base adding the perceptual hash of the model's ``image``, computed on every
+    new upload, which finds re-uploads of the same photo (see ``portfolio.duplicates``).
+    """
+    perceptual_hash = models.CharField(max_length=16, blank=True, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args: Any, **kwargs: Any) -> None:
+        """
+        Hashes a newly uploaded image, or clears the hash when the image was removed.
+        """
+        # Read by the receiver that keeps the cached hash tree in step (see ``signals``).
+        self._previous_hash = self.perceptual_hash if self.pk is not None else ''
+        if not self.image:
+            self.perceptual_hash = ''
+        elif not self.image._committed:
+            try:
+                self.perceptual_hash = compute_hash(self.image)
+            except Exception as e:
+                logger.error(f"Error hashing {self.image.name}: {e}")
+                self.perceptual_hash = ''
+        super().save(*args, **kwargs)
+
+
+class MainImageQuerySet(models.QuerySet):
+    """
+    QuerySet for main page images, ordered by their slider position.
+    """
+
+    def with_display_position(self) -> 'MainImageQuerySet':
+        """
+        Annotates every image with its 1-based rank in the slider, computed by the database
+        in the query that loads the rows.
+
+        The rank counts the images before it in a correlated subquery rather than with a
+        window over the result: filters of the outer query (e.g. ``pk=...`` in the admin
+        change view) must not change it.
+        """
+        earlier = (
+            MainImage.objects
+            .filter(Q(position__lt=OuterRef('position')) | Q(position=OuterRef('position'), pk__lt=OuterRef('pk')))
+            .order_by()
+            .annotate(count=Func(F('pk'), function='COUNT'))
+            .values('count')
+        )
+        return self.annotate(display_position=Subquery(earlier, output_field=models.IntegerField()) + 1)
+
+    def reorder(self, ordered_ids: List[int]) -> int:
+        """
+        Assigns positions 1..n to the given images and invalidates the cached slider.
+
+        Positions are unique, so the images are first parked past the highest position
+        in use and then moved to their final position: two bulk UPDATEs whatever the
+        number of images.
+
+        Args:
+            ordered_ids (List[int]): Primary keys in their new slider order.
+
+        Returns:
+            int: The number of updated rows.
+
+        Raises:
+            ValidationError: If there are more images than slots.
+        """
+        if len(ordered_ids) > MAX_MAIN_IMAGES:
+            raise ValidationError(f'A maximum of {MAX_MAIN_IMAGES} images are allowed on the main page.')
+        images = [self.model(pk=pk, position=position) for position, pk in enumerate(ordered_ids, start=1)]
+        with transaction.atomic():
+            highest = self.model.objects.aggregate(highest=Max('position'))['highest'] or 0
+            parked = [
+                self.model(pk=image.pk, position=max(highest, MAX_MAIN_IMAGES) + image.position) for image in images
+            ]
+            self.model.objects.bulk_update(parked, ['position'])
+            updated = self.model.objects.bulk_update(images, ['position'])
+
+        # bulk_update sends no signals: invalidate the slider caches explicitly.
+        invalidate_model(self.model)
+        bump_content_version()
+        return updated
+
+
+class MainImage(PerceptualHashed):
     """
     Model representing images for the main page.
     """
+    objects = MainImageQuerySet.as_manager()
+
     image = models.ImageField(
         upload_to='main_images',
         help_text="Image for the main page."
@@ -28,26 +169,95 @@ class MainImage(models.Model):
         auto_now_add=True,
         help_text="Timestamp when the image was created."
     )
+    derivatives = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="Resized WebP/JPEG copies of the image, generated in the background."
+    )
+    placeholder = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="Tiny preview and dominant color shown while the image loads, generated in the background."
+    )
+    position = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="Position of the image in the main page slider. New images go last."
+    )
 
-    def save(self, *args: Any, validate_limit: bool = True, **kwargs: Any) -> None:
+    def clean(self) -> None:
         """
-        Overrides the save method to enforce a limit on the number of images.
+        Reports a full slider or a position outside the slots as a form error before an upload is attempted.
 
-        Args:
-            validate_limit (bool): Whether to validate the maximum number of images.
-                                   Defaults to True.
+        Raises:
+            ValidationError: If all slots are taken or the position is not a slot.
+        """
+        if self.position_error():
+            raise ValidationError({'position': self.position_error()})
+        if self._state.adding and MainImage.objects.count() >= MAX_MAIN_IMAGES:
+            raise ValidationError(
+                f'A maximum of {MAX_MAIN_IMAGES} images are allowed on the main page.'
+            )
+
+    def position_error(self) -> Optional[str]:
+        """
+        Returns why the position is not a slot, or None. A new image may leave it at 0 to get the next free slot.
+        """
+        if self._state.adding and not self.position:
+            return None
+        if not 1 <= self.position <= MAX_MAIN_IMAGES:
+            return f'The position must be between 1 and {MAX_MAIN_IMAGES}.'
+        return None
+
+    def save(self, *args: Any, **kwargs: Any) -> None:
+        """
+        Overrides the save method to allocate a slider slot on insert.
+
+        The limit on the number of images is enforced by the slots themselves:
+        positions are unique and only 1..MAX_MAIN_IMAGES are handed out, so two
+        concurrent uploads cannot both take the last slot. The loser of a race
+        gets an IntegrityError and retries with a fresh slot. Updates of existing
+        images are saved without any extra query.
 
         Raises:
-            ValidationError: If the maximum number of images is exceeded.
-        """
-        max_images = 15
-        if validate_limit:
-            current_count = MainImage.objects.count()
-            if current_count >= max_images:
-                raise ValidationError(
-                    f'A maximum of {max_images} images are allowed on the main page.'
-                )
-        super().save(*args, **kwargs)
+            ValidationError: If the maximum number of images is exceeded or the
+                position is outside 1..MAX_MAIN_IMAGES.
+        """
+        update_fields = kwargs.get('update_fields')
+        if (update_fields is None or 'position' in update_fields) and self.position_error():
+            raise ValidationError(self.position_error())
+        if not self._state.adding:
+            super().save(*args, **kwargs)
+            return
+
+        requested = self.position
+        for attempt in range(1, SLOT_ALLOCATION_ATTEMPTS + 1):
+            self.position = requested or self.free_slot()
+            try:
+                with transaction.atomic():
+                    super().save(*args, **kwargs)
+                return
+            except IntegrityError:
+                if requested or attempt == SLOT_ALLOCATION_ATTEMPTS:
+                    raise
+
+    @staticmethod
+    def free_slot() -> int:
+        """
+        Returns the slot for a new image: the one after the last image, or the first gap.
+
+        Raises:
+            ValidationError: If all slots are taken.
+        """
+        taken = set(MainImage.objects.values_list('position', flat=True))
+        free = [slot for slot in range(1, MAX_MAIN_IMAGES + 1) if slot not in taken]
+        if not free:
+            raise ValidationError(
+                f'A maximum of {MAX_MAIN_IMAGES} images are allowed on the main page.'
+            )
+        last = max(taken, default=0)
+        return next((slot for slot in free if slot > last), free[0])
 
     def delete(self, *args: Any, **kwargs: Any) -> None:
         """
@@ -66,22 +276,23 @@ class MainImage(models.Model):
 
     def __str__(self) -> str:
         """
-        Returns the object's position in the queryset as a string.
+        Returns the object's position in the slider as a string.
+
+        Uses the ``display_position`` annotation when the instance was loaded with
+        ``MainImage.objects.with_display_position()``, so no extra query is made.
 
         Returns:
-            str: The position of the object in the queryset, or "Object not found" if not found.
+            str: The position of the object in the slider.
         """
-        ordered_ids = list(MainImage.objects.order_by('pk').values_list('pk', flat=True))
-        try:
-            index = ordered_ids.index(self.pk) + 1
-            return str(index)
-        except ValueError:
-            return "Object not found"
+        return str(getattr(self, 'display_position', None) or self.position)
 
     class Meta:
         verbose_name = "Main Page Image"
         verbose_name_plural = "Main Page Images"
-        ordering = ['pk']
+        ordering = ['position', 'pk']
+        constraints = [
+            models.UniqueConstraint(fields=['position'], name='portfolio_mainimage_unique_position'),
+        ]
 
 
 class Feedback(models.Model):
@@ -102,6 +313,57 @@ class Feedback(models.Model):
         return f"Feedback from {self.name} ({self.email})"
 
 
+class Notification(models.Model):
+    """
+    Outbox entry: an email to the site owner, written in the same transaction as the
+    submission it reports and sent later by the mail dispatcher (see portfolio/mail.py).
+    """
+    subject = models.CharField(max_length=255)
+    message = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    # When the relay handed the entry to Celery. Entries relayed long ago are relayed again.
+    relayed_at = models.DateTimeField(blank=True, null=True, db_index=True)
+    # Times the relay handed the entry to Celery. Entries relayed MAIL_MAX_ATTEMPTS times
+    # are dead letters: kept for inspection, never relayed again.
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        ordering = ['pk']
+
+    def __str__(self) -> str:
+        """
+        Returns a string representation of the notification.
+        """
+        return self.subject
+
+
+class InstagramTile(ImageMetadata):
+    """
+    A photo of the Instagram feed carousel shown at the bottom of several pages.
+    """
+    image = models.ImageField(upload_to='instagram/')
+    link = models.URLField(
+        default=INSTAGRAM_PROFILE_URL,
+        help_text="Page opened by the Instagram icon of the tile, e.g. the post."
+    )
+    alt = models.CharField(max_length=255, blank=True)
+    position = models.PositiveSmallIntegerField(default=0, help_text="Tiles are shown by ascending position.")
+    is_visible = models.BooleanField(default=True)
+    derivatives = models.JSONField(default=dict, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['position', 'pk']
+        verbose_name = "Instagram Tile"
+        verbose_name_plural = "Instagram Tiles"
+
+    def __str__(self) -> str:
+        """
+        Returns a string representation of the tile.
+        """
+        return self.alt or f"Tile {self.pk}"
+
+
 class Tag(models.Model):
     """
     Represents a tag that can be associated with portfolio images.
@@ -116,20 +378,97 @@ class Tag(models.Model):
         return self.name
 
 
-class PortfolioImage(models.Model):
+class GroupConcat(models.Aggregate):
+    """
+    ``GROUP_CONCAT`` of SQLite and MySQL, joining the values of a group with ``separator``.
+    """
+    function = 'GROUP_CONCAT'
+
+    def __init__(self, expression: Any, separator: str, **extra: Any) -> None:
+        super().__init__(expression, output_field=models.TextField(), **extra)
+        self.separator = separator
+
+    def as_sqlite(self, compiler: Any, connection: Any, **extra_context: Any) -> tuple:
+        sql, params = self.as_sql(compiler, connection, template='%(function)s(%(expressions)s, %%s)', **extra_context)
+        return sql, (*params, self.separator)
+
+    def as_mysql(self, compiler: Any, connection: Any, **extra_context: Any) -> tuple:
+        sql, params = self.as_sql(
+            compiler, connection, template='%(function)s(%(expressions)s SEPARATOR %%s)', **extra_context
+        )
+        return sql, (*params, self.separator)
+
+
+class PortfolioImageQuerySet(models.QuerySet):
+    """
+    QuerySet for portfolio images.
+    """
+
+    def with_tag_names(self) -> 'PortfolioImageQuerySet':
+        """
+        Loads the tag names of every image in the query that loads the images.
+
+        The names are aggregated by a correlated subquery on the through table, with
+        ``STRING_AGG`` on PostgreSQL and ``GROUP_CONCAT`` on SQLite and MySQL. Being a
+        subquery, it is not narrowed by filters on ``tags`` (e.g. the admin search).
+        Other databases fall back to prefetching the tags: one extra query in total.
+        ``PortfolioImage.tag_names`` reads either.
+        """
+        vendor = connections[self.db].vendor
+        if vendor == 'postgresql':
+            from django.contrib.postgres.aggregates import StringAgg
+
+            aggregate = StringAgg('tag__name', TAG_SEPARATOR)
+        elif vendor in ('sqlite', 'mysql'):
+            aggregate = GroupConcat('tag__name', TAG_SEPARATOR)
+        else:
+            return self.prefetch_related('tags')
+
+        names = (
+            PortfolioImage.tags.through.objects
+            .filter(portfolioimage=OuterRef('pk'))
+            .values('portfolioimage')
+            .annotate(names=aggregate)
+            .values('names')
+        )
+        return self.annotate(tag_names_joined=Subquery(names))
+
+
+class PortfolioImage(PerceptualHashed):
     """
     Represents an image in the portfolio with associated tags.
     """
+    objects = PortfolioImageQuerySet.as_manager()
 
     image = models.ImageField(upload_to='portfolio/')
     tags = models.ManyToManyField(Tag, related_name="portfolio_photos")
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    derivatives = models.JSONField(default=dict, blank=True, editable=False)
+    placeholder = models.JSONField(default=dict, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Serves the keyset pagination of the gallery API.
+            models.Index(fields=['-uploaded_at', '-id'], name='portfolio_uploaded_keyset_idx'),
+        ]
 
     def __str__(self) -> str:
         """
         Returns a string representation of the portfolio image,
         including its ID and associated tags.
         """
-        tags_qs = self.tags.all()
-        tags_list = ", ".join(tag.name for tag in tags_qs) if tags_qs.exists() else "No tags"
-        return f"Image {self.id} ({tags_list})"
+        return f"Image {self.id} ({', '.join(self.tag_names()) or 'No tags'})"
+
+    def tag_names(self) -> List[str]:
+        """
+        Returns the names of the image's tags in alphabetical order.
+
+        Reuses the names aggregated by ``with_tag_names`` or the prefetched tags
+        when the image was loaded with them; otherwise runs a single query.
+        """
+        if hasattr(self, 'tag_names_joined'):
+            return sorted(self.tag_names_joined.split(TAG_SEPARATOR)) if self.tag_names_joined else []
+        prefetched = getattr(self, '_prefetched_objects_cache', {}).get('tags')
+        if prefetched is not None:
+            return sorted(tag.name for tag in prefetched)
+        return sorted(self.tags.values_list('name', flat=True))
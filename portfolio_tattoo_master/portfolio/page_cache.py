@@ -0,0 +1,262 @@
+import hashlib
+import re
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from urllib.parse import urlencode
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpRequest, HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.translation import get_language
+
+from .captcha_pool import lease_captcha
+from .db_router import REPLICA_PIN_SECONDS, replica_was_read
+
+CONTENT_VERSION_KEY = 'page_cache:content_version'
+
+# Set for REPLICA_PIN_SECONDS after each content change: the replica may not have it yet.
+RECENT_CHANGE_KEY = 'page_cache:recent_change'
+
+PAGE_CACHE_TIMEOUT: int = getattr(settings, 'PAGE_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+class PageHole:
+    """
+    A per-visitor value cut out of a cached page and filled in again on every hit.
+
+    Attributes:
+        name (str): Name of the hole, used to build its placeholder.
+        pattern (re.Pattern): Regex whose first group captures the value in the rendered page.
+        fill (Callable[[HttpRequest], str]): Produces a fresh value for the current request.
+    """
+
+    def __init__(self, name: str, pattern: str, fill: Callable[[HttpRequest], str]) -> None:
+        self.name = name
+        self.pattern = re.compile(pattern)
+        self.fill = fill
+
+    @property
+    def placeholder(self) -> str:
+        return f"__page_hole_{self.name}__"
+
+    def cut(self, content: str) -> str:
+        """
+        Replaces every occurrence of the value captured by the pattern with the placeholder.
+        """
+        match = self.pattern.search(content)
+        if match is None:
+            return content
+        return content.replace(match.group(1), self.placeholder)
+
+
+CSRF_HOLE = PageHole(
+    'csrf',
+    r'name="csrfmiddlewaretoken" value="([^"]+)"',
+    get_token,
+)
+
+CAPTCHA_HOLE = PageHole(
+    'captcha',
+    r'name="captcha_0" value="([^"]+)"',
+    lambda request: lease_captcha(),
+)
+
+
+def _read_version(key: str) -> int:
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, timeout=None)
+        version = cache.get(key, 1)
+    return version
+
+
+def _bump_version(key: str) -> None:
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, timeout=None)
+
+
+def _scope_key(scope: str) -> str:
+    return f"page_cache:scope:{scope}"
+
+
+def get_content_version() -> int:
+    """
+    Returns the current content version, part of every page and fragment cache key.
+    """
+    return _read_version(CONTENT_VERSION_KEY)
+
+
+async def aget_content_version() -> int:
+    """
+    Async version of ``get_content_version``.
+    """
+    version = await cache.aget(CONTENT_VERSION_KEY)
+    if version is None:
+        return await sync_to_async(get_content_version)()
+    return version
+
+
+def bump_content_version() -> None:
+    """
+    Bumps the content version once the current transaction commits,
+    so every cached page and fragment is rendered again on its next hit.
+    """
+    def bump() -> None:
+        cache.set(RECENT_CHANGE_KEY, True, timeout=REPLICA_PIN_SECONDS)
+        _bump_version(CONTENT_VERSION_KEY)
+
+    transaction.on_commit(bump)
+
+
+def get_scope_version(scope: str) -> int:
+    """
+    Returns the version of a frequently changing part of the content (e.g. the post
+    view counts), part of the cache keys of the pages and fragments showing it.
+    """
+    return _read_version(_scope_key(scope))
+
+
+def bump_scope_version(scope: str) -> None:
+    """
+    Bumps the version of one part of the content once the current transaction commits.
+    Only the pages cached with ``depends_on=(scope,)`` and the fragments keyed on the
+    scope version are rendered again, the rest of the page cache is kept.
+    """
+    transaction.on_commit(lambda: _bump_version(_scope_key(scope)))
+
+
+# Headers rebuilt for every response rather than replayed from a cached shell.
+SHELL_EXCLUDED_HEADERS = {'content-type', 'content-length'}
+
+
+def page_cache_key(request: HttpRequest, version: Optional[int] = None, params: Sequence[str] = (),
+                   scope_versions: Sequence[int] = ()) -> str:
+    """
+    Builds the cache key of a page from the active language, the path, the query
+    parameters the page depends on, the content version and the versions of the
+    scopes the page depends on.
+
+    Other query parameters (tracking tags, cache busters, ...) are left out, so they
+    cannot fill the cache with copies of the same page.
+    """
+    query = urlencode(sorted((name, value) for name in set(params) for value in request.GET.getlist(name)))
+    url = f"{request.path}?{query}" if query else request.path
+    url_hash = hashlib.md5(url.encode()).hexdigest()
+    version = get_content_version() if version is None else version
+    versions = '.'.join(str(number) for number in (version, *scope_versions))
+    return f"page_cache:{get_language()}:{versions}:{url_hash}"
+
+
+def cache_page_shell(holes: Sequence[PageHole] = (), timeout: Optional[int] = None,
+                     params: Sequence[str] = (), depends_on: Sequence[str] = ()) -> Callable:
+    """
+    Caches the rendered page of a GET request as a shell with per-visitor holes.
+
+    Requests that are not GET/HEAD, or that have pending flash messages, always
+    reach the view. On a hit, every hole (CSRF token, captcha key, ...) is filled
+    with a fresh value for the current visitor. Works for sync and async views.
+
+    A page rendered from the replica within ``REPLICA_PIN_SECONDS`` of a content
+    change is returned but not stored: the replica may not have the change yet.
+
+    Usage::
+
+        @cache_page_shell(holes=(CSRF_HOLE, CAPTCHA_HOLE))
+        def contact(request): ...
+
+    Args:
+        holes (Sequence[PageHole]): Per-visitor values to cut out of the cached page.
+        timeout (Optional[int]): Cache timeout in seconds. Defaults to ``PAGE_CACHE_TIMEOUT``.
+        params (Sequence[str]): Query parameters the view reads. Only they are part of the cache key.
+        depends_on (Sequence[str]): Scopes (see ``bump_scope_version``) whose changes the page shows.
+
+    Returns:
+        Callable: The view decorator.
+    """
+    timeout = PAGE_CACHE_TIMEOUT if timeout is None else timeout
+
+    def decorator(view: Callable[..., HttpResponse]) -> Callable[..., HttpResponse]:
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse:
+                # Pending messages are read from the session, which may query the database.
+                if await sync_to_async(_bypasses_cache)(request):
+                    return await view(request, *args, **kwargs)
+
+                scope_versions = await sync_to_async(_scope_versions)(depends_on) if depends_on else []
+                key = page_cache_key(request, await aget_content_version(), params, scope_versions)
+                shell: Optional[Dict[str, Any]] = await cache.aget(key)
+                if shell is not None:
+                    return await sync_to_async(render_shell)(request, shell, holes)
+
+                response = await view(request, *args, **kwargs)
+                if _is_cacheable(response) and not (replica_was_read() and await cache.aget(RECENT_CHANGE_KEY)):
+                    await cache.aset(key, _make_shell(response, holes), timeout=timeout)
+                return response
+
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse:
+            if _bypasses_cache(request):
+                return view(request, *args, **kwargs)
+
+            key = page_cache_key(request, params=params, scope_versions=_scope_versions(depends_on))
+            shell: Optional[Dict[str, Any]] = cache.get(key)
+            if shell is not None:
+                return render_shell(request, shell, holes)
+
+            response = view(request, *args, **kwargs)
+            if _is_cacheable(response) and not (replica_was_read() and cache.get(RECENT_CHANGE_KEY)):
+                cache.set(key, _make_shell(response, holes), timeout=timeout)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def _scope_versions(scopes: Sequence[str]) -> List[int]:
+    return [get_scope_version(scope) for scope in scopes]
+
+
+def _bypasses_cache(request: HttpRequest) -> bool:
+    return request.method not in ('GET', 'HEAD') or bool(len(messages.get_messages(request)))
+
+
+def _is_cacheable(response: HttpResponse) -> bool:
+    return response.status_code == 200 and not response.streaming
+
+
+def _make_shell(response: HttpResponse, holes: Sequence[PageHole]) -> Dict[str, Any]:
+    content = response.content.decode(response.charset)
+    for hole in holes:
+        content = hole.cut(content)
+    headers = {name: value for name, value in response.headers.items() if name.lower() not in SHELL_EXCLUDED_HEADERS}
+    return {'content': content, 'content_type': response['Content-Type'], 'headers': headers}
+
+
+def render_shell(request: HttpRequest, shell: Dict[str, Any], holes: Sequence[PageHole]) -> HttpResponse:
+    """
+    Fills the holes of a cached page shell for the current visitor.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+        shell (Dict[str, Any]): The cached content, content type and headers.
+        holes (Sequence[PageHole]): The holes cut out of the page when it was cached.
+
+    Returns:
+        HttpResponse: The filled page, with the headers the view set (``Vary``, ``Content-Language``, ...).
+    """
+    content = shell['content']
+    for hole in holes:
+        if hole.placeholder in content:
+            content = content.replace(hole.placeholder, hole.fill(request))
+    return HttpResponse(content, content_type=shell['content_type'], headers=shell.get('headers'))
+
@@ -0,0 +1,128 @@
+from typing import Any, List, Optional, Tuple
+
+from django.db.models.fields.files import FieldFile
+from PIL import Image, ImageOps
+
+# Side of the difference hash grid: 8 gives 64-bit hashes.
+HASH_SIZE = 8
+
+
+def difference_hash(image: Image.Image) -> int:
+    """
+    Computes the difference hash (dHash) of an image: one bit per pair of horizontally
+    adjacent cells of a 9x8 grayscale thumbnail, set when the left cell is brighter.
+
+    The hash only follows the gradients of the picture, so re-exports, resizes,
+    color tweaks and slight crops of the same photo stay within a few bits.
+    """
+    gray = ImageOps.exif_transpose(image).convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.BOX)
+    pixels = gray.tobytes()
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for column in range(HASH_SIZE):
+            value = value << 1 | (pixels[offset + column] > pixels[offset + column + 1])
+    return value
+
+
+def compute_hash(field_file: FieldFile) -> str:
+    """
+    Computes the perceptual hash of an image in storage or of an upload not saved yet.
+
+    JPEG files are decoded at a reduced scale (``Image.draft``): the hash only needs a thumbnail.
+
+    Args:
+        field_file (FieldFile): The image field value of a model instance.
+
+    Returns:
+        str: The 64-bit hash as 16 hexadecimal digits, e.g. ``"f0e4c2d9b1a3878f"``.
+    """
+    def read(file: Any) -> int:
+        with Image.open(file) as image:
+            image.draft('L', (HASH_SIZE * 8, HASH_SIZE * 8))
+            return difference_hash(image)
+
+    if field_file._committed:
+        with field_file.open('rb') as file:
+            value = read(file)
+    else:
+        file = field_file.file
+        position = file.tell()
+        file.seek(0)
+        try:
+            value = read(file)
+        finally:
+            file.seek(position)
+    return f"{value:0{HASH_SIZE * HASH_SIZE // 4}x}"
+
+
+def hamming_distance(first: int, second: int) -> int:
+    """
+    Returns the number of bits that differ between two hashes.
+    """
+    return (first ^ second).bit_count()
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree of hashes, searched by Hamming distance.
+
+    Every child of a node is filed under its distance to the node. By the triangle
+    inequality, a search for hashes within ``radius`` of a query only descends into
+    children filed under ``distance ± radius``, so it visits a small part of the tree
+    instead of comparing the query with every hash.
+
+    Nodes are plain lists ``[hash, items, {distance: child}]`` so the tree pickles
+    into the cache compactly. Items with the same hash share a node.
+    """
+
+    def __init__(self) -> None:
+        self.root: Optional[list] = None
+        self.size = 0
+
+    def add(self, value: int, item: Any) -> None:
+        """
+        Files an item under its hash.
+        """
+        self.size += 1
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value: int, radius: int) -> List[Tuple[int, Any]]:
+        """
+        Returns the items whose hash is within ``radius`` bits of ``value``.
+
+        Args:
+            value (int): The hash to look up.
+            radius (int): The largest Hamming distance to report.
+
+        Returns:
+            List[Tuple[int, Any]]: ``(distance, item)`` pairs, closest first.
+        """
+        found = []
+        pending = [self.root] if self.root is not None else []
+        while pending:
+            node = pending.pop()
+            distance = hamming_distance(value, node[0])
+            if distance <= radius:
+                found.extend((distance, item) for item in node[1])
+            for child_distance, child in node[2].items():
+                if distance - radius <= child_distance <= distance + radius:
+                    pending.append(child)
+        found.sort(key=lambda pair: pair[0])
+        return found
+
+    def __len__(self) -> int:
+        return self.size
@@ -0,0 +1,80 @@
+import base64
+from io import BytesIO
+from typing import Any, Dict
+
+from django.conf import settings
+from django.db.models import Model
+from django.db.models.fields.files import FieldFile
+from PIL import Image, ImageOps
+
+# Width (in pixels) of the inline preview shown while an image loads.
+PLACEHOLDER_WIDTH: int = getattr(settings, 'IMAGE_PLACEHOLDER_WIDTH', 16)
+
+PLACEHOLDER_QUALITY: int = getattr(settings, 'IMAGE_PLACEHOLDER_QUALITY', 40)
+
+# Colors the preview is reduced to when looking for the dominant one.
+PALETTE_SIZE = 4
+
+
+def dominant_color(image: Image.Image) -> str:
+    """
+    Returns the most frequent color of a small RGB image as ``#rrggbb``.
+    """
+    quantized = image.quantize(colors=PALETTE_SIZE)
+    palette = quantized.getpalette()
+    _, index = max(quantized.getcolors())
+    red, green, blue = palette[index * 3:index * 3 + 3]
+    return f"#{red:02x}{green:02x}{blue:02x}"
+
+
+def build_placeholder(field_file: FieldFile) -> Dict[str, Any]:
+    """
+    Computes the low-quality preview and the dominant color of an uploaded image.
+
+    JPEG files are decoded at a reduced scale (``Image.draft``), so even large
+    photos only cost a fraction of a full decode.
+
+    Args:
+        field_file (FieldFile): The image field value of a model instance.
+
+    Returns:
+        Dict[str, Any]: Stored on the model::
+
+            {
+                "source": "portfolio/ink.jpg",
+                "preview": "data:image/webp;base64,...",
+                "color": "#3a2f2b",
+            }
+    """
+    with field_file.open('rb') as source:
+        with Image.open(source) as opened:
+            opened.draft('RGB', (PLACEHOLDER_WIDTH * 4, PLACEHOLDER_WIDTH * 4))
+            image = ImageOps.exif_transpose(opened).convert('RGB')
+
+    height = max(1, round(image.height * PLACEHOLDER_WIDTH / image.width))
+    preview = image.resize((PLACEHOLDER_WIDTH, height), Image.BOX)
+
+    buffer = BytesIO()
+    preview.save(buffer, 'WEBP', quality=PLACEHOLDER_QUALITY)
+    return {
+        'source': field_file.name,
+        'preview': f"data:image/webp;base64,{base64.b64encode(buffer.getvalue()).decode()}",
+        'color': dominant_color(preview),
+    }
+
+
+def needs_placeholder(instance: Model, field_name: str = 'image') -> bool:
+    """
+    Checks whether the placeholder stored on an instance is missing or was computed for another file.
+
+    Args:
+        instance (Model): A model instance with an image field and a ``placeholder`` field.
+        field_name (str): Name of the image field.
+
+    Returns:
+        bool: True if the image is set and has no up-to-date placeholder.
+    """
+    field_file = getattr(instance, field_name)
+    if not field_file:
+        return False
+    return (instance.placeholder or {}).get('source') != field_file.name
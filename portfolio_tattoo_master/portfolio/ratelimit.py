@@ -0,0 +1,246 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import BaseCache, caches
+from django.http import HttpRequest, HttpResponse
+
+from .counters import SharedCounters
+
+# Cache alias holding the shared counters. Point it at Redis in production so
+# every worker sees the same counts; the default local-memory cache is per process.
+RATELIMIT_CACHE: str = getattr(settings, 'RATELIMIT_CACHE', 'default')
+
+# Number of blocked clients remembered by each process.
+RATELIMIT_LRU_SIZE: int = getattr(settings, 'RATELIMIT_LRU_SIZE', 1024)
+
+# Seconds between two pushes of the local statistics to the shared cache.
+RATELIMIT_STATS_INTERVAL: int = getattr(settings, 'RATELIMIT_STATS_INTERVAL', 10)
+
+RATE_UNITS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+
+STAT_FIELDS = ('hits', 'limited', 'local_blocks')
+
+
+def parse_rate(rate: str) -> Tuple[int, int]:
+    """
+    Parses a rate such as ``2/10m`` into a limit and a window length.
+
+    Args:
+        rate (str): ``<count>/<number?><unit>`` with unit ``s``, ``m``, ``h`` or ``d``.
+
+    Returns:
+        Tuple[int, int]: The allowed number of requests and the window in seconds.
+    """
+    count, period = rate.split('/')
+    multiplier = int(period[:-1]) if len(period) > 1 else 1
+    return int(count), multiplier * RATE_UNITS[period[-1]]
+
+
+class BlockedClients:
+    """
+    A bounded, thread-safe LRU of clients known to be over their limit, with the time they are freed.
+    """
+
+    def __init__(self, size: int = RATELIMIT_LRU_SIZE) -> None:
+        self.size = size
+        self._entries: 'OrderedDict[Tuple[str, str], float]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def is_blocked(self, group: str, client: str, now: float) -> bool:
+        with self._lock:
+            until = self._entries.get((group, client))
+            if until is None:
+                return False
+            if until <= now:
+                del self._entries[(group, client)]
+                return False
+            self._entries.move_to_end((group, client))
+            return True
+
+    def block(self, group: str, client: str, until: float) -> None:
+        with self._lock:
+            self._entries[(group, client)] = until
+            self._entries.move_to_end((group, client))
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class RateLimitStats:
+    """
+    Per-endpoint counters of hits and refusals, shared by all workers.
+    """
+
+    def __init__(self) -> None:
+        self.rates: Dict[str, str] = {}
+        self.counters = SharedCounters('ratelimit:stats', lambda: _store(), RATELIMIT_STATS_INTERVAL)
+
+    def register(self, group: str, rate: str) -> None:
+        self.rates[group] = rate
+
+    def record(self, group: str, rate: str, **counts: int) -> None:
+        self.rates[group] = rate
+        self.counters.add(group, **counts)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns the shared counters of every registered endpoint.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: ``{group: {"rate": "2/10m", "hits": 10, "limited": 3, "local_blocks": 2}}``.
+        """
+        totals = self.counters.totals(self.rates, STAT_FIELDS)
+        return {group: {'rate': rate, **totals[group]} for group, rate in self.rates.items()}
+
+
+blocked_clients = BlockedClients()
+stats = RateLimitStats()
+
+
+def _store() -> BaseCache:
+    return caches[RATELIMIT_CACHE]
+
+
+def _window_key(group: str, client: str, window: int, index: int) -> str:
+    return f"ratelimit:{group}:{window}:{client}:{index}"
+
+
+def client_ip(request: HttpRequest) -> str:
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def hit(group: str, client: str, rate: str, now: Optional[float] = None) -> bool:
+    """
+    Counts one request of a client and tells whether it exceeds the rate.
+
+    Uses a sliding-window counter: the count of the current fixed window plus
+    the count of the previous one, weighted by how much of it still overlaps
+    the sliding window. Clients found over the limit are remembered in process
+    until the estimate drops below the limit again, so their next requests are
+    refused without contacting the shared cache.
+
+    Args:
+        group (str): The endpoint, e.g. ``portfolio.views.contact``.
+        client (str): The client identity, e.g. its IP address.
+        rate (str): The allowed rate, e.g. ``2/10m``.
+        now (Optional[float]): The current UNIX time. Defaults to ``time.time()``.
+
+    Returns:
+        bool: True if the request is over the limit.
+    """
+    now = time.time() if now is None else now
+    if blocked_clients.is_blocked(group, client, now):
+        stats.record(group, rate, hits=1, limited=1, local_blocks=1)
+        return True
+
+    limit, window = parse_rate(rate)
+    index, elapsed = divmod(now, window)
+    index = int(index)
+    current_key = _window_key(group, client, window, index)
+
+    store = _store()
+    try:
+        current = store.incr(current_key)
+    except ValueError:
+        if store.add(current_key, 1, timeout=window * 2):
+            current = 1
+        else:
+            current = store.incr(current_key)
+    previous = store.get(_window_key(group, client, window, index - 1), 0)
+
+    weight = 1 - elapsed / window
+    limited = previous * weight + current > limit
+    if limited:
+        blocked_clients.block(group, client, _blocked_until(limit, window, index, current, previous))
+    stats.record(group, rate, hits=1, limited=int(limited))
+    return limited
+
+
+def _blocked_until(limit: int, window: int, index: int, current: int, previous: int) -> float:
+    """
+    Returns when the sliding estimate of a blocked client falls back to the limit,
+    assuming it sends nothing meanwhile.
+    """
+    window_end = (index + 1) * window
+    if current >= limit or not previous:
+        return window_end
+    # previous * (1 - elapsed / window) + current <= limit
+    return index * window + math.ceil(window * (1 - (limit - current) / previous))
+
+
+def is_limited(request: HttpRequest, group: str, rate: str = '2/10m', method: str = 'POST') -> bool:
+    """
+    Tells whether a request exceeds the rate of its endpoint. Requests with another method are not counted.
+
+    Args:
+        request (HttpRequest): The incoming HTTP request.
+        group (str): The endpoint, usually the dotted name of the view.
+        rate (str): The allowed rate per IP address.
+        method (str): The HTTP method that is limited.
+
+    Returns:
+        bool: True if the request is over the limit.
+    """
+    if request.method != method:
+        return False
+    return hit(group, client_ip(request), rate)
+
+
+async def ais_limited(request: HttpRequest, group: str, rate: str = '2/10m', method: str = 'POST') -> bool:
+    """
+    Async version of ``is_limited``. Clients blocked in process are refused without leaving the event loop.
+    """
+    if request.method != method:
+        return False
+    if blocked_clients.is_blocked(group, client_ip(request), time.time()):
+        stats.record(group, rate, hits=1, limited=1, local_blocks=1)
+        return True
+    return await sync_to_async(hit)(group, client_ip(request), rate)
+
+
+def rate_limit(rate: str = '2/10m', method: str = 'POST', group: Optional[str] = None) -> Callable:
+    """
+    Sets ``request.limited`` on requests exceeding the rate, like ``django_ratelimit`` with ``block=False``.
+
+    Usage::
+
+        @rate_limit(rate='2/10m')
+        def detail_post(request, slug): ...
+
+    Args:
+        rate (str): The allowed rate per IP address.
+        method (str): The HTTP method that is limited.
+        group (Optional[str]): The endpoint name. Defaults to the dotted name of the view.
+
+    Returns:
+        Callable: The view decorator.
+    """
+    def decorator(view: Callable[..., HttpResponse]) -> Callable[..., HttpResponse]:
+        name = group or f"{view.__module__}.{view.__qualname__}"
+        stats.register(name, rate)
+
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse:
+                request.limited = await ais_limited(request, name, rate, method)
+                return await view(request, *args, **kwargs)
+
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse:
+            request.limited = is_limited(request, name, rate, method)
+            return view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,114 @@
+import logging
+from typing import Any
+
+from django.db import transaction
+from django.db.models import Model
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .derivatives import delete_derivatives, needs_derivatives
+from .duplicates import file_hashes, forget_hashes
+from .models import InstagramTile, MainImage, PortfolioImage, Tag
+from .page_cache import bump_content_version
+from .placeholders import needs_placeholder
+from .snapshots import invalidate_model
+from .task import generate_image_derivatives, generate_image_placeholder
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=MainImage)
+@receiver(post_save, sender=PortfolioImage)
+@receiver(post_save, sender=InstagramTile)
+def queue_image_derivatives(sender: type[Model], instance: Model, **kwargs: Any) -> None:
+    """
+    Schedules derivative generation once the transaction that saved a new image commits.
+    """
+    if kwargs.get('raw') or not needs_derivatives(instance):
+        return
+
+    def dispatch() -> None:
+        try:
+            generate_image_derivatives.delay(sender._meta.label, instance.pk)
+        except Exception as e:
+            logger.error(f"Error queueing derivatives for {sender._meta.label} {instance.pk}: {e}")
+
+    transaction.on_commit(dispatch)
+
+
+@receiver(post_save, sender=MainImage)
+@receiver(post_save, sender=PortfolioImage)
+def queue_image_placeholder(sender: type[Model], instance: Model, **kwargs: Any) -> None:
+    """
+    Schedules the placeholder computation once the transaction that saved a new image commits.
+    """
+    if kwargs.get('raw') or not needs_placeholder(instance):
+        return
+
+    def dispatch() -> None:
+        try:
+            generate_image_placeholder.delay(sender._meta.label, instance.pk)
+        except Exception as e:
+            logger.error(f"Error queueing the placeholder of {sender._meta.label} {instance.pk}: {e}")
+
+    transaction.on_commit(dispatch)
+
+
+@receiver(post_delete, sender=MainImage)
+@receiver(post_delete, sender=PortfolioImage)
+@receiver(post_delete, sender=InstagramTile)
+def remove_image_derivatives(sender: type[Model], instance: Model, **kwargs: Any) -> None:
+    """
+    Removes the derivative files of a deleted image.
+    """
+    delete_derivatives(instance.derivatives)
+
+
+@receiver(post_save, sender=MainImage)
+@receiver(post_save, sender=PortfolioImage)
+def update_hash_tree(sender: type[Model], instance: Model, created: bool, **kwargs: Any) -> None:
+    """
+    Files the hash of a newly hashed image in the cached tree. The tree is only
+    rebuilt when the hash it holds for an image changed.
+    """
+    previous = '' if created else getattr(instance, '_previous_hash', instance.perceptual_hash)
+    if kwargs.get('raw') or (previous and previous != instance.perceptual_hash):
+        forget_hashes()
+    elif not previous:
+        file_hashes([instance])
+
+
+@receiver(post_delete, sender=MainImage)
+@receiver(post_delete, sender=PortfolioImage)
+def remove_from_hash_tree(sender: type[Model], instance: Model, **kwargs: Any) -> None:
+    """
+    Rebuilds the cached tree on its next use when a hashed image is deleted.
+    """
+    if instance.perceptual_hash:
+        forget_hashes()
+
+
+@receiver(post_save, sender=MainImage)
+@receiver(post_save, sender=PortfolioImage)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=InstagramTile)
+@receiver(post_delete, sender=MainImage)
+@receiver(post_delete, sender=PortfolioImage)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=InstagramTile)
+def invalidate_snapshots(sender: type[Model], **kwargs: Any) -> None:
+    """
+    Invalidates the cached snapshots built from the changed model and the cached pages.
+    """
+    invalidate_model(sender)
+    bump_content_version()
+
+
+@receiver(m2m_changed, sender=PortfolioImage.tags.through)
+def invalidate_snapshots_on_tagging(sender: type[Model], action: str, **kwargs: Any) -> None:
+    """
+    Invalidates the portfolio snapshots when tags are added to or removed from an image.
+    """
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_model(PortfolioImage)
+        bump_content_version()
@@ -0,0 +1,191 @@
+import logging
+from typing import Any, Callable, Dict, List, Set, Type
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Model
+
+from .db_router import primary_reads
+
+logger = logging.getLogger(__name__)
+
+Rows = List[Dict[str, Any]]
+
+# How long a worker may hold the rebuild lock before another one takes over.
+REBUILD_LOCK_TIMEOUT = 30
+
+_builders: Dict[str, Callable[[], Any]] = {}
+_dependencies: Dict[str, Set[str]] = {}
+
+
+def register_snapshot(key: str, *models: Type[Model]) -> Callable[[Callable[[], Any]], Callable[[], Any]]:
+    """
+    Registers a function building a snapshot and the models it is derived from.
+
+    Usage::
+
+        @register_snapshot('main_images', MainImage)
+        def build_main_images() -> Rows:
+            ...
+
+    Args:
+        key (str): The cache key of the snapshot.
+        *models (Type[Model]): Models whose changes invalidate the snapshot.
+
+    Returns:
+        Callable: A decorator returning the builder unchanged.
+    """
+    def decorator(builder: Callable[[], Any]) -> Callable[[], Any]:
+        _builders[key] = builder
+        for model in models:
+            _dependencies.setdefault(model._meta.label, set()).add(key)
+        return builder
+
+    return decorator
+
+
+def snapshot_models() -> Set[str]:
+    """
+    Returns the labels of all models that invalidate at least one snapshot.
+    """
+    return set(_dependencies)
+
+
+def _generation_key(key: str) -> str:
+    return f"snapshot:{key}:generation"
+
+
+def _data_key(key: str) -> str:
+    return f"snapshot:{key}:data"
+
+
+def _lock_key(key: str) -> str:
+    return f"snapshot:{key}:lock"
+
+
+def get_snapshot(key: str) -> Any:
+    """
+    Returns the materialized data of a snapshot.
+
+    The snapshot is stored without a TTL and tagged with the generation it was
+    built for. Invalidation only bumps the generation, so while one worker
+    rebuilds under a short lock the others keep serving the previous rows.
+    A stored snapshot is always built from the primary: right after a write, a
+    lagging replica would store the old rows under the new generation.
+
+    Args:
+        key (str): The key the snapshot was registered with.
+
+    Returns:
+        Any: Plain lists and dictionaries, safe to cache and to render.
+    """
+    generation_key, data_key = _generation_key(key), _data_key(key)
+    cached = cache.get_many([generation_key, data_key])
+    generation = cached.get(generation_key)
+    if generation is None:
+        cache.add(generation_key, 0, timeout=None)
+        generation = cache.get(generation_key, 0)
+
+    entry = cached.get(data_key)
+    if entry is not None and entry['generation'] == generation:
+        return entry['rows']
+
+    if cache.add(_lock_key(key), 1, timeout=REBUILD_LOCK_TIMEOUT):
+        try:
+            with primary_reads():
+                rows = _builders[key]()
+            cache.set(data_key, {'generation': generation, 'rows': rows}, timeout=None)
+        finally:
+            cache.delete(_lock_key(key))
+        return rows
+
+    if entry is not None:
+        # Another worker is rebuilding: serve the stale rows instead of piling on.
+        return entry['rows']
+
+    # Cold cache and the lock is taken: build without storing.
+    return _builders[key]()
+
+
+async def aget_snapshot(key: str) -> Any:
+    """
+    Async version of ``get_snapshot``.
+
+    A fresh snapshot is read with the async cache API. Rebuilding queries the
+    database, so it runs ``get_snapshot`` in a worker thread.
+
+    Args:
+        key (str): The key the snapshot was registered with.
+
+    Returns:
+        Any: Plain lists and dictionaries, safe to cache and to render.
+    """
+    generation_key, data_key = _generation_key(key), _data_key(key)
+    cached = await cache.aget_many([generation_key, data_key])
+    entry = cached.get(data_key)
+    if entry is not None and entry['generation'] == cached.get(generation_key):
+        return entry['rows']
+    return await sync_to_async(get_snapshot)(key)
+
+
+def invalidate_snapshot(key: str) -> None:
+    """
+    Marks a snapshot as outdated by bumping its generation.
+
+    Args:
+        key (str): The key the snapshot was registered with.
+    """
+    try:
+        cache.incr(_generation_key(key))
+    except ValueError:
+        cache.set(_generation_key(key), 1, timeout=None)
+
+
+def patch_snapshot(key: str, change: Callable[[Any], None]) -> None:
+    """
+    Applies a change to the cached data of a snapshot instead of rebuilding it,
+    once the current transaction commits (a rolled back write changes nothing).
+
+    The change runs under the rebuild lock, on data of the current generation only.
+    When another worker holds the lock, the snapshot is invalidated instead so the
+    change is never lost. Data that is not cached is left alone: the next read
+    builds it from the committed rows.
+
+    Args:
+        key (str): The key the snapshot was registered with.
+        change (Callable[[Any], None]): Updates the data in place.
+    """
+    def apply() -> None:
+        if not cache.add(_lock_key(key), 1, timeout=REBUILD_LOCK_TIMEOUT):
+            invalidate_snapshot(key)
+            return
+        try:
+            generation_key, data_key = _generation_key(key), _data_key(key)
+            cached = cache.get_many([generation_key, data_key])
+            entry = cached.get(data_key)
+            if entry is not None and entry['generation'] == cached.get(generation_key):
+                change(entry['rows'])
+                cache.set(data_key, entry, timeout=None)
+        finally:
+            cache.delete(_lock_key(key))
+
+    transaction.on_commit(apply)
+
+
+def invalidate_model(model: Type[Model]) -> None:
+    """
+    Invalidates every snapshot depending on a model once the current transaction commits.
+
+    Args:
+        model (Type[Model]): The model whose rows changed.
+    """
+    keys = _dependencies.get(model._meta.label, set())
+
+    def invalidate() -> None:
+        for key in keys:
+            invalidate_snapshot(key)
+            logger.debug(f"Snapshot {key} invalidated by {model._meta.label}.")
+
+    if keys:
+        transaction.on_commit(invalidate)
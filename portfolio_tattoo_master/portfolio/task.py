@@ -1,35 +1,145 @@
+from typing import List
+
 from celery import shared_task
-from django.core.mail import send_mail
-from django.conf import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
 @shared_task
-def send_email(subject: str, message: str) -> None:
+def relay_notifications() -> int:
+    """
+    Hands the notifications of the outbox to ``send_notification_batch`` in batches.
+    Scheduled by Celery beat every ``MAIL_COALESCE_WINDOW`` seconds.
+
+    Returns:
+        int: The number of notifications relayed.
+    """
+    from .mail import relay_notifications as relay
+
+    return relay()
+
+
+@shared_task(bind=True, max_retries=None)
+def send_notification_batch(self, ids: List[int]) -> int:
+    """
+    Sends a batch of outbox notifications over one SMTP connection (see portfolio/mail.py).
+
+    When the server throttles, the unsent notifications are retried with an exponential backoff.
+
+    Args:
+        ids (List[int]): Primary keys of the notifications.
+
+    Returns:
+        int: The number of notifications sent.
+    """
+    from django.utils import timezone
+
+    from .mail import MAIL_MAX_RETRIES, MAIL_RETRY_BACKOFF, MailThrottled, deliver_notifications
+    from .models import Notification
+
+    try:
+        return deliver_notifications(ids)
+    except MailThrottled as e:
+        if self.request.retries >= MAIL_MAX_RETRIES:
+            logger.error(f"Mail server still throttling after {self.request.retries} retries: {e}")
+            return 0
+        remaining = [pk for pk in ids if pk not in e.args[1]]
+        # Keep the relay from handing the same notifications out again while we wait.
+        Notification.objects.filter(pk__in=remaining).update(relayed_at=timezone.now())
+        countdown = MAIL_RETRY_BACKOFF * 2 ** self.request.retries
+        logger.warning(f"Mail server throttling, retrying in {countdown}s: {e}")
+        raise self.retry(args=(remaining,), exc=e, countdown=countdown)
+    except Exception as e:
+        logger.error(f"Error while sending notifications: {e}")
+        return 0
+
+
+@shared_task
+def refill_captcha_pool() -> int:
+    """
+    Deletes expired captcha challenges in bulk and tops the pre-rendered pool up.
+    Scheduled by Celery beat.
+
+    Returns:
+        int: The number of challenges added to the pool.
+    """
+    from .captcha_pool import fill_pool, remove_expired
+
+    removed = remove_expired()
+    added = fill_pool()
+    logger.info(f"Captcha pool: {removed} expired challenges removed, {added} added.")
+    return added
+
+
+@shared_task
+def generate_image_derivatives(model_label: str, pk: int, field_name: str = 'image') -> None:
     """
-    Sends an email with the provided subject and message.
+    Generates responsive WebP/JPEG derivatives for an image and records them on the model.
 
     Args:
-        subject (str): The subject of the email.
-        message (str): The body content of the email.
+        model_label (str): The ``app_label.ModelName`` of the model owning the image.
+        pk (int): Primary key of the instance.
+        field_name (str): Name of the image field. Defaults to ``image``.
 
     Returns:
         None
     """
+    from django.apps import apps
+
+    from .derivatives import build_derivatives, delete_derivatives, needs_derivatives
+    from .page_cache import bump_content_version
+    from .snapshots import invalidate_model
+
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None or not needs_derivatives(instance, field_name):
+        return
+
     try:
-        # Ensure the EMAIL_HOST_USER is configured
-        if not settings.EMAIL_HOST_USER:
-            raise ValueError("EMAIL_HOST_USER is not configured in settings.")
-
-        # Sending the email
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.EMAIL_HOST_USER,
-            recipient_list=[settings.EMAIL_HOST_USER],
-            fail_silently=False,
-        )
-        logger.info("Email sent successfully.")
+        derivatives = build_derivatives(getattr(instance, field_name))
     except Exception as e:
-        logger.error(f"Error while sending email: {e}")
+        logger.error(f"Error while generating derivatives for {model_label} {pk}: {e}")
+        return
+
+    # ``update`` keeps save() side effects (limits, signals) out of the background job.
+    model.objects.filter(pk=pk).update(derivatives=derivatives)
+    invalidate_model(model)
+    bump_content_version()
+    delete_derivatives(instance.derivatives, keep=derivatives)
+    logger.info(f"Derivatives generated for {model_label} {pk}.")
+
+
+@shared_task
+def generate_image_placeholder(model_label: str, pk: int, field_name: str = 'image') -> None:
+    """
+    Computes the inline preview and dominant color of an image and records them on the model.
+
+    Args:
+        model_label (str): The ``app_label.ModelName`` of the model owning the image.
+        pk (int): Primary key of the instance.
+        field_name (str): Name of the image field. Defaults to ``image``.
+
+    Returns:
+        None
+    """
+    from django.apps import apps
+
+    from .page_cache import bump_content_version
+    from .placeholders import build_placeholder, needs_placeholder
+    from .snapshots import invalidate_model
+
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None or not needs_placeholder(instance, field_name):
+        return
+
+    try:
+        placeholder = build_placeholder(getattr(instance, field_name))
+    except Exception as e:
+        logger.error(f"Error while computing the placeholder of {model_label} {pk}: {e}")
+        return
+
+    model.objects.filter(pk=pk).update(placeholder=placeholder)
+    invalidate_model(model)
+    bump_content_version()
+    logger.info(f"Placeholder computed for {model_label} {pk}.")
@@ -0,0 +1,50 @@
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html_join
+from django.utils.safestring import SafeString
+
+from portfolio.bundles import bundle_paths
+
+register = template.Library()
+
+
+@register.simple_tag
+def bundle_css(name: str) -> SafeString:
+    """
+    Renders the ``<link>`` of a stylesheet bundle.
+
+    Usage::
+
+        {% load bundles %}
+        {% bundle_css 'site.css' %}
+
+    Args:
+        name (str): The bundle name, a key of ``STATIC_BUNDLES``.
+
+    Returns:
+        SafeString: One tag for the built bundle, or one per source file if it was not built.
+    """
+    return format_html_join(
+        '\n', '<link rel="stylesheet" href="{}">', ((static(path),) for path in bundle_paths(name))
+    )
+
+
+@register.simple_tag
+def bundle_js(name: str) -> SafeString:
+    """
+    Renders the ``<script>`` of a script bundle.
+
+    Usage::
+
+        {% load bundles %}
+        {% bundle_js 'site.js' %}
+
+    Args:
+        name (str): The bundle name, a key of ``STATIC_BUNDLES``.
+
+    Returns:
+        SafeString: One tag for the built bundle, or one per source file if it was not built.
+    """
+    return format_html_join(
+        '\n', '<script src="{}"></script>', ((static(path),) for path in bundle_paths(name))
+    )
@@ -0,0 +1,138 @@
+from typing import Any, Dict, Optional, Tuple
+
+from django import template
+from django.utils.html import format_html
+from django.utils.safestring import SafeString
+
+from portfolio import derivatives as image_derivatives
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(src: str,
+                     derivatives: Optional[Dict[str, Any]],
+                     sizes: str = '100vw',
+                     alt: str = '',
+                     css_class: str = '',
+                     loading: str = 'lazy',
+                     placeholder: Optional[Dict[str, Any]] = None,
+                     width: Optional[int] = None,
+                     height: Optional[int] = None) -> SafeString:
+    """
+    Renders a ``<picture>`` element with WebP and JPEG ``srcset`` candidates.
+
+    With a placeholder the ``<img>`` shows the inline preview over the dominant
+    color until the image has loaded. With the stored dimensions the browser
+    reserves the space of the image before it arrives.
+
+    Usage::
+
+        {% load images %}
+        {% responsive_image photo.image.url photo.derivatives sizes="(min-width: 992px) 25vw, 100vw" width=photo.width height=photo.height %}
+
+    Args:
+        src (str): URL of the original image, used as the fallback ``src``.
+        derivatives (Optional[Dict[str, Any]]): The ``derivatives`` mapping of the model.
+        sizes (str): Value of the ``sizes`` attribute.
+        alt (str): Alternative text of the image.
+        css_class (str): CSS classes added to the ``<img>`` element.
+        loading (str): Value of the ``loading`` attribute (``lazy`` or ``eager``).
+        placeholder (Optional[Dict[str, Any]]): The ``placeholder`` mapping of the model.
+        width (Optional[int]): The stored width of the image.
+        height (Optional[int]): The stored height of the image.
+
+    Returns:
+        SafeString: The rendered HTML.
+    """
+    style = placeholder_style(placeholder)
+    extra = format_html(' style="{}"', style) if style else ''
+    if width and height:
+        extra = format_html('{} width="{}" height="{}"', extra, width, height)
+    webp = image_derivatives.srcset(derivatives, 'webp')
+    jpeg = image_derivatives.srcset(derivatives, 'jpeg')
+    if not jpeg:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="{}" decoding="async"{}>',
+            src, alt, css_class, loading, extra,
+        )
+
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" loading="{}" decoding="async"{}>'
+        '</picture>',
+        webp, sizes,
+        image_derivatives.derivative_url(derivatives, 960) or src, jpeg, sizes, alt, css_class, loading, extra,
+    )
+
+
+@register.simple_tag
+def derivative_url(derivatives: Optional[Dict[str, Any]],
+                   width: int,
+                   fmt: str = 'jpeg',
+                   fallback: str = '') -> str:
+    """
+    Returns the URL of the smallest derivative at least ``width`` pixels wide.
+
+    Usage::
+
+        {% derivative_url image.derivatives 1920 fallback=image.image.url %}
+    """
+    return image_derivatives.derivative_url(derivatives, int(width), fmt) or fallback
+
+
+@register.simple_tag
+def background_image(derivatives: Optional[Dict[str, Any]],
+                     width: int,
+                     fallback: str = '',
+                     placeholder: Optional[Dict[str, Any]] = None) -> SafeString:
+    """
+    Renders ``background-image`` declarations for an inline ``style`` attribute.
+
+    Browsers supporting ``image-set()`` pick the WebP derivative, the others
+    keep the preceding JPEG declaration. With a placeholder, its preview is
+    layered under the image and shows until the image has loaded.
+
+    Usage::
+
+        <div style="{% background_image image.derivatives 1920 fallback=image.image.url placeholder=image.placeholder %}">
+    """
+    color, preview = _placeholder_parts(placeholder)
+    under = format_html(', url({})', preview) if preview else ''
+    jpeg = image_derivatives.derivative_url(derivatives, int(width), 'jpeg') or fallback
+    webp = image_derivatives.derivative_url(derivatives, int(width), 'webp')
+    if not webp:
+        declarations = format_html('background-image: url({}){};', jpeg, under)
+    else:
+        declarations = format_html(
+            'background-image: url({0}){2}; '
+            'background-image: image-set(url({1}) type("image/webp"), url({0}) type("image/jpeg")){2};',
+            jpeg, webp, under,
+        )
+    if color:
+        return format_html('background-color: {}; {}', color, declarations)
+    return declarations
+
+
+@register.simple_tag
+def placeholder_style(placeholder: Optional[Dict[str, Any]]) -> SafeString:
+    """
+    Renders the dominant color and the preview of an image as inline ``style`` declarations,
+    for elements whose real image is loaded later.
+
+    Usage::
+
+        <div style="{% placeholder_style image.placeholder %}">
+    """
+    color, preview = _placeholder_parts(placeholder)
+    if not preview:
+        return format_html('background-color: {};', color) if color else ''
+    return format_html(
+        'background-color: {}; background-image: url({}); background-size: cover;', color, preview
+    )
+
+
+def _placeholder_parts(placeholder: Optional[Dict[str, Any]]) -> Tuple[str, str]:
+    placeholder = placeholder or {}
+    return placeholder.get('color', ''), placeholder.get('preview', '')
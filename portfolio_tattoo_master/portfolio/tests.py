@@ -1,12 +1,59 @@
+import gzip
+import json
+import os
+import random
+import re
+import shutil
+import smtplib
+import tempfile
+import zipfile
+from io import BytesIO, StringIO
+from pathlib import Path
 from typing import List, Any, Tuple
 from unittest.mock import patch
 
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from captcha.models import CaptchaStore
+from django.contrib import admin as django_admin
+from django.contrib.admin.models import LogEntry
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core import mail
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connection, transaction
+from django.http import HttpRequest
 from django.http.response import HttpResponse
-from django.test import TestCase
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django.urls import reverse
 from django.utils.translation import get_language
 from django.utils.translation import activate
-from portfolio.models import MainImage
+from PIL import Image
+
+from portfolio import bundles, snapshots
+from portfolio.archive_import import import_archive
+from portfolio.db_router import PIN_COOKIE, REPLICA_PIN_SECONDS, ReadYourWritesMiddleware, ReplicaRouter, use_replica
+from portfolio.derivatives import derivative_name, iter_derivative_names
+from portfolio.duplicates import duplicate_clusters, find_near_duplicates
+from portfolio.gallery import get_first_gallery_page, get_gallery_index, get_tag, photos_for_tag
+from portfolio.captcha_pool import available, fill_pool, lease_captcha, remove_expired
+from portfolio.mail import (
+    MAIL_MAX_ATTEMPTS, RELAY_LEASE, MailThrottled, deliver_notifications, relay_notifications,
+)
+from portfolio.middleware import PrecompressedBundleMiddleware
+from portfolio.ratelimit import blocked_clients, hit, stats
+from portfolio.models import MAX_MAIN_IMAGES, Feedback, InstagramTile, MainImage, Notification, PortfolioImage, Tag
+from portfolio.page_cache import RECENT_CHANGE_KEY, cache_page_shell, page_cache_key
+from portfolio.perceptual_hash import BKTree, hamming_distance
+from portfolio.snapshots import get_snapshot, invalidate_snapshot
+from portfolio.task import generate_image_derivatives, generate_image_placeholder
+from portfolio.two_tier_cache import STAT_FIELDS, InvalidationBus, LocalTier
+from portfolio.utils import get_images, get_portfolio_images
 
 
 class BaseViewTest(TestCase):
@@ -55,6 +102,7 @@ class ImageTest(BaseViewTest):
         """
             Set up the test environment by creating test images.
         """
+        cache.clear()
         self.image = MainImage.objects.create(image='image.jpg', text="Nice photo",
                                               author="John Doe")
         self.image2 = MainImage.objects.create(image='image.jpg', text="Great shot!",
@@ -123,6 +171,7 @@ class AboutMeViewTests(ImageTest):
         Args:
             mock_get_images (MagicMock): Mocked version of get_images function.
         """
+        cache.clear()
         with patch('portfolio.views.get_images', return_value=[]):
             response = self.client.get(self.url)
 
@@ -138,6 +187,1405 @@ class PortfolioViewTests(ImageTest):
         self.context_tag = 'tags'
         self.response = self.client.get(self.url)
 
+    def add_photos(self, count: int, *tags: Tag) -> List[PortfolioImage]:
+        """
+        Creates tagged portfolio photos and drops the cached gallery index.
+        """
+        photos = [PortfolioImage.objects.create(image=f'portfolio/{i}.jpg') for i in range(count)]
+        for photo in photos:
+            photo.tags.add(*tags)
+        cache.clear()
+        return photos
+
+    def count_render_queries(self) -> int:
+        """
+        Renders the portfolio page with a cold cache and returns the number of queries.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_template_response_ok(self):
+        self.assert_template_response_ok(self.response, self.template_path)
+
+    def test_query_count_does_not_grow_with_gallery(self) -> None:
+        tags = [Tag.objects.create(name='Fine Line'), Tag.objects.create(name='Blackwork')]
+        self.add_photos(2, *tags)
+        small = self.count_render_queries()
+
+        self.add_photos(10, *tags)
+        self.assertEqual(self.count_render_queries(), small)
+
+    def test_gallery_index_maps_tags_to_photos(self) -> None:
+        fine_line = Tag.objects.create(name='Fine Line')
+        Tag.objects.create(name='Blackwork')
+        tagged, untagged = self.add_photos(2)
+        tagged.tags.add(fine_line)
+        cache.clear()
+
+        index = get_gallery_index()
+
+        self.assertEqual(
+            [(tag['slug'], tag['photo_ids']) for tag in index['tags']],
+            [('blackwork', []), ('fine-line', [tagged.pk])],
+        )
+        self.assertEqual([photo['tag_slugs'] for photo in index['photos']], [[], ['fine-line']])
+        self.assertEqual([photo['id'] for photo in photos_for_tag('fine-line', index)], [tagged.pk])
+
+    def test_every_tag_gets_a_distinct_slug(self) -> None:
+        roses = Tag.objects.create(name='Roses')
+        lettering = Tag.objects.create(name='Леттеринг')
+        symbols = Tag.objects.create(name='★★★')
+        fine_line = Tag.objects.create(name='Fine Line')
+        fine_line_again = Tag.objects.create(name='Fine-Line')
+        tagged, = self.add_photos(1, lettering)
+
+        slugs = {tag['id']: tag['slug'] for tag in get_gallery_index()['tags']}
+
+        self.assertEqual(slugs, {
+            roses.pk: 'roses',
+            lettering.pk: 'леттеринг',
+            symbols.pk: f'tag-{symbols.pk}',
+            fine_line.pk: 'fine-line',
+            fine_line_again.pk: f'fine-line-{fine_line_again.pk}',
+        })
+        self.assertEqual(get_tag(f'fine-line-{fine_line_again.pk}')['id'], fine_line_again.pk)
+        ids = self.fetch_all_pages(tag='леттеринг')
+        self.assertEqual(ids, [tagged.pk])
+
+    def fetch_all_pages(self, **params: Any) -> List[int]:
+        """
+        Walks the gallery API page by page and returns the ids in the order received.
+        """
+        ids: List[int] = []
+        cursor = ''
+        while True:
+            response = self.client.get(reverse('gallery_api'), {'cursor': cursor, **params})
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            ids.extend(photo['id'] for photo in data['results'])
+            cursor = data['next_cursor']
+            if not cursor:
+                return ids
+
+    def test_gallery_api_walks_all_photos_newest_first(self) -> None:
+        photos = self.add_photos(5)
+        PortfolioImage.objects.filter(pk__in=[photos[1].pk, photos[2].pk]).update(
+            uploaded_at=photos[1].uploaded_at
+        )
+
+        ids = self.fetch_all_pages(limit=2)
+
+        self.assertEqual(ids, list(
+            PortfolioImage.objects.order_by('-uploaded_at', '-id').values_list('id', flat=True)
+        ))
+
+    def test_gallery_api_filters_by_tag(self) -> None:
+        fine_line = Tag.objects.create(name='Fine Line')
+        tagged = self.add_photos(3, fine_line)
+        self.add_photos(2)
+
+        ids = self.fetch_all_pages(tag='fine-line', limit=2)
+
+        self.assertEqual(sorted(ids), sorted(photo.pk for photo in tagged))
+
+    def test_gallery_api_rejects_invalid_cursor(self) -> None:
+        response = self.client.get(reverse('gallery_api'), {'cursor': 'not-a-cursor'})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_first_page_matches_api_order(self) -> None:
+        self.add_photos(3)
+        api = self.client.get(reverse('gallery_api'), {'limit': 2}).json()
+
+        first_page = get_first_gallery_page(limit=2)
+
+        self.assertEqual([photo['id'] for photo in first_page['photos']], [photo['id'] for photo in api['results']])
+        self.assertEqual(first_page['next_cursor'], api['next_cursor'])
+
+    def test_each_photo_is_rendered_once(self) -> None:
+        photo, = self.add_photos(1, Tag.objects.create(name='Fine Line'), Tag.objects.create(name='Blackwork'))
+        response = self.client.get(self.url)
+
+        self.assertContains(response, 'column_single_gallery_item blackwork fine-line', count=1)
+
+def make_jpeg(name: str = 'photo.jpg', size: Tuple[int, int] = (1000, 750)) -> SimpleUploadedFile:
+    """
+    Builds an in-memory JPEG upload of the given size.
+    """
+    buffer = BytesIO()
+    Image.new('RGB', size, color=(120, 20, 20)).save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class DerivativesTests(TestCase):
+    """
+    Tests for the responsive image derivative pipeline.
+    """
+
+    def setUp(self) -> None:
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.photo = PortfolioImage.objects.create(image=make_jpeg())
+
+    def tearDown(self) -> None:
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_task_records_derivatives_without_upscaling(self) -> None:
+        generate_image_derivatives('portfolio.PortfolioImage', self.photo.pk)
+        self.photo.refresh_from_db()
+
+        derivatives = self.photo.derivatives
+        self.assertEqual(derivatives['source'], self.photo.image.name)
+        self.assertEqual(sorted(derivatives['webp'], key=int), ['480', '960', '1000'])
+        self.assertEqual(sorted(derivatives['jpeg'], key=int), ['480', '960', '1000'])
+        for name in derivatives['webp'].values():
+            self.assertTrue(self.photo.image.storage.exists(name))
+
+    def test_sources_sharing_a_stem_keep_their_own_derivatives(self) -> None:
+        jpeg = PortfolioImage.objects.create(image=make_jpeg('ink.jpg'))
+        png = PortfolioImage.objects.create(image=make_jpeg('ink.png'))
+        generate_image_derivatives('portfolio.PortfolioImage', jpeg.pk)
+        generate_image_derivatives('portfolio.PortfolioImage', png.pk)
+        jpeg.refresh_from_db()
+        png.refresh_from_db()
+
+        jpeg_names = set(iter_derivative_names(jpeg.derivatives))
+        png_names = set(iter_derivative_names(png.derivatives))
+        self.assertFalse(jpeg_names & png_names)
+        for name in jpeg_names | png_names:
+            self.assertTrue(default_storage.exists(name))
+
+    def test_rebuild_keeps_the_files_it_just_wrote(self) -> None:
+        name = derivative_name(self.photo.image.name, 480, 'webp')
+        PortfolioImage.objects.filter(pk=self.photo.pk).update(
+            derivatives={'source': 'portfolio/previous.jpg', 'webp': {'480': name}}
+        )
+
+        generate_image_derivatives('portfolio.PortfolioImage', self.photo.pk)
+        self.photo.refresh_from_db()
+
+        self.assertEqual(self.photo.derivatives['webp']['480'], name)
+        self.assertTrue(default_storage.exists(name))
+
+    def test_responsive_image_tag_renders_srcset(self) -> None:
+        generate_image_derivatives('portfolio.PortfolioImage', self.photo.pk)
+        self.photo.refresh_from_db()
+
+        html = Template(
+            '{% load images %}{% responsive_image photo.image.url photo.derivatives sizes="50vw" %}'
+        ).render(Context({'photo': self.photo}))
+
+        self.assertIn('<source type="image/webp"', html)
+        self.assertIn('-480.webp 480w', html)
+        self.assertIn('-960.jpg 960w', html)
+        self.assertIn('sizes="50vw"', html)
+
+    def test_responsive_image_tag_falls_back_to_original(self) -> None:
+        html = Template(
+            '{% load images %}{% responsive_image photo.image.url photo.derivatives %}'
+        ).render(Context({'photo': self.photo}))
+
+        self.assertIn(f'src="{self.photo.image.url}"', html)
+        self.assertNotIn('<picture>', html)
+
+
+class BundleTests(TestCase):
+    """
+    Tests for the static asset bundles, their template tags and the middleware serving them.
+    """
+
+    def setUp(self) -> None:
+        self.root = Path(tempfile.mkdtemp())
+        self.root_patch = patch.object(bundles, 'STATIC_BUNDLE_ROOT', self.root)
+        self.root_patch.start()
+
+    def tearDown(self) -> None:
+        self.root_patch.stop()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_css_bundle_inlines_imports_and_rebases_urls(self) -> None:
+        manifest = bundles.build_bundles()
+
+        self.assertRegex(manifest['site.css'], r'^bundles/site\.[0-9a-f]{12}\.css$')
+        css = (self.root / manifest['site.css'].split('/')[1]).read_text()
+        self.assertTrue(css.startswith("@import url('https://fonts.googleapis.com"))
+        self.assertNotIn("@import '../css", css)
+        self.assertIn("url('../fonts/fontawesome-webfont.woff2?v=4.7.0')", css)
+        self.assertNotIn('/*', css)
+
+    def test_tags_fall_back_to_sources_until_built(self) -> None:
+        template = Template("{% load bundles %}{% bundle_css 'site.css' %}{% bundle_js 'site.js' %}")
+        html = template.render(Context())
+        self.assertIn('href="/static/css/core-style.css"', html)
+        self.assertIn('src="/static/js/active.js"', html)
+
+        manifest = bundles.build_bundles()
+        html = template.render(Context())
+        self.assertEqual(html.count('<script'), 1)
+        self.assertIn(f'href="/static/{manifest["site.css"]}"', html)
+
+    def test_middleware_serves_precompressed_bundle(self) -> None:
+        path = bundles.build_bundles()['site.js']
+
+        response = self.client.get(f'/static/{path}', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertIn(b'jQuery', gzip.decompress(b''.join(response.streaming_content)))
+
+        response = self.client.get(f'/static/{path}', HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(self.client.get('/static/bundles/manifest.json').status_code, 404)
+
+    async def test_middleware_serves_bundles_to_async_requests(self) -> None:
+        path = (await sync_to_async(bundles.build_bundles)())['site.css']
+
+        response = await self.async_client.get(f'/static/{path}', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', response['Cache-Control'])
+
+        async def get_response(request: HttpRequest) -> HttpResponse:
+            return HttpResponse()
+
+        self.assertTrue(iscoroutinefunction(PrecompressedBundleMiddleware(get_response)))
+
+    def test_manifest_written_by_another_process_is_picked_up(self) -> None:
+        manifest = bundles.build_bundles()
+        self.assertEqual(bundles.bundle_paths('site.css'), [manifest['site.css']])
+
+        # Another worker's build: this process never calls build_bundles.
+        rebuilt = dict(manifest, **{'site.css': 'bundles/site.0123456789ab.css'})
+        (self.root / 'manifest.json.new').write_text(json.dumps(rebuilt))
+        os.replace(self.root / 'manifest.json.new', self.root / 'manifest.json')
+
+        self.assertEqual(bundles.bundle_paths('site.css'), ['bundles/site.0123456789ab.css'])
+
+
+class InstagramCarouselTests(TestCase):
+    """
+    Tests for the model-backed Instagram feed carousel.
+    """
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_carousel_renders_visible_tiles_lazily(self) -> None:
+        InstagramTile.objects.create(image='instagram/b.jpg', position=2, alt="Second")
+        InstagramTile.objects.create(image='instagram/a.jpg', position=1, alt="First")
+        InstagramTile.objects.create(image='instagram/hidden.jpg', is_visible=False)
+
+        html = self.client.get(reverse('about')).content.decode()
+        self.assertIn('class="owl-lazy" data-src="/media/instagram/a.jpg"', html)
+        self.assertLess(html.index('instagram/a.jpg'), html.index('instagram/b.jpg'))
+        self.assertNotIn('instagram/hidden.jpg', html)
+
+    def test_carousel_uses_thumbnails_and_follows_changes(self) -> None:
+        derivatives = {'source': 'instagram/a.jpg', 'jpeg': {'480': 'derivatives/instagram/a-480.jpg',
+                                                              '960': 'derivatives/instagram/a-960.jpg'}}
+        with self.captureOnCommitCallbacks(execute=True):
+            InstagramTile.objects.create(image='instagram/a.jpg', derivatives=derivatives)
+        self.client.get(reverse('about'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            InstagramTile.objects.create(image='instagram/b.jpg', derivatives={'source': 'instagram/b.jpg'})
+
+        html = self.client.get(reverse('about')).content.decode()
+        self.assertIn('data-src="/media/derivatives/instagram/a-480.jpg"', html)
+        self.assertIn('data-src-retina="/media/derivatives/instagram/a-960.jpg"', html)
+        self.assertIn('data-src="/media/instagram/b.jpg"', html)
+
+
+class PlaceholderTests(TestCase):
+    """
+    Tests for the inline image placeholders and their backfill.
+    """
+
+    def setUp(self) -> None:
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.photo = PortfolioImage.objects.create(image=make_jpeg())
+
+    def tearDown(self) -> None:
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_task_records_preview_and_dominant_color(self) -> None:
+        generate_image_placeholder('portfolio.PortfolioImage', self.photo.pk)
+        self.photo.refresh_from_db()
+
+        placeholder = self.photo.placeholder
+        self.assertEqual(placeholder['source'], self.photo.image.name)
+        self.assertTrue(placeholder['preview'].startswith('data:image/webp;base64,'))
+        red, green, blue = (int(placeholder['color'][i:i + 2], 16) for i in (1, 3, 5))
+        self.assertTrue(abs(red - 120) < 10 and green < 30 and blue < 30)
+
+    def test_tags_render_placeholder(self) -> None:
+        placeholder = {'source': 'a.jpg', 'preview': 'data:image/webp;base64,AAAA', 'color': '#781414'}
+        html = Template(
+            '{% load images %}{% responsive_image "/a.jpg" None placeholder=placeholder %}'
+            '<div style="{% background_image None 1920 fallback="/a.jpg" placeholder=placeholder %}">'
+        ).render(Context({'placeholder': placeholder}))
+
+        self.assertIn('style="background-color: #781414; background-image: url(data:image/webp;base64,AAAA)', html)
+        self.assertIn('background-image: url(/a.jpg), url(data:image/webp;base64,AAAA);', html)
+
+    def test_command_backfills_placeholders(self) -> None:
+        MainImage.objects.create(image=make_jpeg('main.jpg'))
+        call_command('generate_placeholders', workers=2, stdout=StringIO())
+
+        self.photo.refresh_from_db()
+        self.assertEqual(self.photo.placeholder['source'], self.photo.image.name)
+        self.assertTrue(MainImage.objects.get().placeholder['preview'])
+
+
+class ImageMetadataTests(TestCase):
+    """
+    Tests for the stored image dimensions, size and format.
+    """
+
+    def setUp(self) -> None:
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+    def tearDown(self) -> None:
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_upload_records_metadata(self) -> None:
+        photo = PortfolioImage.objects.create(image=make_jpeg(size=(640, 480)))
+        photo.refresh_from_db()
+
+        self.assertEqual((photo.width, photo.height, photo.image_format), (640, 480, 'JPEG'))
+        self.assertEqual(photo.file_size, photo.image.size)
+
+    def test_command_backfills_missing_metadata(self) -> None:
+        photo = PortfolioImage.objects.create(image=make_jpeg(size=(300, 200)))
+        PortfolioImage.objects.update(width=None, height=None, file_size=None, image_format='')
+
+        call_command('backfill_image_metadata', workers=2, stdout=StringIO())
+        photo.refresh_from_db()
+        self.assertEqual((photo.width, photo.height, photo.image_format), (300, 200, 'JPEG'))
+
+    def test_gallery_renders_dimensions(self) -> None:
+        PortfolioImage.objects.create(image=make_jpeg(size=(300, 200)))
+        html = self.client.get(reverse('portfolio')).content.decode()
+        self.assertIn('width="300" height="200"', html)
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    """
+    Tests for the routing of read-only views to the replica.
+    """
+
+    def setUp(self) -> None:
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+        self.replica = patch('portfolio.db_router.replica_configured', return_value=True)
+        self.replica.start()
+
+    def tearDown(self) -> None:
+        self.replica.stop()
+
+    def route(self, request: Any) -> Tuple[str, HttpResponse]:
+        aliases = []
+
+        @use_replica
+        def view(request: Any) -> HttpResponse:
+            aliases.append(self.router.db_for_read(Tag))
+            return HttpResponse()
+
+        response = ReadYourWritesMiddleware(view)(request)
+        return aliases[0], response
+
+    def test_reads_of_marked_views_go_to_replica(self) -> None:
+        alias, _ = self.route(self.factory.get('/'))
+        self.assertEqual(alias, 'replica')
+        self.assertEqual(self.router.db_for_read(Tag), 'default')
+
+    def test_unsafe_methods_and_pinned_visitors_read_from_primary(self) -> None:
+        self.assertEqual(self.route(self.factory.post('/'))[0], 'default')
+
+        request = self.factory.get('/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        self.assertEqual(self.route(request)[0], 'default')
+
+    def test_write_pins_visitor_to_primary(self) -> None:
+        def view(request: Any) -> HttpResponse:
+            self.assertEqual(self.router.db_for_write(Tag), 'default')
+            return HttpResponse()
+
+        response = ReadYourWritesMiddleware(view)(self.factory.post('/'))
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], REPLICA_PIN_SECONDS)
+        self.assertNotIn(PIN_COOKIE, self.route(self.factory.get('/'))[1].cookies)
+
+    def test_snapshots_are_rebuilt_from_the_primary(self) -> None:
+        cache.clear()
+        aliases = []
+
+        def build() -> list:
+            aliases.append(self.router.db_for_read(Tag))
+            return []
+
+        @use_replica
+        def view(request: Any) -> HttpResponse:
+            get_snapshot('routing_test')
+            aliases.append(self.router.db_for_read(Tag))
+            return HttpResponse()
+
+        with patch.dict(snapshots._builders, {'routing_test': build}):
+            ReadYourWritesMiddleware(view)(self.factory.get('/'))
+
+        self.assertEqual(aliases, ['default', 'replica'])
+
+    def test_replica_render_right_after_a_change_is_not_cached(self) -> None:
+        cache.clear()
+        renders = []
+
+        @use_replica
+        @cache_page_shell()
+        def view(request: Any) -> HttpResponse:
+            renders.append(self.router.db_for_read(Tag))
+            return HttpResponse('page')
+
+        cache.set(RECENT_CHANGE_KEY, True)
+        for _ in range(2):
+            ReadYourWritesMiddleware(view)(self.factory.get('/replica-page/'))
+        self.assertEqual(len(renders), 2)
+
+        cache.delete(RECENT_CHANGE_KEY)
+        for _ in range(2):
+            ReadYourWritesMiddleware(view)(self.factory.get('/replica-page/'))
+        self.assertEqual(len(renders), 3)
+
+    async def test_async_stack_routes_and_pins(self) -> None:
+        aliases = []
+
+        @use_replica
+        async def read(request: Any) -> HttpResponse:
+            aliases.append(await sync_to_async(self.router.db_for_read)(Tag))
+            return HttpResponse()
+
+        async def write(request: Any) -> HttpResponse:
+            await sync_to_async(self.router.db_for_write)(Tag)
+            return HttpResponse()
+
+        middleware = ReadYourWritesMiddleware(read)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(self.factory.get('/'))
+        self.assertEqual(aliases, ['replica'])
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+        response = await ReadYourWritesMiddleware(write)(self.factory.post('/'))
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], REPLICA_PIN_SECONDS)
+
+
+class DuplicateDetectionTests(TestCase):
+    """
+    Tests for the perceptual hashes and the near-duplicate lookups.
+    """
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+    def tearDown(self) -> None:
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    @staticmethod
+    def photo(seed: int, size: Tuple[int, int] = (800, 600), quality: int = 90) -> SimpleUploadedFile:
+        """
+        Builds a JPEG of random blocks: the same seed gives the same picture at any size.
+        """
+        rng = random.Random(seed)
+        image = Image.new('L', (16, 12))
+        image.putdata([rng.randrange(256) for _ in range(16 * 12)])
+        buffer = BytesIO()
+        image.resize(size, Image.BILINEAR).convert('RGB').save(buffer, 'JPEG', quality=quality)
+        return SimpleUploadedFile(f'photo-{seed}.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def test_re_export_is_found_and_other_photos_are_not(self) -> None:
+        original = PortfolioImage.objects.create(image=self.photo(1))
+        other = MainImage.objects.create(image=self.photo(2))
+        export = PortfolioImage.objects.create(image=self.photo(1, size=(1200, 900), quality=60))
+
+        self.assertEqual(len(export.perceptual_hash), 16)
+        self.assertEqual([ref for _, ref in find_near_duplicates(export)], [('portfolio.PortfolioImage', original.pk)])
+        self.assertEqual(find_near_duplicates(other), [])
+
+    def test_new_images_are_filed_without_rebuilding_the_tree(self) -> None:
+        original = PortfolioImage.objects.create(image=self.photo(5))
+        self.assertEqual(find_near_duplicates(original), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            export = MainImage.objects.create(image=self.photo(5, size=(640, 480)))
+            original.save()
+        with self.assertNumQueries(0):
+            self.assertEqual([ref for _, ref in find_near_duplicates(original)], [('portfolio.MainImage', export.pk)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            export.delete()
+        self.assertEqual(find_near_duplicates(original), [])
+
+    def test_swapping_main_images_refiles_their_hashes(self) -> None:
+        first = MainImage.objects.create(image=self.photo(7))
+        second = MainImage.objects.create(image=self.photo(8))
+        export = PortfolioImage.objects.create(image=self.photo(7, size=(640, 480)))
+        self.assertEqual([ref for _, ref in find_near_duplicates(export)], [('portfolio.MainImage', first.pk)])
+
+        model_admin = django_admin.site._registry[MainImage]
+        with self.captureOnCommitCallbacks(execute=True), patch.object(model_admin, 'message_user'):
+            model_admin.swap_image(RequestFactory().post('/'), MainImage.objects.filter(pk__in=[first.pk, second.pk]))
+
+        self.assertEqual([ref for _, ref in find_near_duplicates(export)], [('portfolio.MainImage', second.pk)])
+
+    def test_rolled_back_save_leaves_no_entry(self) -> None:
+        original = PortfolioImage.objects.create(image=self.photo(6))
+        self.assertEqual(find_near_duplicates(original), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                PortfolioImage.objects.create(image=self.photo(6, size=(640, 480)))
+                raise RuntimeError("Rolled back")
+        self.assertEqual(find_near_duplicates(original), [])
+
+    def test_bk_tree_matches_a_linear_scan(self) -> None:
+        rng = random.Random(7)
+        hashes = [rng.getrandbits(64) for _ in range(500)]
+        tree = BKTree()
+        for index, value in enumerate(hashes):
+            tree.add(value, index)
+
+        query = hashes[42] ^ 0b1011
+        expected = sorted(index for index, value in enumerate(hashes) if hamming_distance(query, value) <= 20)
+        self.assertEqual(sorted(index for _, index in tree.search(query, 20)), expected)
+        self.assertEqual(tree.search(query, 3), [(3, 42)])
+
+    def test_command_hashes_missing_images_and_reports_clusters(self) -> None:
+        first = PortfolioImage.objects.create(image=self.photo(3))
+        second = MainImage.objects.create(image=self.photo(3, size=(640, 480)))
+        PortfolioImage.objects.create(image=self.photo(4))
+        PortfolioImage.objects.update(perceptual_hash='')
+
+        out = StringIO()
+        call_command('find_duplicate_images', workers=2, stdout=out)
+
+        self.assertEqual(duplicate_clusters(), [[('portfolio.MainImage', second.pk), ('portfolio.PortfolioImage', first.pk)]])
+        self.assertIn("1 clusters of near-duplicate images found.", out.getvalue())
+
+
+class ArchiveImportTests(TestCase):
+    """
+    Tests for the bulk import of portfolio photos from an archive.
+    """
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+    def tearDown(self) -> None:
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    @staticmethod
+    def archive(files: dict) -> BytesIO:
+        buffer = BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            for name, content in files.items():
+                archive.writestr(name, content)
+        buffer.seek(0)
+        return buffer
+
+    def test_folders_become_tags(self) -> None:
+        Tag.objects.create(name='Fine Line')
+        archive = self.archive({
+            'Fine Line/Roses/1.jpg': make_jpeg(size=(4000, 3000)).read(),
+            'Blackwork/2.jpg': make_jpeg().read(),
+            'Blackwork/notes.txt': b'not a photo',
+            'Blackwork/broken.jpg': b'not a jpeg',
+            '__MACOSX/Blackwork/._2.jpg': b'',
+        })
+
+        report = import_archive(archive, workers=1)
+
+        self.assertEqual(report['imported'], 2)
+        self.assertEqual([name for name, _ in report['failed']], ['Blackwork/broken.jpg'])
+        self.assertEqual(Tag.objects.count(), 3)
+        rose = PortfolioImage.objects.get(tags__name='Roses')
+        self.assertEqual(sorted(rose.tags.values_list('name', flat=True)), ['Fine Line', 'Roses'])
+        self.assertEqual((rose.width, rose.height, rose.image_format), (2560, 1920, 'JPEG'))
+        self.assertEqual(len(rose.perceptual_hash), 16)
+
+    def test_query_count_does_not_grow_with_the_archive(self) -> None:
+        def queries(count: int) -> int:
+            archive = self.archive({
+                f'Tag {count}-{index % 2}/{index}.jpg': make_jpeg(size=(60, 40)).read() for index in range(count)
+            })
+            with CaptureQueriesContext(connection) as context:
+                import_archive(archive, workers=1)
+            return len(context.captured_queries)
+
+        queries(1)
+        self.assertEqual(queries(3), queries(12))
+        self.assertEqual(PortfolioImage.objects.count(), 16)
+
+    def test_failed_insert_leaves_no_files_behind(self) -> None:
+        archive = self.archive({'Blackwork/1.jpg': make_jpeg().read(), '2.jpg': make_jpeg().read()})
+
+        with patch.object(PortfolioImage.objects, 'bulk_create', side_effect=DatabaseError('disk full')):
+            with self.assertRaises(DatabaseError):
+                import_archive(archive, workers=1)
+
+        self.assertFalse(PortfolioImage.objects.exists())
+        self.assertEqual([files for _, _, files in os.walk(self.media_root) if files], [])
+
+    def test_admin_import_page(self) -> None:
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        # A zipped folder: the folder itself is not a tag, and its manifest is found.
+        upload = SimpleUploadedFile('season.zip', self.archive({
+            'season/Dotwork/1.jpg': make_jpeg().read(),
+            'season/2.jpg': make_jpeg().read(),
+            'season/manifest.json': json.dumps({'2.jpg': ['Lettering']}),
+        }).read())
+
+        response = self.client.post(reverse('admin:portfolio_portfolioimage_import'), {'archive': upload})
+
+        self.assertRedirects(response, reverse('admin:portfolio_portfolioimage_changelist'))
+        self.assertEqual(
+            sorted(PortfolioImage.objects.values_list('tags__name', flat=True)), ['Dotwork', 'Lettering']
+        )
+        self.assertContains(self.client.get(response.url), 'Import archive')
+
+    def test_malformed_manifests_are_rejected(self) -> None:
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        url = reverse('admin:portfolio_portfolioimage_import')
+
+        for manifest, error in (('{"1.jpg": "Florals"}', 'must be a list'), ('{not json', 'not valid JSON'),
+                                (json.dumps({'1.jpg': ['x' * 101]}), 'limited to 100 characters')):
+            upload = SimpleUploadedFile('season.zip', self.archive({
+                '1.jpg': make_jpeg().read(), 'manifest.json': manifest,
+            }).read())
+            response = self.client.post(url, {'archive': upload})
+            self.assertContains(response, error)
+
+        self.assertFalse(PortfolioImage.objects.exists())
+        self.assertFalse(Tag.objects.exists())
+
+    def test_command_imports_a_directory_with_a_manifest(self) -> None:
+        source = Path(self.media_root) / 'season'
+        (source / 'misc').mkdir(parents=True)
+        (source / 'misc' / 'a.png').write_bytes(make_jpeg(size=(80, 60)).read())
+        (source / 'misc' / 'b.jpg').write_bytes(make_jpeg(size=(80, 60)).read())
+        (source / 'manifest.json').write_text(json.dumps({'misc/a.png': ['Ornamental', 'Color']}))
+
+        out = StringIO()
+        call_command('import_portfolio_archive', str(source), workers=2, stdout=out)
+
+        self.assertIn("Imported 2 photos, 0 failed.", out.getvalue())
+        self.assertEqual(
+            sorted(PortfolioImage.objects.filter(tags__isnull=False).values_list('tags__name', flat=True)),
+            ['Color', 'Ornamental', 'misc'],
+        )
+
+
+class TagAggregationTests(TestCase):
+    """
+    Tests for the tag names loaded with the portfolio images.
+    """
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.tags = [Tag.objects.create(name=name) for name in ('Roses', 'Fine Line', 'Blackwork')]
+
+    def create_photos(self, count: int) -> None:
+        for _ in range(count):
+            PortfolioImage.objects.create(image='portfolio/photo.jpg').tags.set(self.tags[:2])
+
+    def test_names_come_with_the_images(self) -> None:
+        self.create_photos(2)
+        PortfolioImage.objects.create(image='portfolio/untagged.jpg')
+
+        with self.assertNumQueries(1):
+            labels = [str(photo) for photo in PortfolioImage.objects.with_tag_names().order_by('pk')]
+
+        self.assertEqual([label.split(' (')[1] for label in labels], ['Fine Line, Roses)', 'Fine Line, Roses)', 'No tags)'])
+
+    def test_filtering_on_tags_does_not_narrow_the_names(self) -> None:
+        self.create_photos(1)
+        photo = PortfolioImage.objects.with_tag_names().filter(tags=self.tags[0]).get()
+        self.assertEqual(photo.tag_names(), ['Fine Line', 'Roses'])
+
+    def test_prefetched_tags_are_reused(self) -> None:
+        self.create_photos(2)
+        photos = list(PortfolioImage.objects.prefetch_related('tags'))
+
+        with self.assertNumQueries(0):
+            self.assertEqual([photo.tag_names() for photo in photos], [['Fine Line', 'Roses']] * 2)
+
+    def test_change_view_logs_the_saved_tags(self) -> None:
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        photo = PortfolioImage.objects.create(image='portfolio/photo.jpg')
+        photo.tags.set([self.tags[0]])
+
+        self.client.post(
+            reverse('admin:portfolio_portfolioimage_change', args=[photo.pk]),
+            {'tags': [self.tags[2].pk]},
+        )
+
+        self.assertEqual(LogEntry.objects.get().object_repr, f"Image {photo.pk} (Blackwork)")
+
+    def test_changelist_query_count_is_constant(self) -> None:
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        url = reverse('admin:portfolio_portfolioimage_changelist')
+
+        def queries() -> int:
+            with CaptureQueriesContext(connection) as context:
+                self.assertContains(self.client.get(url), 'Fine Line, Roses')
+            return len(context.captured_queries)
+
+        self.create_photos(2)
+        few = queries()
+        self.create_photos(20)
+        self.assertEqual(queries(), few)
+
+
+class SnapshotCacheTests(TestCase):
+    """
+    Tests for the materialized gallery snapshots and their signal-driven invalidation.
+    """
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.image = MainImage.objects.create(image='main_images/a.jpg', text="Nice photo", author="John Doe")
+
+    def test_snapshot_is_served_without_queries(self) -> None:
+        get_images()
+        with self.assertNumQueries(0):
+            images = get_images()
+
+        self.assertEqual(images[0]['text'], "Nice photo")
+        self.assertEqual(images[0]['url'], '/media/main_images/a.jpg')
+
+    def test_empty_gallery_is_cached(self) -> None:
+        self.assertEqual(get_portfolio_images(), [])
+        with self.assertNumQueries(0):
+            self.assertEqual(get_portfolio_images(), [])
+
+    def test_save_invalidates_snapshot(self) -> None:
+        get_images()
+        with self.captureOnCommitCallbacks(execute=True):
+            MainImage.objects.create(image='main_images/b.jpg', text="Great shot!", author="Jane Doe")
+
+        self.assertEqual([image['text'] for image in get_images()], ["Nice photo", "Great shot!"])
+
+    def test_tagging_invalidates_portfolio_snapshot(self) -> None:
+        photo = PortfolioImage.objects.create(image='portfolio/a.jpg')
+        self.assertEqual(get_portfolio_images()[0]['tags'], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            photo.tags.add(Tag.objects.create(name='Fine Line'))
+
+        self.assertEqual(get_portfolio_images()[0]['tags'], ['Fine Line'])
+
+    def test_stale_snapshot_is_served_during_rebuild(self) -> None:
+        get_images()
+        MainImage.objects.create(image='main_images/b.jpg')
+        invalidate_snapshot('main_images')
+        cache.set('snapshot:main_images:lock', 1)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(len(get_images()), 1)
+
+
+class TwoTierCacheTests(TestCase):
+    """
+    Tests for the in-process tier of the default cache and its invalidation.
+    """
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_local_hit_skips_shared_cache(self) -> None:
+        cache.set('snapshot:test', [1, 2])
+        with patch.object(caches['shared'], 'get') as shared_get:
+            self.assertEqual(cache.get('snapshot:test'), [1, 2])
+        shared_get.assert_not_called()
+
+    def test_write_by_another_process_is_read_after_invalidation(self) -> None:
+        cache.set('snapshot:test', 'old')
+        caches['shared'].set('snapshot:test', 'new')
+        self.assertEqual(cache.get('snapshot:test'), 'old')
+
+        bus = InvalidationBus('redis://localhost:6379/0', 'test', cache.local)
+        bus.handle(json.dumps({'sender': 'other', 'keys': [caches['shared'].make_key('snapshot:test')]}))
+        self.assertEqual(cache.get('snapshot:test'), 'new')
+
+    def test_own_invalidations_are_ignored(self) -> None:
+        cache.set('snapshot:test', 'value')
+        bus = InvalidationBus('redis://localhost:6379/0', 'test', cache.local)
+        bus.handle(json.dumps({'sender': bus.sender, 'keys': '*'}))
+        self.assertEqual(len(cache.local), 1)
+
+    def test_local_tier_is_bounded(self) -> None:
+        tier = LocalTier(max_entries=2)
+        for key in 'abc':
+            tier.set(key, key, timeout=5)
+        self.assertEqual(len(tier), 2)
+        self.assertEqual(tier.get('c'), 'c')
+
+    def test_stats_per_prefix(self) -> None:
+        cache.set('stats_a:key', 1)
+        caches['shared'].set('stats_b:key', 1)
+        cache.get('stats_a:key')
+        cache.get('stats_b:key')
+        cache.get('stats_b:key')
+        cache.get('stats_b:missing')
+
+        totals = cache.stats.totals(['stats_a', 'stats_b'], STAT_FIELDS)
+        self.assertEqual(totals['stats_a'], {'l1_hits': 1, 'l2_hits': 0, 'misses': 0})
+        self.assertEqual(totals['stats_b'], {'l1_hits': 1, 'l2_hits': 1, 'misses': 1})
+        self.assertLessEqual({'stats_a', 'stats_b'}, cache.stats.groups())
+
+
+class PageCacheTests(BaseViewTest):
+    """
+    Tests for the language-aware page shell cache.
+    """
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_information_page_is_served_from_cache(self) -> None:
+        url = reverse('information')
+        first = self.client.get(url)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+
+        self.assertTemplateNotUsed(second, 'portfolio/pages/information.html')
+        self.assertEqual(first.content, second.content)
+
+    def test_cache_is_keyed_by_language(self) -> None:
+        self.client.get(reverse('information'))
+        activate('de')
+        response = self.client.get(reverse('information'))
+        activate('en')
+
+        self.assert_template_response_ok(response, 'portfolio/pages/information.html')
+
+    def test_cached_shell_gets_fresh_csrf_token_and_captcha(self) -> None:
+        url = reverse('contact')
+        first = self.client.get(url)
+        second = self.client.get(url)
+
+        self.assertTemplateNotUsed(second, 'portfolio/pages/contact.html')
+        key_pattern = r'name="captcha_0" value="([0-9a-f]+)"'
+        first_key = re.search(key_pattern, first.content.decode()).group(1)
+        second_key = re.search(key_pattern, second.content.decode()).group(1)
+        self.assertNotEqual(first_key, second_key)
+        self.assertTrue(CaptchaStore.objects.filter(hashkey=second_key).exists())
+        self.assertContains(second, f'/captcha/image/{second_key}/')
+        self.assertNotContains(second, '__page_hole_')
+
+    def test_content_change_invalidates_pages(self) -> None:
+        url = reverse('about')
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            MainImage.objects.create(image='main_images/a.jpg', text="Nice photo", author="John Doe")
+
+        response = self.client.get(url)
+
+        self.assertTemplateUsed(response, 'portfolio/pages/about-me.html')
+        self.assertContains(response, "Nice photo")
+
+    def test_cache_key_ignores_query_parameters_the_page_does_not_read(self) -> None:
+        url = reverse('information')
+        self.client.get(url)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {'utm_source': 'instagram', 'fbclid': 'x1'})
+
+        self.assertTemplateNotUsed(response, 'portfolio/pages/information.html')
+        factory = RequestFactory()
+        params = ('tag', 'cursor')
+        key = page_cache_key(factory.get('/api/', {'tag': 'roses'}), 1, params)
+        self.assertEqual(page_cache_key(factory.get('/api/', {'utm_source': 'x', 'tag': 'roses'}), 1, params), key)
+        self.assertNotEqual(page_cache_key(factory.get('/api/', {'tag': 'lines'}), 1, params), key)
+
+    def test_cached_shell_keeps_the_response_headers(self) -> None:
+        calls = []
+
+        @cache_page_shell()
+        def view(request: HttpRequest) -> HttpResponse:
+            calls.append(request)
+            response = HttpResponse('page')
+            response['Vary'] = 'Cookie'
+            response['Content-Language'] = 'de'
+            return response
+
+        factory = RequestFactory()
+        view(factory.get('/page/'))
+        response = view(factory.get('/page/'))
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual((response['Vary'], response['Content-Language']), ('Cookie', 'de'))
+        self.assertEqual(response['Content-Type'], 'text/html; charset=utf-8')
+
+    def test_pending_messages_bypass_cache(self) -> None:
+        url = reverse('information')
+        self.client.get(url)
+        with patch('portfolio.page_cache.messages.get_messages', return_value=['Thank you']):
+            response = self.client.get(url)
+
+        self.assertTemplateUsed(response, 'portfolio/pages/information.html')
+
+
+class MainImagePositionTests(TestCase):
+    """
+    Tests for the explicit slider position of main page images.
+    """
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.images = [MainImage.objects.create(image=f'main_images/{i}.jpg', text=str(i)) for i in range(3)]
+
+    def test_new_images_are_appended(self) -> None:
+        self.assertEqual([image.position for image in self.images], [1, 2, 3])
+
+    def test_str_uses_annotation_without_queries(self) -> None:
+        images = list(MainImage.objects.with_display_position())
+
+        with self.assertNumQueries(0):
+            self.assertEqual([str(image) for image in images], ['1', '2', '3'])
+
+    def test_rank_does_not_depend_on_the_outer_filter(self) -> None:
+        self.images[0].delete()
+
+        third = MainImage.objects.with_display_position().get(pk=self.images[2].pk)
+
+        self.assertEqual((third.position, str(third)), (3, '2'))
+
+    def test_reorder_updates_positions_and_slider(self) -> None:
+        first, second, third = self.images
+        get_images()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                MainImage.objects.reorder([third.pk, first.pk, second.pk])
+
+        updates = [query for query in queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 2)
+
+        self.assertEqual([image['id'] for image in get_images()], [third.pk, first.pk, second.pk])
+
+    def test_slots_cap_the_number_of_images(self) -> None:
+        for i in range(MAX_MAIN_IMAGES - len(self.images)):
+            MainImage.objects.create(image=f'main_images/more-{i}.jpg')
+
+        with self.assertRaises(ValidationError):
+            MainImage.objects.create(image='main_images/one-too-many.jpg')
+        self.assertEqual(MainImage.objects.count(), MAX_MAIN_IMAGES)
+
+    def test_positions_outside_the_slots_are_rejected(self) -> None:
+        with self.assertRaises(ValidationError):
+            MainImage.objects.create(image='main_images/far.jpg', position=MAX_MAIN_IMAGES + 1)
+
+        image = self.images[0]
+        image.position = 0
+        with self.assertRaises(ValidationError):
+            image.save()
+        with self.assertRaises(ValidationError):
+            image.full_clean()
+        self.assertEqual(MainImage.objects.count(), 3)
+
+    def test_reorder_parks_past_every_position_in_use(self) -> None:
+        first, second, third = self.images
+        # Written around save(), e.g. by an older release.
+        MainImage.objects.filter(pk=third.pk).update(position=MAX_MAIN_IMAGES + 1)
+
+        MainImage.objects.reorder([second.pk, first.pk])
+
+        self.assertEqual(
+            list(MainImage.objects.values_list('pk', 'position')),
+            [(second.pk, 1), (first.pk, 2), (third.pk, MAX_MAIN_IMAGES + 1)],
+        )
+
+    def test_insert_losing_a_slot_race_retries(self) -> None:
+        taken = self.images[0].position
+        with patch.object(MainImage, 'free_slot', side_effect=[taken, 4]):
+            image = MainImage.objects.create(image='main_images/racer.jpg')
+
+        self.assertEqual(image.position, 4)
+
+    def test_deleted_slot_is_reused(self) -> None:
+        self.images[1].delete()
+
+        self.assertEqual(MainImage.objects.create(image='main_images/new.jpg').position, 4)
+        for i in range(MAX_MAIN_IMAGES - 4):
+            MainImage.objects.create(image=f'main_images/more-{i}.jpg')
+        self.assertEqual(MainImage.objects.create(image='main_images/gap.jpg').position, 2)
+
+    def test_update_runs_a_single_query(self) -> None:
+        image = self.images[0]
+        image.text = "Edited"
+
+        with self.assertNumQueries(1):
+            image.save(update_fields=['text'])
+
+    def test_admin_changelist_query_count_is_constant(self) -> None:
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(admin_user)
+        url = reverse('admin:portfolio_mainimage_changelist')
+
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(url)
+        for i in range(5):
+            MainImage.objects.create(image=f'main_images/more-{i}.jpg')
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(many), len(few))
+
+
+class AsyncViewTests(TestCase):
+    """
+    Tests for the async form views and captcha refresh.
+    """
+
+    def setUp(self) -> None:
+        cache.clear()
+        blocked_clients.clear()
+        self.url = reverse('contact')
+        self.data = {
+            'name': 'Anna',
+            'email': 'anna@example.com',
+            'message': 'A small rose',
+            'captcha_0': 'key',
+            'captcha_1': 'passed',
+        }
+
+    async def test_refresh_captcha_creates_a_key(self) -> None:
+        response = await self.async_client.get(reverse('refresh_captcha'))
+
+        data = response.json()
+        self.assertTrue(await CaptchaStore.objects.filter(hashkey=data['key']).aexists())
+        self.assertEqual(data['image_url'], f"/captcha/image/{data['key']}/")
+
+    @patch('captcha.conf.settings.CAPTCHA_TEST_MODE', True)
+    async def test_contact_form_is_saved_and_mail_queued(self) -> None:
+        response = await self.async_client.post(self.url, self.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(await Feedback.objects.filter(email='anna@example.com').aexists())
+        notification = await Notification.objects.aget()
+        self.assertEqual(notification.subject, 'I want a tattoo - Anna')
+
+    @patch('captcha.conf.settings.CAPTCHA_TEST_MODE', True)
+    async def test_contact_form_is_rate_limited(self) -> None:
+        for _ in range(3):
+            response = await self.async_client.post(self.url, self.data)
+
+        self.assertContains(response, 'You are sending requests too often')
+        self.assertEqual(await Feedback.objects.acount(), 2)
+
+    async def test_index_is_served_from_page_cache(self) -> None:
+        with patch('portfolio.views.aget_images', return_value=[]) as aget_images:
+            first = await self.async_client.get(reverse('index'))
+            second = await self.async_client.get(reverse('index'))
+
+        self.assertEqual(aget_images.call_count, 1)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(len(first.content), len(second.content))
+
+
+class MailDispatcherTests(TestCase):
+    """
+    Tests for the coalescing mail dispatcher.
+    """
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.ids = [
+            Notification.objects.create(subject=f"Subject {i}", message=f"Message {i}").pk for i in range(3)
+        ]
+
+    def test_notifications_share_one_connection(self) -> None:
+        with patch('portfolio.mail.get_connection', wraps=mail.get_connection) as get_connection:
+            self.assertEqual(deliver_notifications(self.ids), 3)
+
+        get_connection.assert_called_once()
+        self.assertEqual([message.subject for message in mail.outbox], ['Subject 0', 'Subject 1', 'Subject 2'])
+        self.assertFalse(Notification.objects.exists())
+
+    def test_digest_sends_a_single_email(self) -> None:
+        deliver_notifications(self.ids, digest=True)
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, '3 new notifications')
+        self.assertIn('Message 2', mail.outbox[0].body)
+
+    def test_throttling_keeps_unsent_notifications(self) -> None:
+        from django.core.mail.backends.locmem import EmailBackend
+
+        send_messages = EmailBackend.send_messages
+        calls = iter([None, smtplib.SMTPResponseException(421, b'Try again later')])
+
+        def throttled(backend, messages):
+            error = next(calls, None)
+            if error:
+                raise error
+            return send_messages(backend, messages)
+
+        with patch.object(EmailBackend, 'send_messages', throttled):
+            with self.assertRaises(MailThrottled):
+                deliver_notifications(self.ids)
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(list(Notification.objects.values_list('subject', flat=True)), ['Subject 1', 'Subject 2'])
+
+    def test_throttling_at_login_is_retried(self) -> None:
+        connection = mail.get_connection()
+        with patch.object(connection, 'open', side_effect=smtplib.SMTPAuthenticationError(454, b'Try again later')), \
+                patch('portfolio.mail.get_connection', return_value=connection):
+            with self.assertRaises(MailThrottled):
+                deliver_notifications(self.ids)
+
+        self.assertEqual(Notification.objects.count(), 3)
+
+    def test_relay_gives_up_after_the_last_attempt(self) -> None:
+        Notification.objects.update(attempts=MAIL_MAX_ATTEMPTS - 1)
+        with patch('portfolio.task.send_notification_batch.delay') as delay:
+            self.assertEqual(relay_notifications(), 3)
+            Notification.objects.update(relayed_at=timezone.now() - RELAY_LEASE * 2)
+            self.assertEqual(relay_notifications(), 0)
+
+        delay.assert_called_once()
+        self.assertEqual(Notification.objects.filter(attempts=MAIL_MAX_ATTEMPTS).count(), 3)
+
+    @patch('portfolio.mail.MAIL_BATCH_SIZE', 2)
+    def test_relay_hands_the_outbox_to_celery_in_batches(self) -> None:
+        with patch('portfolio.task.send_notification_batch.delay') as delay:
+            self.assertEqual(relay_notifications(), 3)
+            self.assertEqual(relay_notifications(), 0)
+
+        self.assertEqual([call.args[0] for call in delay.call_args_list], [self.ids[:2], self.ids[2:]])
+        self.assertFalse(Notification.objects.filter(relayed_at__isnull=True).exists())
+
+    def test_relay_keeps_notifications_when_the_broker_is_down(self) -> None:
+        with patch('portfolio.task.send_notification_batch.delay', side_effect=OSError('Connection refused')):
+            self.assertEqual(relay_notifications(), 0)
+
+        self.assertEqual(Notification.objects.filter(relayed_at__isnull=True).count(), 3)
+
+
+class OutboxTests(TestCase):
+    """
+    Tests for the notifications written with feedback and comment submissions.
+    """
+
+    def setUp(self) -> None:
+        cache.clear()
+        blocked_clients.clear()
+        self.data = {
+            'name': 'Anna',
+            'email': 'anna@example.com',
+            'message': 'A small rose',
+            'captcha_0': 'key',
+            'captcha_1': 'passed',
+        }
+
+    @patch('captcha.conf.settings.CAPTCHA_TEST_MODE', True)
+    def test_submission_does_not_touch_the_broker(self) -> None:
+        with patch('celery.app.task.Task.apply_async') as apply_async:
+            self.client.post(reverse('contact'), self.data)
+
+        apply_async.assert_not_called()
+        self.assertEqual(Notification.objects.get().subject, 'I want a tattoo - Anna')
+
+    @patch('captcha.conf.settings.CAPTCHA_TEST_MODE', True)
+    def test_feedback_and_notification_are_written_together(self) -> None:
+        with patch('portfolio.utils.queue_notification', side_effect=RuntimeError('disk full')):
+            response = self.client.post(reverse('contact'), self.data)
+
+        self.assertContains(response, 'An error occurred while processing your request.')
+        self.assertFalse(Feedback.objects.exists())
+
+    def test_comment_is_saved_once_with_its_notification(self) -> None:
+        from blog.models import Post
+
+        post = Post.objects.create(title='Aftercare', content='...', status=Post.Status.PUBLISHED)
+        response = self.client.post(post.get_absolute_url(), {'username': 'Ben', 'body': 'Thanks!'})
+
+        self.assertContains(response, 'Thank you for your comment!')
+        self.assertNotContains(response, 'An error occurred')
+        self.assertEqual(post.comments.get().body, 'Thanks!')
+        self.assertEqual(Notification.objects.get().subject, 'The post has been commented: Aftercare')
+
+
+class RateLimitTests(TestCase):
+    """
+    Tests for the sliding-window rate limiter.
+    """
+
+    def setUp(self) -> None:
+        cache.clear()
+        blocked_clients.clear()
+        self.start = 6000.0  # Start of a 10 minute window.
+
+    def test_limit_within_a_window(self) -> None:
+        results = [hit('contact', '10.0.0.1', '2/10m', now=self.start + i) for i in range(3)]
+
+        self.assertEqual(results, [False, False, True])
+        self.assertFalse(hit('contact', '10.0.0.2', '2/10m', now=self.start + 3))
+
+    def test_previous_window_is_weighted(self) -> None:
+        for client in ('10.0.0.1', '10.0.0.2'):
+            hit('contact', client, '2/10m', now=self.start + 500)
+            hit('contact', client, '2/10m', now=self.start + 550)
+
+        # 1 minute into the next window: 2 * 0.9 + 1 > 2. 6 minutes in: 2 * 0.4 + 1 <= 2.
+        self.assertTrue(hit('contact', '10.0.0.1', '2/10m', now=self.start + 660))
+        self.assertFalse(hit('contact', '10.0.0.2', '2/10m', now=self.start + 960))
+
+    def test_blocked_client_is_refused_without_the_cache(self) -> None:
+        for i in range(3):
+            hit('contact', '10.0.0.1', '2/10m', now=self.start + i)
+
+        with patch('portfolio.ratelimit._store', side_effect=AssertionError('cache used')):
+            self.assertTrue(hit('contact', '10.0.0.1', '2/10m', now=self.start + 10))
+
+    def test_local_block_expires_with_the_window(self) -> None:
+        for i in range(3):
+            hit('contact', '10.0.0.1', '2/10m', now=self.start + i)
+
+        self.assertFalse(blocked_clients.is_blocked('contact', '10.0.0.1', self.start + 600))
+
+    def test_blocked_clients_are_bounded(self) -> None:
+        for i in range(blocked_clients.size + 10):
+            blocked_clients.block('contact', f"10.0.{i // 256}.{i % 256}", self.start + 600)
+
+        self.assertEqual(len(blocked_clients._entries), blocked_clients.size)
+        self.assertFalse(blocked_clients.is_blocked('contact', '10.0.0.0', self.start))
+
+    def test_endpoint_counters(self) -> None:
+        for i in range(4):
+            hit('stats-test', '10.0.0.1', '2/10m', now=self.start + i)
+
+        counters = stats.snapshot()['stats-test']
+
+        self.assertEqual(
+            counters,
+            {'rate': '2/10m', 'hits': 4, 'limited': 2, 'local_blocks': 1},
+        )
+
+    def test_get_requests_are_not_limited(self) -> None:
+        for _ in range(3):
+            response = self.client.get(reverse('post_detail', kwargs={'slug': 'missing'}))
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(blocked_clients._entries)
+
+
+class CaptchaPoolTests(TestCase):
+    """
+    Tests for the pool of pre-rendered captcha challenges.
+    """
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_fill_creates_challenges_in_one_insert(self) -> None:
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(fill_pool(3), 3)
+
+        inserts = [query for query in context.captured_queries if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 1)
+
+        self.assertEqual(available(), 3)
+        self.assertEqual(fill_pool(3), 0)
+
+    def test_leases_hand_each_challenge_out_once(self) -> None:
+        fill_pool(2)
+        pooled = set(CaptchaStore.objects.values_list('hashkey', flat=True))
+
+        with self.assertNumQueries(0):
+            leased = {lease_captcha(), lease_captcha()}
+
+        self.assertEqual(leased, pooled)
+        self.assertEqual(available(), 0)
+
+    def test_empty_pool_falls_back_to_inline_generation(self) -> None:
+        key = lease_captcha()
+
+        self.assertTrue(CaptchaStore.objects.filter(hashkey=key).exists())
+
+        fill_pool(1)
+        with self.assertNumQueries(0):
+            lease_captcha()
+
+    def test_pooled_image_is_served_from_cache(self) -> None:
+        fill_pool(1)
+        key = lease_captcha()
+
+        with self.assertNumQueries(0):
+            response = self.client.get(f'/captcha/image/{key}/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+
+    def test_contact_form_uses_a_pooled_challenge(self) -> None:
+        fill_pool(2)
+        pooled = set(CaptchaStore.objects.values_list('hashkey', flat=True))
+
+        first = self.client.get(reverse('contact'))
+        second = self.client.get(reverse('contact'))
+
+        key_pattern = r'name="captcha_0" value="([0-9a-f]+)"'
+        keys = {re.search(key_pattern, response.content.decode()).group(1) for response in (first, second)}
+        self.assertEqual(keys, pooled)
+        self.assertEqual(CaptchaStore.objects.count(), 2)
+
+    def test_refill_replaces_expired_slots(self) -> None:
+        fill_pool(20)
+        for _ in range(5):
+            lease_captcha()
+        # The slots outlive CAPTCHA_POOL_TTL: the cache drops them.
+        cache.delete_many([f"captcha_pool:slot:{position}" for position in range(1, 21)])
+        self.assertEqual(available(), 0)
+
+        self.assertEqual(fill_pool(20), 20)
+        pooled = set(CaptchaStore.objects.order_by('-pk').values_list('hashkey', flat=True)[:20])
+        with self.assertNumQueries(0):
+            leased = {lease_captcha() for _ in range(20)}
+        self.assertEqual(leased, pooled)
+
+    def test_library_refresh_url_leases_from_the_pool(self) -> None:
+        fill_pool(1)
+        pooled = CaptchaStore.objects.get().hashkey
+
+        response = self.client.get('/captcha/refresh/', headers={'x-requested-with': 'XMLHttpRequest'})
+
+        self.assertEqual(response.json()['key'], pooled)
+
+    def test_expired_challenges_are_removed_in_bulk(self) -> None:
+        fill_pool(3)
+        CaptchaStore.objects.filter(pk__in=CaptchaStore.objects.values('pk')[:2]).update(expiration=timezone.now())
+
+        with self.assertNumQueries(1):
+            self.assertEqual(remove_expired(), 2)
+
+
 # class BaseViewTest(TestCase):
 #     """
 #      Base test case for testing views in the application.
@@ -0,0 +1,340 @@
+import json
+import logging
+import os
+import pickle
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from .counters import SharedCounters
+
+logger = logging.getLogger(__name__)
+
+STAT_FIELDS = ('l1_hits', 'l2_hits', 'misses')
+
+# Seconds the subscriber waits before reconnecting to Redis.
+RECONNECT_DELAY = 5
+
+_MISSING = object()
+
+
+def key_prefix(key: str) -> str:
+    """
+    Returns the prefix statistics are grouped by: ``snapshot:main_images:data`` -> ``snapshot``.
+    """
+    return re.split(r'[:.]', key, maxsplit=1)[0]
+
+
+class LocalTier:
+    """
+    A bounded, thread-safe LRU of pickled values with a short TTL, shared by the threads of a process.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, Tuple[float, bytes]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        """
+        Returns the value of a key, or ``_MISSING`` if it is absent or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, pickled = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+        # Values are stored pickled so callers never share a mutable object, like the locmem cache.
+        return pickle.loads(pickled)
+
+    def set(self, key: str, value: Any, timeout: float) -> None:
+        if timeout <= 0:
+            self.delete([key])
+            return
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + timeout, pickled)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, keys: Iterable[str]) -> None:
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class InvalidationBus:
+    """
+    Broadcasts the keys written by this process over Redis pub/sub and drops the keys
+    written by the other processes from the local tier.
+
+    Messages are JSON: ``{"sender": "<process id>", "keys": [...]}``, with ``"keys": "*"``
+    for a clear. When the subscription drops, the local tier is cleared on reconnect since
+    messages may have been missed meanwhile.
+    """
+
+    def __init__(self, url: str, channel: str, tier: LocalTier) -> None:
+        self.url = url
+        self.channel = channel
+        self.tier = tier
+        self.sender = uuid.uuid4().hex
+        self._client = None
+        self._started = False
+        self._lock = threading.Lock()
+
+    def _redis(self) -> Any:
+        if self._client is None:
+            import redis
+
+            self._client = redis.Redis.from_url(self.url)
+        return self._client
+
+    def start(self) -> None:
+        """
+        Starts the subscriber thread, once per process.
+        """
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._listen, name='cache-invalidation', daemon=True).start()
+
+    def publish(self, keys: Any) -> None:
+        """
+        Tells the other processes to drop ``keys`` (a list of made keys, or ``"*"``).
+
+        A failed publish is only logged: the other processes then serve their copy until its L1 TTL.
+        """
+        message = json.dumps({'sender': self.sender, 'keys': keys})
+        try:
+            self._redis().publish(self.channel, message)
+        except Exception as e:
+            logger.warning(f"Cache invalidation not published: {e}")
+
+    def handle(self, data: Any) -> None:
+        """
+        Applies a message received on the channel.
+        """
+        message = json.loads(data)
+        if message['sender'] == self.sender:
+            return
+        if message['keys'] == '*':
+            self.tier.clear()
+        else:
+            self.tier.delete(message['keys'])
+
+    def _listen(self) -> None:
+        while True:
+            try:
+                pubsub = self._redis().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                self.tier.clear()
+                for message in pubsub.listen():
+                    if message['type'] == 'message':
+                        self.handle(message['data'])
+            except Exception as e:
+                logger.warning(f"Cache invalidation subscriber disconnected: {e}")
+                time.sleep(RECONNECT_DELAY)
+
+
+class _ProcessState:
+    def __init__(self, max_entries: int, bus_url: Optional[str], channel: str, stats_store: str,
+                 stats_interval: int) -> None:
+        self.tier = LocalTier(max_entries)
+        self.bus = InvalidationBus(bus_url, channel, self.tier) if bus_url else None
+        self.stats = SharedCounters('cache:stats', lambda: caches[stats_store], stats_interval)
+
+
+# Django creates a cache instance per thread: the state shared by the threads is kept
+# here, per L2 alias and per process so forked workers start with an empty tier.
+_states: Dict[Tuple[str, int], _ProcessState] = {}
+_states_lock = threading.Lock()
+
+
+class TwoTierCache(BaseCache):
+    """
+    Cache backend keeping a small in-process LRU (L1) in front of a shared cache (L2).
+
+    Reads are served from L1 when possible, else from L2 and copied to L1 for at most
+    ``L1_TIMEOUT`` seconds. Writes go through to L2, and the written keys are broadcast
+    over Redis pub/sub so every process drops its L1 copy. Counters and locks keep
+    working as before: ``add`` and ``incr`` are atomic operations of L2.
+
+    A process may still serve a value up to ``L1_TIMEOUT`` seconds old if it read it
+    from L2 just before the write, or if an invalidation message is lost.
+
+    Configuration::
+
+        CACHES = {
+            'shared': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL},
+            'default': {
+                'BACKEND': 'portfolio.two_tier_cache.TwoTierCache',
+                'LOCATION': 'shared',
+                'OPTIONS': {'L1_MAX_ENTRIES': 1000, 'L1_TIMEOUT': 5, 'BUS_URL': REDIS_URL},
+            },
+        }
+
+    Without ``BUS_URL`` nothing is broadcast; use it only with a single process or a per-process L2.
+    """
+
+    def __init__(self, server: str, params: Dict[str, Any]) -> None:
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = server
+        self.l1_timeout: float = options.get('L1_TIMEOUT', 5)
+        self.l1_max_entries: int = options.get('L1_MAX_ENTRIES', 1000)
+        self.bus_url: Optional[str] = options.get('BUS_URL')
+        self.channel: str = options.get('CHANNEL', f"cache-invalidation:{server}")
+        self.stats_interval: int = options.get('STATS_INTERVAL', 10)
+
+    @property
+    def shared(self) -> BaseCache:
+        return caches[self.shared_alias]
+
+    @property
+    def state(self) -> _ProcessState:
+        key = (self.shared_alias, os.getpid())
+        state = _states.get(key)
+        if state is None:
+            with _states_lock:
+                state = _states.get(key)
+                if state is None:
+                    state = _states[key] = _ProcessState(
+                        self.l1_max_entries, self.bus_url, self.channel, self.shared_alias, self.stats_interval
+                    )
+            if state.bus:
+                state.bus.start()
+        return state
+
+    @property
+    def local(self) -> LocalTier:
+        return self.state.tier
+
+    @property
+    def stats(self) -> SharedCounters:
+        return self.state.stats
+
+    def _local_timeout(self, timeout: Any) -> float:
+        if timeout is DEFAULT_TIMEOUT or timeout is None:
+            return self.l1_timeout
+        return min(timeout, self.l1_timeout)
+
+    def _written(self, made_keys: List[str]) -> None:
+        """
+        Drops written keys from L1 and tells the other processes to do the same.
+        """
+        self.local.delete(made_keys)
+        self._publish(made_keys)
+
+    def _publish(self, keys: Any) -> None:
+        if self.state.bus and keys:
+            self.state.bus.publish(keys)
+
+    def get(self, key: str, default: Any = None, version: Optional[int] = None) -> Any:
+        made = self.shared.make_key(key, version)
+        value = self.local.get(made)
+        if value is not _MISSING:
+            self.stats.add(key_prefix(key), l1_hits=1)
+            return value
+
+        value = self.shared.get(key, _MISSING, version)
+        if value is _MISSING:
+            self.stats.add(key_prefix(key), misses=1)
+            return default
+        self.stats.add(key_prefix(key), l2_hits=1)
+        self.local.set(made, value, self.l1_timeout)
+        return value
+
+    def get_many(self, keys: Iterable[str], version: Optional[int] = None) -> Dict[str, Any]:
+        found: Dict[str, Any] = {}
+        remote: Dict[str, str] = {}
+        for key in keys:
+            made = self.shared.make_key(key, version)
+            value = self.local.get(made)
+            if value is _MISSING:
+                remote[key] = made
+            else:
+                self.stats.add(key_prefix(key), l1_hits=1)
+                found[key] = value
+
+        if remote:
+            values = self.shared.get_many(list(remote), version)
+            for key, made in remote.items():
+                if key in values:
+                    self.stats.add(key_prefix(key), l2_hits=1)
+                    self.local.set(made, values[key], self.l1_timeout)
+                    found[key] = values[key]
+                else:
+                    self.stats.add(key_prefix(key), misses=1)
+        return found
+
+    def has_key(self, key: str, version: Optional[int] = None) -> bool:
+        if self.local.get(self.shared.make_key(key, version)) is not _MISSING:
+            return True
+        return self.shared.has_key(key, version)
+
+    def set(self, key: str, value: Any, timeout: Any = DEFAULT_TIMEOUT, version: Optional[int] = None) -> None:
+        made = self.shared.make_key(key, version)
+        self.shared.set(key, value, timeout, version)
+        self._publish([made])
+        self.local.set(made, value, self._local_timeout(timeout))
+
+    def set_many(self, data: Dict[str, Any], timeout: Any = DEFAULT_TIMEOUT,
+                 version: Optional[int] = None) -> List[str]:
+        failed = self.shared.set_many(data, timeout, version)
+        made = {key: self.shared.make_key(key, version) for key in data}
+        self._publish(list(made.values()))
+        for key, value in data.items():
+            if key in failed:
+                self.local.delete([made[key]])
+            else:
+                self.local.set(made[key], value, self._local_timeout(timeout))
+        return failed
+
+    def add(self, key: str, value: Any, timeout: Any = DEFAULT_TIMEOUT, version: Optional[int] = None) -> bool:
+        added = self.shared.add(key, value, timeout, version)
+        if added:
+            self._written([self.shared.make_key(key, version)])
+        return added
+
+    def incr(self, key: str, delta: int = 1, version: Optional[int] = None) -> int:
+        value = self.shared.incr(key, delta, version)
+        self._written([self.shared.make_key(key, version)])
+        return value
+
+    def touch(self, key: str, timeout: Any = DEFAULT_TIMEOUT, version: Optional[int] = None) -> bool:
+        # L1 copies expire within L1_TIMEOUT anyway.
+        return self.shared.touch(key, timeout, version)
+
+    def delete(self, key: str, version: Optional[int] = None) -> bool:
+        deleted = self.shared.delete(key, version)
+        self._written([self.shared.make_key(key, version)])
+        return deleted
+
+    def delete_many(self, keys: Iterable[str], version: Optional[int] = None) -> None:
+        keys = list(keys)
+        self.shared.delete_many(keys, version)
+        self._written([self.shared.make_key(key, version) for key in keys])
+
+    def clear(self) -> None:
+        self.shared.clear()
+        self.local.clear()
+        self._publish('*')
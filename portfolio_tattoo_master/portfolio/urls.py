@@ -6,6 +6,7 @@ urlpatterns = [
     path('refresh_captcha/', views.refresh_captcha, name='refresh_captcha'),
     path('about/', views.about_me, name='about'),
     path('portfolio/', views.portfolio, name='portfolio'),
+    path('api/gallery/', views.gallery_api, name='gallery_api'),
     path('information/', views.information, name='information'),
     path('contact/', views.contact, name='contact'),
 ]
@@ -1,55 +1,184 @@
-from typing import Type, Dict, Any
+from typing import Dict, Any, Tuple
 
+from asgiref.sync import sync_to_async
 from django.contrib import messages
-from django.core.cache import cache
-from django.db.models import Model, QuerySet
+from django.db import transaction
+from django.db.models import Model
+from django.forms import ModelForm
+from django.core.files.storage import default_storage
 from django.http import HttpRequest
 from django.utils.translation import gettext as _
 
 from .form import FeedbackForm
-from .models import MainImage, PortfolioImage
-from .task import send_email
+from .gallery import get_gallery_index
+from .derivatives import derivative_url
+from .models import InstagramTile, MainImage
+from .snapshots import Rows, aget_snapshot, get_snapshot, register_snapshot
+from .mail import queue_notification
 import logging
 
 logger = logging.getLogger(__name__)
 
-def get_cached_images(cache_key: str, model: Type[Model], timeout: int = 60 * 30) -> QuerySet:
+@register_snapshot("main_images", MainImage)
+def build_main_images() -> Rows:
     """
-    Retrieves images from cache or database.
+    Builds the snapshot of main page images used by the slider and the reviews carousel.
 
-    Args:
-        cache_key (str): The cache key to store/retrieve images.
-        model (models.Model): The Django model to fetch images from.
-        timeout (int, optional): Cache timeout in seconds. Default is 30 minutes.
+    Returns:
+        Rows: One dictionary per image with its URL, derivatives, placeholder, text and author.
+    """
+    return [
+        {
+            'id': row['id'],
+            'url': default_storage.url(row['image']),
+            'derivatives': row['derivatives'],
+            'placeholder': row['placeholder'],
+            'width': row['width'],
+            'height': row['height'],
+            'text': row['text'],
+            'author': row['author'],
+        }
+        for row in MainImage.objects.order_by('position', 'pk').values(
+            'id', 'image', 'derivatives', 'placeholder', 'width', 'height', 'text', 'author'
+        )
+    ]
+
+
+@register_snapshot("instagram_tiles", InstagramTile)
+def build_instagram_tiles() -> Rows:
+    """
+    Builds the snapshot of the Instagram feed carousel.
+
+    Tiles point to their 480px thumbnail (960px on high-density screens) once the
+    derivatives are generated, and to the uploaded photo until then.
+
+    Returns:
+        Rows: One dictionary per visible tile with its image URLs, link and alternative text.
+    """
+    tiles = []
+    rows = InstagramTile.objects.filter(is_visible=True).values(
+        'id', 'image', 'derivatives', 'width', 'height', 'link', 'alt'
+    )
+    for row in rows:
+        url = default_storage.url(row['image'])
+        tiles.append({
+            'id': row['id'],
+            'url': url,
+            'derivatives': row['derivatives'],
+            'thumbnail': derivative_url(row['derivatives'], 480) or url,
+            'thumbnail_2x': derivative_url(row['derivatives'], 960) or url,
+            'width': row['width'],
+            'height': row['height'],
+            'link': row['link'],
+            'alt': row['alt'],
+        })
+    return tiles
+
+
+def get_instagram_tiles() -> Rows:
+    """
+    Retrieves the cached snapshot of the Instagram feed carousel.
+
+    Returns:
+        Rows: A list of dictionaries describing the visible tiles.
+    """
+    return get_snapshot("instagram_tiles")
+
+
+def get_images() -> Rows:
+    """
+    Retrieves the cached snapshot of the main image gallery.
+
+    Returns:
+        Rows: A list of dictionaries describing the main images.
+    """
+    return get_snapshot("main_images")
+
+
+def get_portfolio_images() -> Rows:
+    """
+    Retrieves the photos of the cached portfolio gallery index.
 
     Returns:
-        QuerySet: A queryset containing images.
+        Rows: A list of dictionaries describing the portfolio images and their tags.
     """
-    images = cache.get(cache_key)
-    if not images:
-        images = model.objects.all()
-        cache.set(cache_key, images, timeout=timeout)
+    return get_gallery_index()['photos']
 
-    return images
 
-def get_images() -> QuerySet[MainImage]:
+async def aget_images() -> Rows:
     """
-    Retrieves cached images for the main image gallery.
+    Async version of ``get_images``.
 
     Returns:
-        QuerySet[MainImage]: A queryset containing cached main images.
+        Rows: A list of dictionaries describing the main images.
     """
-    return get_cached_images("main_images", MainImage)
+    return await aget_snapshot("main_images")
 
 
-def get_portfolio_images() -> QuerySet[PortfolioImage]:
+def build_notification(data: Dict[str, Any], is_comment_form: bool = False) -> Tuple[str, str]:
     """
-    Retrieves cached images for the portfolio gallery.
+    Builds the subject and body of the email sent for a submitted form.
+
+    Args:
+        data (Dict[str, Any]): The cleaned data of the form.
+        is_comment_form (bool): Whether the form is a comment form.
 
     Returns:
-        QuerySet[PortfolioImage]: A queryset containing cached portfolio images.
+        Tuple[str, str]: The subject and the message.
+    """
+    if is_comment_form:
+        name: str = data.get('username', 'Anonymous')
+        post: str = data.get('post', '').title()
+        comment: str = data.get('body', '')
+        message = f'The user {name} wrote:\n{comment}\nFor post {post}'
+        subject = f'The post has been commented: {post}'
+    else:
+        name: str = data.get('name', 'Anonymous')
+        email: str = data.get('email', 'No email provided')
+        subject = f"I want a tattoo - {name}"
+        form_message: str = data.get('message', '')
+        contact_info = [f"My email: {email}"]
+
+        if telegram := data.get("telegram"):
+            contact_info.append(f"My Telegram: {telegram}")
+        if whatsapp := data.get("whatsapp"):
+            contact_info.append(f"My WhatsApp: {whatsapp}")
+        message = f"{form_message}\n\n" + "\n".join(contact_info)
+    return subject, message
+
+
+def save_submission(form: ModelForm, is_comment_form: bool = False) -> Model:
     """
-    return get_cached_images("portfolio_images", PortfolioImage)
+    Saves a valid form and writes its notification to the outbox in one transaction.
+
+    The request does local writes only: the email is sent later by the mail
+    dispatcher, and exists if and only if the submission was saved.
+
+    Args:
+        form (ModelForm): A valid feedback or comment form. A comment form's instance must have its post set.
+        is_comment_form (bool): Whether the form is a comment form.
+
+    Returns:
+        Model: The saved feedback or comment.
+    """
+    data: Dict[str, Any] = dict(form.cleaned_data)
+    if is_comment_form:
+        data['post'] = form.instance.post.title
+    subject, message = build_notification(data, is_comment_form)
+
+    with transaction.atomic():
+        instance = form.save()
+        queue_notification(subject, message)
+    return instance
+
+
+def report_form_errors(request: HttpRequest, form: FeedbackForm) -> None:
+    """
+    Displays every validation error of a form as a flash message.
+    """
+    for field, errors in form.errors.items():
+        for error in errors:
+            messages.error(request, f"{field}: {error}")
 
 
 def handle_form(
@@ -74,32 +203,9 @@ def handle_form(
                 request, _("You are sending requests too often. Please wait 10 minutes.")
             )
         elif form.is_valid():
-            data: Dict[str, Any] = form.cleaned_data
             try:
-                if is_comment_form:
-                    name: str = data.get('username', 'Anonymous')
-                    post: str = data.get('post', '').title()
-                    comment: str = data.get('body', '')
-                    message = f'The user {name} wrote:\n{comment}\nFor post {post}'
-                    subject = f'The post has been commented: {post}'
-                else:
-                    name: str = data.get('name', 'Anonymous')
-                    email: str = data.get('email', 'No email provided')
-                    subject = f"I want a tattoo - {name}"
-                    form_message: str = data.get('message', '')
-                    contact_info = [f"My email: {email}"]
-
-                    if telegram := data.get("telegram"):
-                        contact_info.append(f"My Telegram: {telegram}")
-                    if whatsapp := data.get("whatsapp"):
-                        contact_info.append(f"My WhatsApp: {whatsapp}")
-                    message = f"{form_message}\n\n" + "\n".join(contact_info)
-
-                # Sending the email
-                send_email.delay(subject, message)
-
-                # Save the form data to the database
-                form.save()
+                # Save the form data and queue the email in one transaction
+                save_submission(form, is_comment_form)
 
                 # Display success message
                 messages.success(request, _(text_message))
@@ -108,6 +214,40 @@ def handle_form(
                 logger.error(f"Error processing contact form: {e}")
         else:
             # Display form errors
-            for field, errors in form.errors.items():
-                for error in errors:
-                    messages.error(request, f"{field}: {error}")
+            report_form_errors(request, form)
+
+
+async def ahandle_form(
+        request: HttpRequest,
+        form: FeedbackForm,
+        is_limited: bool,
+        text_message: str = "Thank you\nI'll answer you very soon!",
+        is_comment_form: bool = False) -> None:
+    """
+    Async version of ``handle_form`` for views served under ASGI.
+
+    Validation (the captcha lookup) and saving use the database, so they run in
+    the request's worker thread.
+
+    Args:
+        request (HttpRequest): The incoming HTTP request.
+        form (FeedbackForm): The feedback form instance.
+        is_limited (bool): Whether the user is limited from sending requests.
+        text_message (str): The text message to show on successful submission.
+        is_comment_form (bool): Whether the form is a comment form.
+    """
+    if request.method != 'POST':
+        return
+
+    if is_limited:
+        messages.error(request, _("You are sending requests too often. Please wait 10 minutes."))
+    elif await sync_to_async(form.is_valid)():
+        try:
+            await sync_to_async(save_submission)(form, is_comment_form)
+            messages.success(request, _(text_message))
+        except Exception as e:
+            messages.error(request, _("An error occurred while processing your request."))
+            logger.error(f"Error processing contact form: {e}")
+    else:
+        report_form_errors(request, form)
+
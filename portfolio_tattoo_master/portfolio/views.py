@@ -1,19 +1,33 @@
+import logging
 from typing import Dict, Any, List, Tuple
 
+from asgiref.sync import sync_to_async
+from captcha import views as captcha_views
 from captcha.helpers import captcha_image_url
-from captcha.models import CaptchaStore
 from django.http import JsonResponse, HttpRequest, HttpResponse
 from django.shortcuts import render
-from django_ratelimit.decorators import ratelimit
 
 from django.conf import settings
+from .captcha_pool import cached_image, lease_captcha
+from .db_router import use_replica
 from .form import FeedbackForm
-from .models import Tag
-from .utils import get_images, get_portfolio_images, handle_form
-
-
-@ratelimit(key='ip', rate='2/10m', method='POST', block=False)
-def index(request: HttpRequest) -> HttpResponse:
+from .gallery import (
+    GALLERY_PAGE_SIZE,
+    get_first_gallery_page,
+    get_gallery_index,
+    get_gallery_page,
+    serialize_photo,
+)
+from .page_cache import CAPTCHA_HOLE, CSRF_HOLE, cache_page_shell
+from .ratelimit import rate_limit
+from .utils import aget_images, ahandle_form, get_images
+
+logger = logging.getLogger(__name__)
+
+
+@cache_page_shell(holes=(CSRF_HOLE, CAPTCHA_HOLE))
+@rate_limit(rate='2/10m')
+async def index(request: HttpRequest) -> HttpResponse:
     """
     Handles the main index page, including form submission and rate limiting.
 
@@ -23,12 +37,12 @@ def index(request: HttpRequest) -> HttpResponse:
     Returns:
         HttpResponse: The rendered response with the context.
     """
-    images = get_images()
     is_limited: bool = getattr(request, 'limited', False)
+    images = await aget_images()
 
     form = FeedbackForm(request.POST or None)
 
-    handle_form(request, form, is_limited)
+    await ahandle_form(request, form, is_limited)
 
     context: Dict[str, Any] = {
         'images': images,
@@ -36,13 +50,16 @@ def index(request: HttpRequest) -> HttpResponse:
         'is_limited': is_limited,
     }
 
-    return render(request, 'portfolio/pages/index.html', context)
+    # The captcha field and the CSRF token are rendered with database and session access.
+    return await sync_to_async(render)(request, 'portfolio/pages/index.html', context)
 
 
-def refresh_captcha(request: HttpRequest) -> JsonResponse:
+async def refresh_captcha(request: HttpRequest) -> JsonResponse:
     """
     Refreshes the captcha and returns a new captcha image URL.
 
+    The challenge is leased from the pre-rendered pool, see ``captcha_image``.
+
     Args:
         request (HttpRequest): The HTTP request object.
 
@@ -50,14 +67,39 @@ def refresh_captcha(request: HttpRequest) -> JsonResponse:
         JsonResponse: A JSON response containing the new captcha key and image URL.
     """
     try:
-        new_key: str = CaptchaStore.generate_key()
+        new_key: str = await sync_to_async(lease_captcha)()
         new_image_url: str = captcha_image_url(new_key)
         return JsonResponse({'key': new_key, 'image_url': new_image_url})
     except Exception as e:
-        print(f"Error generating captcha: {e}")  # Replace with logging in production
+        logger.error(f"Error generating captcha: {e}")
         return JsonResponse({'error': 'Failed to generate captcha'}, status=500)
 
 
+def captcha_image(request: HttpRequest, key: str) -> HttpResponse:
+    """
+    Serves the pre-rendered image of a pooled captcha challenge.
+
+    Challenges generated outside the pool are drawn by the captcha app's own view.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+        key (str): The hashkey of the challenge.
+
+    Returns:
+        HttpResponse: The captcha image.
+    """
+    image = cached_image(key)
+    if image is None:
+        return captcha_views.captcha_image(request, key, scale=1)
+
+    content, content_type = image
+    response = HttpResponse(content, content_type=content_type)
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+@use_replica
+@cache_page_shell()
 def about_me(request: HttpRequest) -> HttpResponse:
     """
     Renders the 'About Me' page with images and their associated comments.
@@ -69,17 +111,20 @@ def about_me(request: HttpRequest) -> HttpResponse:
         HttpResponse: The rendered 'about-me' template with context data.
     """
     images = get_images()
-    comments: List[Tuple[str, str]] = [(image.text, image.author) for image in images if
-                                       image.text and image.author]
+    comments: List[Tuple[str, str]] = [(image['text'], image['author']) for image in images if
+                                       image['text'] and image['author']]
     context = {
         'comments': comments,
     }
     return render(request, 'portfolio/pages/about-me.html', context)
 
 
+@use_replica
+@cache_page_shell()
 def portfolio(request: HttpRequest) -> HttpResponse:
     """
-    Renders the portfolio page with images and tags.
+    Renders the portfolio page with the first page of images and all tags.
+    The following pages are loaded on scroll from ``gallery_api``.
 
     Args:
         request (HttpRequest): The HTTP request object.
@@ -87,17 +132,52 @@ def portfolio(request: HttpRequest) -> HttpResponse:
     Returns:
         HttpResponse: The rendered portfolio page with context data.
     """
-    portfolio_photos = get_portfolio_images()  # Исправлено имя переменной для консистентности
-    tags = Tag.objects.all()
+    gallery = get_gallery_index()
+    first_page = get_first_gallery_page()
 
     context: Dict[str, Any] = {
-        'portfolio_photos': portfolio_photos,
-        'tags': tags,
+        'portfolio_photos': first_page['photos'],
+        'next_cursor': first_page['next_cursor'],
+        'tags': gallery['tags'],
     }
 
     return render(request, 'portfolio/pages/portfolio.html', context)
 
 
+@use_replica
+@cache_page_shell(params=('cursor', 'tag', 'limit'))
+def gallery_api(request: HttpRequest) -> JsonResponse:
+    """
+    Returns one page of the portfolio gallery as JSON.
+
+    Query parameters:
+        cursor: The ``next_cursor`` of the previous page. Omit for the first page.
+        tag: Optional tag slug to filter by.
+        limit: Optional page size (at most 100).
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        JsonResponse: ``{"results": [...], "next_cursor": str | null}``, or an error with status 400.
+    """
+    try:
+        limit = int(request.GET.get('limit', GALLERY_PAGE_SIZE))
+        page = get_gallery_page(
+            cursor=request.GET.get('cursor') or None,
+            tag=request.GET.get('tag') or None,
+            limit=limit,
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse({
+        'results': [serialize_photo(photo) for photo in page['photos']],
+        'next_cursor': page['next_cursor'],
+    })
+
+
+@cache_page_shell()
 def information(request: HttpRequest) -> HttpResponse:
     """
     Renders the information page.
@@ -111,8 +191,9 @@ def information(request: HttpRequest) -> HttpResponse:
     return render(request, 'portfolio/pages/information.html')
 
 
-@ratelimit(key='ip', rate='2/10m', method='POST', block=False)
-def contact(request: HttpRequest) -> HttpResponse:
+@cache_page_shell(holes=(CSRF_HOLE, CAPTCHA_HOLE))
+@rate_limit(rate='2/10m')
+async def contact(request: HttpRequest) -> HttpResponse:
     """
     Handles the contact page, including form submission and rate limiting.
 
@@ -124,7 +205,7 @@ def contact(request: HttpRequest) -> HttpResponse:
     """
     is_limited: bool = getattr(request, 'limited', False)
     form = FeedbackForm(request.POST or None)
-    handle_form(request, form, is_limited)
+    await ahandle_form(request, form, is_limited)
 
     context: Dict[str, Any] = {
         'form': form,
@@ -132,4 +213,4 @@ def contact(request: HttpRequest) -> HttpResponse:
         'GOOGLE_MAPS_API_KEY': settings.GOOGLE_MAPS_API_KEY
     }
 
-    return render(request, 'portfolio/pages/contact.html', context)
+    return await sync_to_async(render)(request, 'portfolio/pages/contact.html', context)
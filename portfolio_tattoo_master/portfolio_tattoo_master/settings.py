@@ -47,6 +47,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'portfolio.middleware.PrecompressedBundleMiddleware',
+    'portfolio.db_router.ReadYourWritesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -71,6 +73,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'portfolio.context_processors.content_version',
+                'portfolio.context_processors.instagram_tiles',
             ],
         },
     },
@@ -81,13 +85,35 @@ WSGI_APPLICATION = 'portfolio_tattoo_master.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Seconds connections are kept and checked before being reused. Keep 0 (a connection
+# per request) when served by ASGI (asgi.py): the async views and middleware run the ORM
+# in executor threads that would each keep their own connection open. Only set
+# DATABASE_CONN_MAX_AGE when serving with WSGI (wsgi.py).
+DATABASE_CONN_MAX_AGE = env.int('DATABASE_CONN_MAX_AGE', default=0)
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read replica used by the read-only views (see portfolio/db_router.py), e.g.
+# REPLICA_DATABASE_URL=sqlite:////path/to/db.replica.sqlite3 with a copy of db.sqlite3 to try it locally.
+# Visitors read from the primary for REPLICA_PIN_SECONDS after their own writes.
+REPLICA_DATABASE = 'replica'
+REPLICA_PIN_SECONDS = 10
+if env('REPLICA_DATABASE_URL', default=''):
+    DATABASES[REPLICA_DATABASE] = {
+        **env.db_url('REPLICA_DATABASE_URL'),
+        'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['portfolio.db_router.ReplicaRouter']
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -139,8 +165,44 @@ STATIC_URL = 'static/'
 
 STATICFILES_DIRS = [BASE_DIR / 'static']
 
-MEDIA_URl = "/media/"
+# CSS and JS bundles built by `manage.py build_bundles` (see portfolio/bundles.py). The
+# templates load the sources one by one until the bundles are built.
+STATIC_BUNDLE_ROOT = BASE_DIR / 'static' / 'bundles'
+
+MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# Responsive image derivatives (see portfolio/derivatives.py)
+IMAGE_DERIVATIVE_WIDTHS = (480, 960, 1440, 1920)
+IMAGE_DERIVATIVE_QUALITY = 80
+
+# Page cache (see portfolio/page_cache.py). Entries are keyed by content version,
+# so they can live long: any content change makes them unreachable.
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Caches. 'shared' is the Redis instance also used as Celery broker; 'default' keeps a
+# small in-process copy of hot keys in front of it and broadcasts invalidations over
+# Redis pub/sub (see portfolio/two_tier_cache.py). Without REDIS_URL (development,
+# tests) the shared tier is a per-process local-memory cache.
+REDIS_URL = env('REDIS_URL', default='')
+CACHES = {
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shared',
+    },
+    'default': {
+        'BACKEND': 'portfolio.two_tier_cache.TwoTierCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'L1_MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 5,
+            'BUS_URL': REDIS_URL or None,
+        },
+    },
+}
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 #Gmail
@@ -170,6 +232,44 @@ CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 
+# Notifications are written to an outbox with the submission they report and relayed
+# to Celery every MAIL_COALESCE_WINDOW seconds, then sent over one SMTP connection per
+# batch (see portfolio/mail.py). MAIL_DIGEST sends each batch as one email.
+MAIL_COALESCE_WINDOW = 30
+MAIL_DIGEST = False
+
+CELERY_BEAT_SCHEDULE = {
+    'flush-post-views': {
+        'task': 'blog.task.flush_post_views',
+        'schedule': 60.0,
+    },
+    'refill-captcha-pool': {
+        'task': 'portfolio.task.refill_captcha_pool',
+        'schedule': 60.0,
+    },
+    'relay-notifications': {
+        'task': 'portfolio.task.relay_notifications',
+        'schedule': float(MAIL_COALESCE_WINDOW),
+    },
+}
+
+# Post views are buffered in this cache and flushed by Celery beat (see blog/view_counter.py).
+VIEW_COUNT_CACHE = 'shared'
+VIEW_COUNT_DEDUP_TIMEOUT = 60 * 30
+
+# Sliding-window rate limits of the form views (see portfolio/ratelimit.py). The counters
+# live in the shared cache so the limit holds across workers.
+RATELIMIT_CACHE = 'shared'
+RATELIMIT_LRU_SIZE = 1024
+
+# Forms lease pre-rendered captcha challenges from a pool kept full by Celery
+# (see portfolio/captcha_pool.py). With CAPTCHA_GET_FROM_POOL, form validation no
+# longer deletes expired challenges on every submission: the refill task does it in bulk.
+# The app's own pool (CaptchaStore.pick) is never used: the widget and /captcha/refresh/
+# are overridden to lease from ours.
+CAPTCHA_POOL_SIZE = 200
+CAPTCHA_GET_FROM_POOL = True
+
 
 
 
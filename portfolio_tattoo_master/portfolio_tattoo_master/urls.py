@@ -4,11 +4,18 @@ from django.conf import settings
 from django.conf.urls.i18n import i18n_patterns
 from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
+
+from portfolio.views import captcha_image, refresh_captcha
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("rosetta/", include("rosetta.urls")),
+    # Serves pooled, pre-rendered images at the URL of the captcha app's image view.
+    re_path(r"^captcha/image/(?P<key>\w+)/$", captcha_image),
+    # The app's refresh view picks a random stored challenge, possibly one still in the
+    # pool or already leased: refreshes lease from the pool like the forms do.
+    path('captcha/refresh/', refresh_captcha),
     path('captcha/', include('captcha.urls')),
 ] + i18n_patterns(
     path("i18n/", include("django.conf.urls.i18n")),
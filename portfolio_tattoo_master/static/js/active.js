@@ -51,6 +51,22 @@
         background: "#f0f0f0"
     });
 
+    // Welcome Slider: slides after the first only carry their placeholder until they are about to show
+    var $welcomeSlider = $('#welcomeSlider');
+    function loadSlide(slide) {
+        if (slide && slide.getAttribute('data-lazy-style')) {
+            slide.setAttribute('style', slide.getAttribute('data-lazy-style'));
+            slide.removeAttribute('data-lazy-style');
+        }
+    }
+    $welcomeSlider.on('slide.bs.carousel', function (e) {
+        loadSlide(e.relatedTarget);
+        loadSlide($(e.relatedTarget).next('.carousel-item')[0]);
+    });
+    $window.on('load', function () {
+        loadSlide($welcomeSlider.find('.carousel-item')[1]);
+    });
+
     // Instagram Feeds Slider
     if ($.fn.owlCarousel) {
         $('.instagram-feeds-area').owlCarousel({
@@ -62,6 +78,8 @@
             autoplay: true,
             autoplayTimeout: 5000,
             smartSpeed: 1000,
+            // Tiles only fetch their thumbnail when they slide into view
+            lazyLoad: true,
             responsive: {
                 0: {
                     items: 3
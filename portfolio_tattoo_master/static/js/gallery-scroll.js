@@ -0,0 +1,129 @@
+// Infinite scroll for the portfolio gallery.
+// The first page is rendered by Django; the next pages come from the gallery JSON API
+// (keyset pagination, see portfolio.gallery.get_gallery_page) when the sentinel becomes visible.
+document.addEventListener("DOMContentLoaded", function () {
+    var sentinel = document.getElementById("gallery-sentinel");
+    var grid = document.querySelector(".portfolio-column");
+    if (!sentinel || !grid || !("IntersectionObserver" in window)) {
+        return;
+    }
+
+    var sizes = sentinel.dataset.sizes;
+    var state = {tag: null, cursor: sentinel.dataset.next || null, loading: false};
+    var cursors = {"*": state.cursor};
+
+    function buildItem(photo) {
+        var item = document.createElement("div");
+        item.className = "col-12 col-sm-6 col-md-4 col-lg-3 column_single_gallery_item " + photo.tags.join(" ");
+        item.dataset.id = photo.id;
+
+        var picture = document.createElement("picture");
+        if (photo.srcset.webp) {
+            var source = document.createElement("source");
+            source.type = "image/webp";
+            source.srcset = photo.srcset.webp;
+            source.sizes = sizes;
+            picture.appendChild(source);
+        }
+        var img = document.createElement("img");
+        img.src = photo.src;
+        if (photo.srcset.jpeg) {
+            img.srcset = photo.srcset.jpeg;
+            img.sizes = sizes;
+        }
+        if (photo.color) {
+            img.style.backgroundColor = photo.color;
+        }
+        if (photo.preview) {
+            // Shown until the photo has loaded, like the placeholder of the responsive_image tag
+            img.style.backgroundImage = "url(" + photo.preview + ")";
+            img.style.backgroundSize = "cover";
+        }
+        if (photo.width && photo.height) {
+            img.width = photo.width;
+            img.height = photo.height;
+        }
+        img.alt = "";
+        img.loading = "lazy";
+        img.decoding = "async";
+        picture.appendChild(img);
+        item.appendChild(picture);
+
+        var overlay = document.createElement("div");
+        overlay.className = "hover_overlay";
+        overlay.innerHTML = '<a class="gallery_img" href="' + photo.full + '"><i class="fa fa-eye"></i></a>';
+        item.appendChild(overlay);
+        return item;
+    }
+
+    function insertItems(photos) {
+        var before = grid.querySelector(".column_single_gallery_item.instagram");
+        var added = [];
+        photos.forEach(function (photo) {
+            if (grid.querySelector('[data-id="' + photo.id + '"]')) {
+                return;
+            }
+            var item = buildItem(photo);
+            grid.insertBefore(item, before);
+            added.push(item);
+        });
+        if (added.length && window.jQuery && jQuery.fn.isotope && jQuery(grid).data("isotope")) {
+            jQuery(grid).isotope("reloadItems").isotope();
+            if (jQuery.fn.magnificPopup) {
+                jQuery(".gallery_img").magnificPopup({type: "image", gallery: {enabled: true}});
+            }
+        }
+    }
+
+    function loadNextPage() {
+        if (state.loading || !state.cursor) {
+            return;
+        }
+        state.loading = true;
+        var params = new URLSearchParams({cursor: state.cursor});
+        if (state.tag) {
+            params.set("tag", state.tag);
+        }
+        fetch(sentinel.dataset.api + "?" + params.toString())
+            .then(function (response) { return response.json(); })
+            .then(function (data) {
+                insertItems(data.results || []);
+                state.cursor = data.next_cursor;
+                cursors[state.tag || "*"] = state.cursor;
+            })
+            .finally(function () { state.loading = false; });
+    }
+
+    // A tag filter paginates on its own: its first page is fetched without a cursor.
+    document.querySelectorAll(".portfolio-menu button").forEach(function (button) {
+        button.addEventListener("click", function () {
+            var filter = button.dataset.filter;
+            var tag = (filter === "*" || filter === ".instagram") ? null : filter.slice(1);
+            if (filter === ".instagram") {
+                state.cursor = null;
+                return;
+            }
+            state.tag = tag;
+            var key = tag || "*";
+            if (key in cursors) {
+                state.cursor = cursors[key];
+            } else {
+                state.cursor = "";
+                state.loading = true;
+                fetch(sentinel.dataset.api + "?" + new URLSearchParams({tag: tag}).toString())
+                    .then(function (response) { return response.json(); })
+                    .then(function (data) {
+                        insertItems(data.results || []);
+                        state.cursor = cursors[key] = data.next_cursor;
+                    })
+                    .finally(function () { state.loading = false; });
+            }
+        });
+    });
+
+    new IntersectionObserver(function (entries) {
+        if (entries.some(function (entry) { return entry.isIntersecting; })) {
+            loadNextPage();
+        }
+    }, {rootMargin: "600px 0px"}).observe(sentinel);
+});